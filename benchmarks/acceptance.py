@@ -0,0 +1,58 @@
+"""Time ``create_acceptance`` for large inbound shipments.
+
+Run from the repository root against a migrated local database:
+
+    python benchmarks/acceptance.py --units 10000 100000 --skus 1 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from uuid import uuid4
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from database import async_engine, async_session_factory  # noqa: E402
+from queries.acceptance import create_acceptance  # noqa: E402
+from schemas import (CreateAcceptanceRequest, ItemToAccept,  # noqa: E402
+                     StockStateEnum)
+
+
+def build_request(units: int, skus: int) -> CreateAcceptanceRequest:
+    per_sku, rest = divmod(units, skus)
+    return CreateAcceptanceRequest(items_to_accept=[
+        ItemToAccept(
+            sku_id=uuid4(),
+            stock=StockStateEnum.VALID,
+            count=per_sku + (1 if i < rest else 0),
+        )
+        for i in range(skus)
+    ])
+
+
+async def run(units_list: list[int], skus_list: list[int]) -> None:
+    print(f"{'units':>10} {'skus':>6} {'seconds':>9} {'units/s':>12}")
+    for units in units_list:
+        for skus in skus_list:
+            request = build_request(units, skus)
+            async with async_session_factory() as session:
+                started = time.perf_counter()
+                await create_acceptance(session, request)
+                elapsed = time.perf_counter() - started
+            print(f"{units:>10} {skus:>6} {elapsed:>9.3f} "
+                  f"{units / elapsed:>12.0f}")
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--units", type=int, nargs="+",
+                        default=[10_000, 100_000])
+    parser.add_argument("--skus", type=int, nargs="+", default=[1, 50])
+    args = parser.parse_args()
+    asyncio.run(run(args.units, args.skus))
+
+
+if __name__ == "__main__":
+    main()
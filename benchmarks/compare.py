@@ -0,0 +1,49 @@
+"""Compare two ``benchmarks/run.py`` result files scenario by scenario.
+
+    python benchmarks/compare.py results/before.jsonl results/after.jsonl
+
+When a file holds several runs of a scenario the last one wins. Results
+marked ``"valid": false`` (mostly 4xx responses) are not compared.
+"""
+import argparse
+import json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "db_round_trips")
+
+
+def load(path: str) -> dict:
+    results = {}
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                results[result["scenario"]] = result
+    return results
+
+
+def change(before, after) -> str:
+    if not before or after is None:
+        return f"{before} -> {after}"
+    return f"{before} -> {after} ({(after - before) / before:+.1%})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    for scenario in sorted(before.keys() & after.keys()):
+        print(scenario)
+        if not (before[scenario].get("valid", True)
+                and after[scenario].get("valid", True)):
+            print("  skipped: mostly 4xx responses")
+            continue
+        for metric in METRICS:
+            old, new = before[scenario][metric], after[scenario][metric]
+            print(f"  {metric:>15}: {change(old, new)}")
+
+
+if __name__ == "__main__":
+    main()
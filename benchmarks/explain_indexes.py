@@ -0,0 +1,171 @@
+"""Check that the statements issued by ``queries/`` are served by indexes.
+
+Seeds a migrated local database, runs the query functions while recording
+every statement they send, then EXPLAINs each recorded statement with its
+original parameters and ``enable_seqscan = off``. A sequential scan that
+survives that setting means no index matches the predicate.
+
+    python benchmarks/explain_indexes.py [--skus 200] [--units 50]
+
+Exits with status 1 when a checked table is still sequentially scanned.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import traceback
+from uuid import uuid4
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sqlalchemy import event  # noqa: E402
+
+from database import async_engine, async_session_factory  # noqa: E402
+from queries.acceptance import (create_acceptance,  # noqa: E402
+                                get_acceptance_info)
+from queries.discount import (cancel_discount,  # noqa: E402
+                              create_discount_info, get_discount_info)
+from queries.items import (get_item_info, get_item_info_by_sku,  # noqa: E402
+                           get_items_info, get_sku_info, get_skus_info,
+                           markdown_item, move_to_not_found)
+from queries.posting import (cancel_posting, create_posting,  # noqa: E402
+                             get_posting_info, get_postings_info)
+from queries.stock import get_sku_availability  # noqa: E402
+from queries.tasks import finish_task, get_task_info  # noqa: E402
+from schemas import (CancelPostingRequest,  # noqa: E402
+                     CreateAcceptanceRequest, CreateDiscountRequest,
+                     CreatePostingRequest, FinishTaskRequest, ItemToAccept,
+                     MarkdownItem, OrderedGood, PostingStatusEnum,
+                     StockStateEnum, TaskStatusEnum)
+
+
+CHECKED_TABLES = {
+    "item", "task", "posting", "ordered_goods", "accepted_items",
+    "discount_sku_association",
+}
+SKIPPED_PREFIXES = ("INSERT INTO", "BEGIN", "COMMIT", "ROLLBACK", "SET",
+                    "SHOW", "select pg_catalog", "select current_schema")
+
+recorded: list[tuple[str, object]] = []
+recording = False
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def record(conn, cursor, statement, parameters, context, executemany):
+    if recording and not executemany:
+        recorded.append((statement, parameters))
+
+
+async def seed(skus: int, units: int):
+    request = CreateAcceptanceRequest(items_to_accept=[
+        ItemToAccept(sku_id=uuid4(), stock=StockStateEnum.VALID, count=units)
+        for _ in range(skus)
+    ])
+    async with async_session_factory() as session:
+        acceptance_id = await create_acceptance(session, request)
+    return acceptance_id, [line.sku_id for line in request.items_to_accept]
+
+
+async def exercise(acceptance_id, sku_ids) -> None:
+    state = {}
+
+    async def step(name, call):
+        async with async_session_factory() as session:
+            try:
+                state[name] = await call(session)
+            except Exception:
+                print(f"-- {name} failed:")
+                traceback.print_exc()
+
+    sku_id = sku_ids[0]
+    await step("acceptance", lambda s: get_acceptance_info(s, acceptance_id))
+    await step("sku", lambda s: get_sku_info(s, sku_id))
+    await step("skus", lambda s: get_skus_info(s, sku_ids[:10]))
+    await step("sku_items", lambda s: get_item_info_by_sku(s, sku_id))
+    await step("availability", lambda s: get_sku_availability(s, sku_id))
+
+    items = [item["item_id"] for item in state["sku_items"]["items"]]
+    await step("item", lambda s: get_item_info(s, items[0]))
+    await step("items", lambda s: get_items_info(s, items[:10]))
+    await step("posting_id", lambda s: create_posting(
+        s, CreatePostingRequest(ordered_goods=[
+            OrderedGood(sku=sku_id, from_valid_ids=items[:3] + [uuid4()],
+                        from_defect_ids=[]),
+        ])))
+    posting_id = state.get("posting_id")
+    await step("posting", lambda s: get_posting_info(s, posting_id))
+    await step("postings", lambda s: get_postings_info(s, [posting_id]))
+
+    task_id = state["posting"]["task_ids"][0]["id"]
+    await step("task", lambda s: get_task_info(s, task_id))
+    await step("finish", lambda s: finish_task(
+        s, FinishTaskRequest(id=task_id, status=TaskStatusEnum.COMPLETED)))
+    await step("markdown", lambda s: markdown_item(
+        s, MarkdownItem(id=items[1], percentage=20)))
+    await step("not_found", lambda s: move_to_not_found(s, items[-1]))
+    await step("cancel", lambda s: cancel_posting(
+        s, CancelPostingRequest(id=posting_id,
+                                status=PostingStatusEnum.CANCELED)))
+    await step("discount_id", lambda s: create_discount_info(
+        s, CreateDiscountRequest(sku_ids=sku_ids[:5], percentage=15)))
+    discount_id = state.get("discount_id")
+    await step("discount", lambda s: get_discount_info(s, discount_id))
+    await step("cancel_discount", lambda s: cancel_discount(s, discount_id))
+
+
+def seq_scans(plan: dict) -> set[str]:
+    found = set()
+    if plan.get("Node Type") == "Seq Scan" and (
+            plan.get("Relation Name") in CHECKED_TABLES):
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= seq_scans(child)
+    return found
+
+
+async def explain_recorded() -> int:
+    failures = 0
+    seen = set()
+    async with async_engine.connect() as conn:
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in recorded:
+            if statement in seen or statement.lstrip().startswith(
+                    SKIPPED_PREFIXES):
+                continue
+            seen.add(statement)
+            result = await conn.exec_driver_sql(
+                "EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = seq_scans(plan[0]["Plan"])
+            status = "SEQ SCAN " + ",".join(sorted(scans)) if scans else "ok"
+            failures += bool(scans)
+            print(f"[{status}] {' '.join(statement.split())[:160]}")
+        await conn.rollback()
+    return failures
+
+
+async def run(skus: int, units: int) -> int:
+    global recording
+    acceptance_id, sku_ids = await seed(skus, units)
+    recording = True
+    await exercise(acceptance_id, sku_ids)
+    recording = False
+    failures = await explain_recorded()
+    await async_engine.dispose()
+    print(f"{failures} statement(s) without a usable index")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=200)
+    parser.add_argument("--units", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.skus, args.units)))
+
+
+if __name__ == "__main__":
+    main()
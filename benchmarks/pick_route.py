@@ -0,0 +1,82 @@
+"""Path length and planning time of the pick route planner.
+
+No database is needed; a warehouse of ``--zones`` zones, each with
+aisles of bins, is laid out in memory and waves of ``--tasks`` picks are
+drawn from random bins:
+
+    python benchmarks/pick_route.py --tasks 50 200 1000
+
+Each wave is walked in request order (what pickers did before), in zone
+batches with nearest neighbour only, and with 2-opt on top within the
+configured ``PICK_ROUTE_BUDGET_MS``. Lengths are in the location
+coordinates (metres); times are the median of ``--repeat`` runs.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from routing import Stop, plan_route, route_length  # noqa: E402
+
+
+def build_layout(zones: int, aisles: int, bins: int) -> list:
+    """Bins as (zone, x, y): zones side by side, aisles 3 m apart."""
+    layout = []
+    for zone in range(zones):
+        for aisle in range(aisles):
+            for bin in range(bins):
+                layout.append((f"Z{zone}",
+                               zone * aisles * 3.0 + aisle * 3.0,
+                               2.0 + bin * 1.0))
+    return layout
+
+
+def build_wave(layout: list, tasks: int, rng: random.Random) -> list:
+    return [Stop(i, *rng.choice(layout)) for i in range(tasks)]
+
+
+def timed(call, repeat: int):
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def run(tasks_list: list[int], zones: int, budget_ms: float,
+        repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    layout = build_layout(zones, aisles=20, bins=40)
+    print(f"{'tasks':>6} {'request m':>10} {'nn m':>10} {'nn ms':>7} "
+          f"{'2-opt m':>10} {'2-opt ms':>9} {'saved':>6}")
+    for tasks in tasks_list:
+        wave = build_wave(layout, tasks, rng)
+        nn, nn_time = timed(lambda: plan_route(wave, budget=0), repeat)
+        best, best_time = timed(
+            lambda: plan_route(wave, budget=budget_ms / 1000), repeat)
+        unordered = route_length(wave)
+        length = route_length(best)
+        print(f"{tasks:>6} {unordered:>10.0f} {route_length(nn):>10.0f} "
+              f"{nn_time * 1000:>7.2f} {length:>10.0f} "
+              f"{best_time * 1000:>9.2f} {1 - length / unordered:>6.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, nargs="+",
+                        default=[50, 200, 1000])
+    parser.add_argument("--zones", type=int, default=6)
+    parser.add_argument("--budget-ms", type=float, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run(args.tasks, args.zones, args.budget_ms, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
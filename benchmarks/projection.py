@@ -0,0 +1,79 @@
+"""Compare entity loads with column projections on the item-by-SKU read.
+
+Accepts one SKU with ``--units`` items into a migrated local database, then
+reads its items both ways and reports wall time, CPU time and the peak
+memory allocated per call (``tracemalloc``):
+
+    python benchmarks/projection.py --units 10000 50000
+
+``entities`` is the former ``select(Item)`` load through the identity map;
+``projection`` is the current ``load_item_info_by_sku``.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from uuid import uuid4
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sqlalchemy.future import select  # noqa: E402
+
+from database import async_engine, async_session_factory  # noqa: E402
+from models import Item  # noqa: E402
+from queries.acceptance import create_acceptance  # noqa: E402
+from queries.items import item_row, load_item_info_by_sku  # noqa: E402
+from schemas import (CreateAcceptanceRequest, ItemToAccept,  # noqa: E402
+                     StockStateEnum)
+
+
+async def load_entities(session, sku_id):
+    items = (await session.execute(
+        select(Item).where(Item.sku_id == sku_id))).scalars().all()
+    return {"items": [item_row(item) for item in items]}
+
+
+async def measure(loader, sku_id, repeat: int) -> tuple:
+    wall = cpu = peak = 0.0
+    for _ in range(repeat):
+        async with async_session_factory() as session:
+            tracemalloc.start()
+            started, started_cpu = time.perf_counter(), time.process_time()
+            await loader(session, sku_id)
+            wall += time.perf_counter() - started
+            cpu += time.process_time() - started_cpu
+            peak += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return wall / repeat, cpu / repeat, peak / repeat
+
+
+async def run(units_list: list[int], repeat: int) -> None:
+    print(f"{'units':>8} {'loader':>11} {'wall ms':>9} {'cpu ms':>9} "
+          f"{'peak MiB':>9}")
+    for units in units_list:
+        sku_id = uuid4()
+        async with async_session_factory() as session:
+            await create_acceptance(session, CreateAcceptanceRequest(
+                items_to_accept=[ItemToAccept(
+                    sku_id=sku_id, stock=StockStateEnum.VALID, count=units)]))
+        for name, loader in (("entities", load_entities),
+                             ("projection", load_item_info_by_sku)):
+            wall, cpu, peak = await measure(loader, sku_id, repeat)
+            print(f"{units:>8} {name:>11} {wall * 1000:>9.1f} "
+                  f"{cpu * 1000:>9.1f} {peak / 2 ** 20:>9.2f}")
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--units", type=int, nargs="+",
+                        default=[10_000, 50_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.units, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
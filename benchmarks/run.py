@@ -0,0 +1,482 @@
+"""Drive the API routes at a fixed concurrency and report latencies.
+
+Seed first with ``benchmarks/seed.py``, then from the repository root:
+
+    python benchmarks/run.py --requests 2000 --concurrency 32 \
+        --output results/$(git rev-parse --short HEAD).jsonl
+
+By default the app is served in-process through ``httpx.ASGITransport``,
+which lets the harness count the statements sent to Postgres. Pass
+``--base-url`` to benchmark a running deployment instead; DB round trips
+are then reported as ``null``.
+
+Every scenario runs on its own, so ``db_round_trips`` is the number of
+statements issued during the scenario divided by its request count. One
+JSON object per scenario is printed and appended to ``--output``;
+``benchmarks/compare.py`` diffs two such files. A scenario where most
+requests were rejected with a 4xx measured the error path, not the route:
+its result is marked ``"valid": false`` and the run exits with status 1.
+
+``events`` reports the time until the first replayed event of a resumed
+stream. It only runs against ``--base-url``: the in-process transport
+buffers whole responses, and an event stream does not end.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from uuid import uuid4
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sqlalchemy import event, text  # noqa: E402
+
+from database import async_engine  # noqa: E402
+
+
+statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    global statements
+    statements += 1
+
+
+@dataclass
+class Fixtures:
+    skus: list
+    items: list
+    items_by_sku: dict
+    postings: list
+    sendable: list
+    tasks: list
+    claims: list
+    discounts: list
+    acceptances: list
+    waves: list
+    events: list
+    posting_lines: int
+    acceptance_lines: int
+    acceptance_units: int
+    discount_skus: int
+    wave_postings: int
+    location_batch: int
+    import_rows: int
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[Fixtures], tuple]
+    after: Optional[Callable[[Fixtures, httpx.Response], None]] = None
+    needs: str = "skus"
+    # Runs --write-requests requests instead of --requests.
+    write: bool = False
+    # Only read up to the first event of the response.
+    stream: bool = False
+
+
+def pick(values: list, count: int) -> list:
+    return random.sample(values, min(count, len(values)))
+
+
+def posting_request(fx: Fixtures) -> tuple:
+    skus = pick(list(fx.items_by_sku), fx.posting_lines)
+    return "POST", "/createPostnig", {"json": {"ordered_goods": [
+        {"sku": sku, "from_valid_ids": [random.choice(fx.items_by_sku[sku])],
+         "from_defect_ids": []}
+        for sku in skus
+    ]}}
+
+
+def acceptance_request(fx: Fixtures) -> tuple:
+    per_line = max(fx.acceptance_units // fx.acceptance_lines, 1)
+    lines = []
+    for sku in pick(fx.skus, fx.acceptance_lines // 2):
+        lines.append({"sku_id": sku, "stock": "valid", "count": per_line})
+    while len(lines) < fx.acceptance_lines:
+        lines.append({"sku_id": str(uuid4()), "stock": "valid",
+                      "count": per_line})
+    return "POST", "/createAcceptance", {"json": {"items_to_accept": lines}}
+
+
+def discount_request(fx: Fixtures) -> tuple:
+    return "POST", "/createDiscount", {"json": {
+        "sku_ids": pick(fx.skus, fx.discount_skus),
+        "percentage": random.randint(5, 50),
+    }}
+
+
+def locations_request(fx: Fixtures) -> tuple:
+    return "POST", "/createLocations", {"json": {"locations": [
+        {"code": f"bench-{uuid4().hex[:12]}", "zone": random.choice("ABCD"),
+         "x": round(random.uniform(0, 200), 1),
+         "y": round(random.uniform(0, 100), 1)}
+        for _ in range(fx.location_batch)
+    ]}}
+
+
+def import_request(fx: Fixtures) -> tuple:
+    rows = b"".join(
+        json.dumps({"sku_id": sku,
+                    "base_price": str(random.randint(100, 100_000) / 100)
+                    }).encode() + b"\n"
+        for sku in random.choices(fx.skus, k=fx.import_rows))
+    return "POST", "/importSkus", {
+        "content": rows, "params": {"format": "ndjson"},
+        "headers": {"Content-Type": "application/x-ndjson"}}
+
+
+def events_request(fx: Fixtures) -> tuple:
+    posting_id, event_id = random.choice(fx.events)
+    return "GET", "/events", {"params": {"posting_id": posting_id},
+                              "headers": {"Last-Event-ID": str(event_id - 1)}}
+
+
+def remember_claim(fx: Fixtures, response: httpx.Response) -> None:
+    if response.status_code == 200:
+        worker_id = json.loads(response.request.content)["worker_id"]
+        task_ids = [task["id"] for task in response.json()["tasks"]]
+        if task_ids:
+            fx.claims.append((worker_id, task_ids))
+
+
+def remember(attribute: str) -> Callable[[Fixtures, httpx.Response], None]:
+    def after(fx: Fixtures, response: httpx.Response) -> None:
+        if response.status_code == 200:
+            getattr(fx, attribute).append(response.json()["id"])
+    return after
+
+
+def take(fx: Fixtures, attribute: str) -> str:
+    values = getattr(fx, attribute)
+    return values.pop() if values else str(uuid4())
+
+
+SCENARIOS = [
+    Scenario("getSkuInfo", lambda fx: (
+        "GET", f"/getSkuInfo/{random.choice(fx.skus)}", {})),
+    Scenario("getSkuInfoBatch", lambda fx: (
+        "POST", "/getSkuInfoBatch", {"json": {"ids": pick(fx.skus, 100)}})),
+    Scenario("getSkuAvailability", lambda fx: (
+        "GET", f"/getSkuAvailability/{random.choice(fx.skus)}", {})),
+    Scenario("getItemInfoBySkuId", lambda fx: (
+        "GET", f"/getItemInfoBySkuId/{random.choice(fx.skus)}", {})),
+    Scenario("listItemsBySku", lambda fx: (
+        "GET", f"/listItemsBySku/{random.choice(fx.skus)}",
+        {"params": {"limit": 100}})),
+    Scenario("geItemInfo", lambda fx: (
+        "GET", f"/geItemInfo/{random.choice(fx.items)}", {}), needs="items"),
+    Scenario("getItemInfoBatch", lambda fx: (
+        "POST", "/getItemInfoBatch", {"json": {"ids": pick(fx.items, 100)}}),
+        needs="items"),
+    Scenario("getPosting", lambda fx: (
+        "GET", f"/getPosting/{random.choice(fx.postings)}", {}),
+        needs="postings"),
+    Scenario("getPostingBatch", lambda fx: (
+        "POST", "/getPostingBatch", {"json": {"ids": pick(fx.postings, 20)}}),
+        needs="postings"),
+    Scenario("planPickRoute", lambda fx: (
+        "POST", "/planPickRoute", {"json": {
+            "ids": pick(fx.postings, fx.wave_postings)}}),
+        needs="postings"),
+    Scenario("getWave", lambda fx: (
+        "GET", f"/getWave/{random.choice(fx.waves)}", {}), needs="waves"),
+    Scenario("listPostings", lambda fx: (
+        "GET", "/listPostings", {"params": {"limit": 100}})),
+    Scenario("getTaskInfo", lambda fx: (
+        "GET", f"/getTaskInfo/{random.choice(fx.tasks)}", {}), needs="tasks"),
+    Scenario("getTaskInfoBatch", lambda fx: (
+        "POST", "/getTaskInfoBatch", {"json": {"ids": pick(fx.tasks, 100)}}),
+        needs="tasks"),
+    Scenario("listTasks", lambda fx: (
+        "GET", "/listTasks", {"params": {"limit": 100}})),
+    Scenario("getAcceptance", lambda fx: (
+        "GET", f"/getAcceptance/{random.choice(fx.acceptances)}", {}),
+        needs="acceptances"),
+    Scenario("poolStats", lambda fx: ("GET", "/poolStats", {})),
+    Scenario("events", events_request, needs="events", stream=True),
+    # Dedicated write scenarios.
+    Scenario("createAcceptance", acceptance_request,
+             after=remember("acceptances"), write=True),
+    Scenario("createPostnig", posting_request, after=remember("postings"),
+             needs="items", write=True),
+    Scenario("createDiscount", discount_request, after=remember("discounts"),
+             write=True),
+    Scenario("createLocations", locations_request, write=True),
+    Scenario("importSkus", import_request, write=True),
+    Scenario("getDiscount", lambda fx: (
+        "GET", f"/getDiscount/{random.choice(fx.discounts)}", {}),
+        needs="discounts"),
+    Scenario("cancelDiscount", lambda fx: (
+        "POST", "/cancelDiscount", {"params": {"id": take(fx, "discounts")}}),
+        needs="discounts"),
+    Scenario("claimTasks", lambda fx: (
+        "POST", "/claimTasks", {"json": {
+            "worker_id": f"bench-{random.randint(1, 64)}", "limit": 10}}),
+        after=remember_claim),
+    Scenario("heartbeatTasks", lambda fx: (
+        "POST", "/heartbeatTasks", {"json": dict(zip(
+            ("worker_id", "task_ids"), random.choice(fx.claims)))}),
+        needs="claims"),
+    Scenario("finishTask", lambda fx: (
+        "POST", "/finishTask", {"json": {
+            "id": take(fx, "tasks"), "status": "completed"}}),
+        needs="tasks"),
+    Scenario("setSkuPrice", lambda fx: (
+        "POST", "/setSkuPrice", {"json": {
+            "sku_id": random.choice(fx.skus),
+            "base_price": str(random.randint(100, 100_000) / 100)}})),
+    Scenario("toggleIsHidden", lambda fx: (
+        "POST", "/toggleIsHidden", {"json": {
+            "sku_id": random.choice(fx.skus), "is_hidden": False}})),
+    Scenario("markdownItem", lambda fx: (
+        "POST", "/markdownItem", {"json": {
+            "id": take(fx, "items"), "percentage": 20}}), needs="items"),
+    Scenario("moveToNotFound", lambda fx: (
+        "POST", "/moveToNotFound", {"params": {"id": take(fx, "items")}}),
+        needs="items"),
+    Scenario("sendPosting", lambda fx: (
+        "POST", "/sendPosting", {"json": {"id": take(fx, "sendable")}}),
+        needs="sendable"),
+    Scenario("cancelPosting", lambda fx: (
+        "POST", "/cancelPosting", {"json": {
+            "id": take(fx, "postings"), "status": "canceled"}}),
+        needs="postings"),
+]
+
+
+async def load_fixtures(args) -> Fixtures:
+    async with async_engine.connect() as conn:
+        # Page sampling can come back empty on a small seed.
+        skus = []
+        for sample in ("TABLESAMPLE SYSTEM (10)", ""):
+            skus = [str(sku_id) for sku_id in (await conn.execute(text(
+                f"SELECT sku_id FROM sku {sample} LIMIT :n"),
+                {"n": args.fixture_skus})).scalars()]
+            if skus:
+                break
+        items = (await conn.execute(text("""
+            SELECT item_id, sku_id FROM item
+            WHERE sku_id = ANY(CAST(:skus AS uuid[]))
+              AND stock = 'VALID' AND NOT reserved_state
+        """), {"skus": skus})).all()
+        postings = [str(posting_id) for posting_id in (await conn.execute(
+            text("SELECT posting_id FROM posting "
+                 "ORDER BY created_at DESC LIMIT :n"),
+            {"n": args.fixture_postings})).scalars()]
+        tasks = [str(task_id) for task_id in (await conn.execute(text("""
+            SELECT task_id FROM task
+            WHERE posting_id = ANY(CAST(:postings AS uuid[]))
+              AND status = 'IN_WORK'
+        """), {"postings": postings})).scalars()]
+        acceptances = [str(acceptance_id) for acceptance_id in (
+            await conn.execute(
+                text("SELECT acceptance_id FROM acceptance "
+                     "ORDER BY created_at DESC LIMIT :n"),
+                {"n": args.fixture_postings})).scalars()]
+        sendable = [str(posting_id) for posting_id in (await conn.execute(
+            text("SELECT posting_id FROM posting "
+                 "WHERE posting_status = 'IN_ITEM_PICK' AND open_tasks = 0 "
+                 "LIMIT :n"),
+            {"n": args.fixture_postings})).scalars()]
+        waves = [str(wave_id) for wave_id in (await conn.execute(
+            text("SELECT wave_id FROM wave ORDER BY created_at DESC "
+                 "LIMIT :n"),
+            {"n": args.fixture_postings})).scalars()]
+        events = [(str(posting_id), event_id)
+                  for posting_id, event_id in (await conn.execute(text("""
+            SELECT posting_id, event_id FROM outbox_event
+            WHERE posting_id IS NOT NULL AND published_at IS NOT NULL
+            ORDER BY event_id DESC LIMIT :n
+        """), {"n": args.fixture_postings}))]
+
+    items_by_sku = {}
+    for item_id, sku_id in items:
+        items_by_sku.setdefault(str(sku_id), []).append(str(item_id))
+    return Fixtures(
+        skus=skus,
+        items=[str(item_id) for item_id, _ in items],
+        items_by_sku=items_by_sku,
+        postings=postings,
+        sendable=sendable,
+        tasks=tasks,
+        claims=[],
+        discounts=[],
+        acceptances=acceptances,
+        waves=waves,
+        events=events,
+        posting_lines=args.posting_lines,
+        acceptance_lines=args.acceptance_lines,
+        acceptance_units=args.acceptance_units,
+        discount_skus=args.discount_skus,
+        wave_postings=args.wave_postings,
+        location_batch=args.location_batch,
+        import_rows=args.import_rows,
+    )
+
+
+def percentile(ordered: list, share: float) -> float:
+    index = min(int(len(ordered) * share), len(ordered) - 1)
+    return round(ordered[index] * 1000, 3)
+
+
+async def first_event(client: httpx.AsyncClient, method: str, url: str,
+                      kwargs: dict) -> httpx.Response:
+    """Open an event stream and return once its first event arrived."""
+    async with client.stream(method, url, **kwargs) as response:
+        if response.status_code == 200:
+            async for line in response.aiter_lines():
+                if line.startswith("id:"):
+                    break
+    return response
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario,
+                       fx: Fixtures, requests: int, concurrency: int,
+                       count_db: bool) -> dict:
+    latencies = []
+    errors = 0
+    client_errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors, client_errors
+        while remaining > 0 and getattr(fx, scenario.needs):
+            remaining -= 1
+            method, url, kwargs = scenario.build(fx)
+            started = time.perf_counter()
+            try:
+                if scenario.stream:
+                    response = await first_event(client, method, url, kwargs)
+                else:
+                    response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            if 400 <= response.status_code < 500:
+                client_errors += 1
+            if scenario.after is not None:
+                scenario.after(fx, response)
+
+    statements_before = statements
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    issued = statements - statements_before
+
+    latencies.sort()
+    done = len(latencies)
+    return {
+        "scenario": scenario.name,
+        "requests": done,
+        "errors": errors,
+        "valid": not done or client_errors * 2 <= done,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(done / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50) if done else None,
+        "p95_ms": percentile(latencies, 0.95) if done else None,
+        "p99_ms": percentile(latencies, 0.99) if done else None,
+        "db_round_trips": (round(issued / done, 2)
+                           if count_db and done else None),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> None:
+    fx = await load_fixtures(args)
+    selected = [scenario for scenario in SCENARIOS
+                if not args.scenarios or scenario.name in args.scenarios]
+
+    if args.base_url:
+        transport = None
+        base_url = args.base_url
+    else:
+        from main import app
+
+        # A server error is a 500 to count, as it would be over the wire.
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        base_url = "http://bench"
+
+    revision = git_revision()
+    invalid = []
+    output = open(args.output, "a") if args.output else None
+    async with httpx.AsyncClient(transport=transport, base_url=base_url,
+                                 timeout=args.timeout) as client:
+        for scenario in selected:
+            if scenario.stream and transport is not None:
+                print(f"{scenario.name}: skipped, needs --base-url",
+                      file=sys.stderr)
+                continue
+            requests = (args.write_requests if scenario.write
+                        else args.requests)
+            result = await run_scenario(
+                client, scenario, fx, requests, args.concurrency,
+                count_db=transport is not None)
+            result["revision"] = revision
+            if not result["valid"]:
+                invalid.append(scenario.name)
+            line = json.dumps(result)
+            print(line)
+            if output is not None:
+                output.write(line + "\n")
+    if output is not None:
+        output.close()
+    await async_engine.dispose()
+    if invalid:
+        sys.exit("most requests were rejected with 4xx in: "
+                 + ", ".join(invalid))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="requests per read scenario")
+    parser.add_argument("--write-requests", type=int, default=200,
+                        help="requests per create* and importSkus scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="*",
+                        help="run only these scenarios, by route name")
+    parser.add_argument("--base-url")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output")
+    parser.add_argument("--fixture-skus", type=int, default=2000)
+    parser.add_argument("--fixture-postings", type=int, default=2000)
+    parser.add_argument("--posting-lines", type=int, default=50)
+    parser.add_argument("--acceptance-lines", type=int, default=20)
+    parser.add_argument("--acceptance-units", type=int, default=1000)
+    parser.add_argument("--discount-skus", type=int, default=500)
+    parser.add_argument("--wave-postings", type=int, default=20,
+                        help="postings per planPickRoute request")
+    parser.add_argument("--location-batch", type=int, default=500,
+                        help="locations per createLocations request")
+    parser.add_argument("--import-rows", type=int, default=5000,
+                        help="rows per importSkus upload")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
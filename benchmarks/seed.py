@@ -0,0 +1,134 @@
+"""Seed a migrated local database with a benchmark-sized catalogue.
+
+    python benchmarks/seed.py --skus 100000 --items 10000000 \
+        --postings 1000 --posting-lines 50
+
+SKUs, items and their ledger rows are generated server-side in chunks of
+``--chunk`` SKUs per transaction; postings go through ``create_posting``
+so they look exactly like ones made through the API. ``--sendable-postings``
+adds postings without picks, the only ones ``sendPosting`` accepts: a
+posting whose picks are all finished is sent by ``finishTask``.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sqlalchemy import text  # noqa: E402
+
+from database import async_engine, async_session_factory  # noqa: E402
+from queries.posting import create_posting  # noqa: E402
+from schemas import CreatePostingRequest, OrderedGood  # noqa: E402
+
+
+INSERT_SKUS = text("""
+    INSERT INTO sku (sku_id, actual_price, base_price, count, is_hidden)
+    SELECT gen_random_uuid(), price, price, :per_sku, false
+    FROM (SELECT round((1 + random() * 999)::numeric, 2) AS price
+          FROM generate_series(1, :count)) AS prices
+    RETURNING sku_id
+""")
+
+INSERT_ITEMS = text("""
+    INSERT INTO item (item_id, sku_id, stock, reserved_state)
+    SELECT gen_random_uuid(), skus.sku_id,
+           CASE WHEN random() < :defect_share
+                THEN 'DEFECT' ELSE 'VALID' END::skuitemstock,
+           false
+    FROM unnest(CAST(:sku_ids AS uuid[])) AS skus(sku_id),
+         generate_series(1, :per_sku)
+""")
+
+INSERT_LEDGER = text("""
+    INSERT INTO sku_stock (sku_id, valid_free, defect_free)
+    SELECT sku_id,
+           count(*) FILTER (WHERE stock = 'VALID'),
+           count(*) FILTER (WHERE stock = 'DEFECT')
+    FROM item
+    WHERE sku_id = ANY(CAST(:sku_ids AS uuid[]))
+    GROUP BY sku_id
+    ON CONFLICT (sku_id) DO NOTHING
+""")
+
+
+async def seed_catalogue(skus: int, items: int, chunk: int,
+                         defect_share: float) -> list:
+    per_sku = max(items // skus, 0)
+    sku_ids = []
+    started = time.perf_counter()
+    for offset in range(0, skus, chunk):
+        count = min(chunk, skus - offset)
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                INSERT_SKUS, {"count": count, "per_sku": per_sku})
+            chunk_ids = [str(row.sku_id) for row in result]
+            await conn.execute(INSERT_ITEMS, {
+                "sku_ids": chunk_ids,
+                "per_sku": per_sku,
+                "defect_share": defect_share,
+            })
+            await conn.execute(INSERT_LEDGER, {"sku_ids": chunk_ids})
+        sku_ids += chunk_ids
+        print(f"{len(sku_ids)}/{skus} SKUs, "
+              f"{len(sku_ids) * per_sku} items, "
+              f"{time.perf_counter() - started:.1f}s")
+    return sku_ids
+
+
+async def seed_postings(sku_ids: list, postings: int, lines: int) -> None:
+    if not sku_ids:
+        return
+    async with async_engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT DISTINCT ON (sku_id) sku_id, item_id FROM item
+            WHERE sku_id = ANY(CAST(:sku_ids AS uuid[]))
+              AND stock = 'VALID' AND NOT reserved_state
+        """), {"sku_ids": random.sample(sku_ids, min(len(sku_ids), 10_000))})
+        free_items = [(row.sku_id, row.item_id) for row in result]
+
+    for number in range(postings):
+        ordered = random.sample(free_items, min(lines, len(free_items)))
+        request = CreatePostingRequest(ordered_goods=[
+            OrderedGood(sku=sku_id, from_valid_ids=[item_id],
+                        from_defect_ids=[])
+            for sku_id, item_id in ordered
+        ])
+        async with async_session_factory() as session:
+            await create_posting(session, request)
+        if (number + 1) % 100 == 0:
+            print(f"{number + 1}/{postings} postings")
+
+
+async def seed_sendable_postings(postings: int) -> None:
+    for _ in range(postings):
+        async with async_session_factory() as session:
+            await create_posting(session,
+                                 CreatePostingRequest(ordered_goods=[]))
+
+
+async def run(args) -> None:
+    sku_ids = await seed_catalogue(args.skus, args.items, args.chunk,
+                                   args.defect_share)
+    await seed_postings(sku_ids, args.postings, args.posting_lines)
+    await seed_sendable_postings(args.sendable_postings)
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--skus", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=10_000_000)
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--defect-share", type=float, default=0.05)
+    parser.add_argument("--postings", type=int, default=1000)
+    parser.add_argument("--posting-lines", type=int, default=50)
+    parser.add_argument("--sendable-postings", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
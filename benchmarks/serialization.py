@@ -0,0 +1,93 @@
+"""Compare FastAPI's response_model path with ``FastJSONResponse``.
+
+No database is needed; a ``Posting`` payload with ``--lines`` ordered goods
+is built in memory and serialized both ways:
+
+    python benchmarks/serialization.py --lines 10 100 500
+
+``response_model`` runs what FastAPI does for a returned dict: validate it
+against the model, dump it in JSON mode and encode it with the stdlib
+``json`` module. The fast path is what the handlers do: validate the dict
+once by converting it to the msgspec Struct of ``Posting`` with ``typed``,
+then encode that with ``FastJSONResponse``.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from uuid import uuid4
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from responses import FastJSONResponse, typed  # noqa: E402
+from schemas import Posting  # noqa: E402
+
+
+def build_posting(lines: int) -> dict:
+    ordered_goods = [
+        {"sku": uuid4(), "from_valid_ids": [uuid4(), uuid4()],
+         "from_defect_ids": [uuid4()]}
+        for _ in range(lines)
+    ]
+    return {
+        "posting_id": uuid4(),
+        "posting_status": "in_item_pick",
+        "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "cost": Decimal("123456.78"),
+        "ordered_goods": ordered_goods,
+        "not_found": [uuid4() for _ in range(lines // 10)],
+        "task_ids": [
+            {"id": uuid4(), "type": "picking", "status": "in_work"}
+            for _ in range(lines * 3)
+        ],
+    }
+
+
+async def response_model_path(field, data: dict) -> bytes:
+    content = await serialize_response(field=field, response_content=data)
+    return JSONResponse(content).body
+
+
+def fast_path(data: dict) -> bytes:
+    return FastJSONResponse(typed(Posting, data)).body
+
+
+async def timed(call, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = call()
+        if asyncio.iscoroutine(result):
+            await result
+    return (time.perf_counter() - started) / repeat
+
+
+async def run(lines_list: list[int], repeat: int) -> None:
+    field = create_response_field(name="Response_getPosting", type_=Posting)
+    print(f"{'lines':>6} {'response_model ms':>18} "
+          f"{'FastJSONResponse ms':>20} {'speedup':>8}")
+    for lines in lines_list:
+        data = build_posting(lines)
+        slow = await timed(lambda: response_model_path(field, data), repeat)
+        fast = await timed(lambda: fast_path(data), repeat)
+        print(f"{lines:>6} {slow * 1000:>18.3f} {fast * 1000:>20.3f} "
+              f"{slow / fast:>7.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, nargs="+",
+                        default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.lines, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@
 
 alembic upgrade head
 
+# Shared by the gunicorn workers for Prometheus samples; must start empty.
+export PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus_multiproc
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 cd src
 
-gunicorn main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind=0.0.0.0:8000
\ No newline at end of file
+gunicorn main:app --config ../docker/gunicorn.conf.py
@@ -0,0 +1,23 @@
+import sys
+
+from prometheus_client import multiprocess
+
+bind = "0.0.0.0:8000"
+workers = 4
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Runs in the master, from src/, before any worker is forked.
+    from cache import check_workers
+
+    try:
+        check_workers(server.cfg.workers)
+    except RuntimeError as error:
+        sys.exit(str(error))
+
+
+def child_exit(server, worker):
+    # Drops the live gauges (in-flight requests, pool stats) of a worker
+    # that exited, so they no longer count in the aggregated /metrics.
+    multiprocess.mark_process_dead(worker.pid)
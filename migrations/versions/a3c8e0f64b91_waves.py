@@ -0,0 +1,74 @@
+"""waves of postings with consolidated pick lines
+
+Revision ID: a3c8e0f64b91
+Revises: f7a2d5e19c30
+Create Date: 2026-10-17 19:03:11.207845
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c8e0f64b91'
+down_revision: Union[str, None] = 'f7a2d5e19c30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'wave',
+        sa.Column('wave_id', sa.UUID(), nullable=False),
+        sa.Column('status', sa.Enum('OPEN', 'RELEASED', name='wavestatus'),
+                  nullable=False),
+        sa.Column('created_at', sa.DateTime(),
+                  server_default=sa.text("TIMEZONE('utc', now())"),
+                  nullable=False),
+        sa.Column('closes_at', sa.DateTime(), nullable=False),
+        sa.Column('released_at', sa.DateTime(), nullable=True),
+        sa.Column('postings', sa.Integer(), server_default=sa.text('0'),
+                  nullable=False),
+        sa.Column('units', sa.Integer(), server_default=sa.text('0'),
+                  nullable=False),
+        sa.PrimaryKeyConstraint('wave_id'),
+    )
+    op.create_index('ix_wave_open', 'wave', ['status'], unique=True,
+                    postgresql_where=sa.text("status = 'OPEN'"))
+    op.create_table(
+        'wave_line',
+        sa.Column('wave_id', sa.UUID(), nullable=False),
+        sa.Column('zone', sa.String(), nullable=False),
+        sa.Column('sku_id', sa.UUID(), nullable=False),
+        sa.Column('location_id', sa.UUID(), nullable=True),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['wave_id'], ['wave.wave_id']),
+        sa.ForeignKeyConstraint(['sku_id'], ['sku.sku_id']),
+        sa.ForeignKeyConstraint(['location_id'], ['location.location_id']),
+        sa.PrimaryKeyConstraint('wave_id', 'zone', 'sku_id'),
+    )
+    op.add_column('posting', sa.Column('wave_id', sa.UUID(), nullable=True))
+    op.create_foreign_key('posting_wave_id_fkey', 'posting', 'wave',
+                          ['wave_id'], ['wave_id'])
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posting_wave_id', 'posting', ['wave_id'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_posting_unwaved_created_at', 'posting',
+                        ['created_at'],
+                        postgresql_where=sa.text(
+                            "wave_id IS NULL "
+                            "AND posting_status = 'IN_ITEM_PICK'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posting_unwaved_created_at', table_name='posting')
+    op.drop_index('ix_posting_wave_id', table_name='posting')
+    op.drop_constraint('posting_wave_id_fkey', 'posting', type_='foreignkey')
+    op.drop_column('posting', 'wave_id')
+    op.drop_table('wave_line')
+    op.drop_index('ix_wave_open', table_name='wave')
+    op.drop_table('wave')
+    op.execute("DROP TYPE wavestatus")
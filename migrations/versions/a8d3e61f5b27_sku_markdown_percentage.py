@@ -0,0 +1,27 @@
+"""markdown percentage on sku for the pricing engine
+
+Revision ID: a8d3e61f5b27
+Revises: f2d86b4c7a19
+Create Date: 2026-10-17 14:02:51.406218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3e61f5b27'
+down_revision: Union[str, None] = 'f2d86b4c7a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sku', sa.Column('markdown_percentage', sa.Integer(),
+                                   nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('sku', 'markdown_percentage')
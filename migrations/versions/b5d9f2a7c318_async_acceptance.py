@@ -0,0 +1,72 @@
+"""status and progress of asynchronously processed acceptances
+
+Revision ID: b5d9f2a7c318
+Revises: a3c8e0f64b91
+Create Date: 2026-10-17 19:48:36.120974
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d9f2a7c318'
+down_revision: Union[str, None] = 'a3c8e0f64b91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    acceptance_status = sa.Enum('PENDING', 'PROCESSING', 'DONE',
+                                name='acceptancestatus')
+    acceptance_status.create(op.get_bind())
+    op.add_column('acceptance', sa.Column('status', acceptance_status,
+                                          server_default=sa.text("'DONE'"),
+                                          nullable=False))
+    op.add_column('acceptance', sa.Column('units_total', sa.Integer(),
+                                          server_default=sa.text('0'),
+                                          nullable=False))
+    op.add_column('acceptance', sa.Column('units_done', sa.Integer(),
+                                          server_default=sa.text('0'),
+                                          nullable=False))
+    op.add_column('acceptance', sa.Column('locked_until', sa.DateTime(),
+                                          nullable=True))
+    op.add_column('accepted_items', sa.Column('units_done', sa.Integer(),
+                                              server_default=sa.text('0'),
+                                              nullable=False))
+    op.add_column('accepted_items', sa.Column('location_id', sa.UUID(),
+                                              nullable=True))
+    op.create_foreign_key('accepted_items_location_id_fkey',
+                          'accepted_items', 'location',
+                          ['location_id'], ['location_id'])
+    # Acceptances so far were processed inside their request.
+    op.execute("UPDATE accepted_items SET units_done = count")
+    op.execute("""
+        UPDATE acceptance
+        SET units_total = lines.units, units_done = lines.units
+        FROM (
+            SELECT acceptance_id, sum(count) AS units
+            FROM accepted_items
+            GROUP BY acceptance_id
+        ) AS lines
+        WHERE acceptance.acceptance_id = lines.acceptance_id
+    """)
+    op.create_index('ix_acceptance_unfinished_created_at', 'acceptance',
+                    ['created_at'],
+                    postgresql_where=sa.text("status != 'DONE'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_acceptance_unfinished_created_at',
+                  table_name='acceptance')
+    op.drop_constraint('accepted_items_location_id_fkey', 'accepted_items',
+                       type_='foreignkey')
+    op.drop_column('accepted_items', 'location_id')
+    op.drop_column('accepted_items', 'units_done')
+    op.drop_column('acceptance', 'locked_until')
+    op.drop_column('acceptance', 'units_done')
+    op.drop_column('acceptance', 'units_total')
+    op.drop_column('acceptance', 'status')
+    op.execute("DROP TYPE acceptancestatus")
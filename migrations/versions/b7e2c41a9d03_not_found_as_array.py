@@ -0,0 +1,35 @@
+"""store posting not_found as an array of sku ids
+
+Revision ID: b7e2c41a9d03
+Revises: 6ca1835308e1
+Create Date: 2026-10-17 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2c41a9d03'
+down_revision: Union[str, None] = '6ca1835308e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('posting', 'not_found',
+               existing_type=sa.UUID(),
+               type_=sa.ARRAY(sa.UUID()),
+               existing_nullable=True,
+               postgresql_using='CASE WHEN not_found IS NULL THEN NULL '
+                                'ELSE ARRAY[not_found] END')
+
+
+def downgrade() -> None:
+    op.alter_column('posting', 'not_found',
+               existing_type=sa.ARRAY(sa.UUID()),
+               type_=sa.UUID(),
+               existing_nullable=True,
+               postgresql_using='not_found[1]')
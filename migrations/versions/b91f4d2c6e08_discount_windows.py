@@ -0,0 +1,52 @@
+"""discount time windows and scheduled status
+
+Revision ID: b91f4d2c6e08
+Revises: a8d3e61f5b27
+Create Date: 2026-10-17 14:48:12.573904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91f4d2c6e08'
+down_revision: Union[str, None] = 'a8d3e61f5b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A new enum value is only usable once committed, hence the
+    # autocommit block before the partial index that references it.
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE discountstatus "
+                   "ADD VALUE IF NOT EXISTS 'scheduled'")
+    op.add_column('discount', sa.Column('starts_at', sa.DateTime(),
+                                        nullable=True))
+    op.add_column('discount', sa.Column('ends_at', sa.DateTime(),
+                                        nullable=True))
+    op.add_column('discount', sa.Column('reprice_pending', sa.Boolean(),
+                                        server_default=sa.text('false'),
+                                        nullable=False))
+    op.create_index('ix_discount_scheduled_starts_at', 'discount',
+                    ['starts_at'],
+                    postgresql_where=sa.text("status = 'scheduled'"))
+    op.create_index('ix_discount_active_ends_at', 'discount', ['ends_at'],
+                    postgresql_where=sa.text("status = 'active'"))
+    op.create_index('ix_discount_reprice_pending', 'discount',
+                    ['discount_id'],
+                    postgresql_where=sa.text('reprice_pending'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_discount_reprice_pending', table_name='discount')
+    op.drop_index('ix_discount_active_ends_at', table_name='discount')
+    op.drop_index('ix_discount_scheduled_starts_at', table_name='discount')
+    op.drop_column('discount', 'reprice_pending')
+    op.drop_column('discount', 'ends_at')
+    op.drop_column('discount', 'starts_at')
+    op.execute("UPDATE discount SET status = 'finished' "
+               "WHERE status = 'scheduled'")
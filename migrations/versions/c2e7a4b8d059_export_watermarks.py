@@ -0,0 +1,39 @@
+"""item creation time and created_at indexes for incremental exports
+
+Revision ID: c2e7a4b8d059
+Revises: b5d9f2a7c318
+Create Date: 2026-10-17 20:31:54.702118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e7a4b8d059'
+down_revision: Union[str, None] = 'b5d9f2a7c318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # now() is evaluated once, so existing items get the migration time
+    # without rewriting the table.
+    op.add_column('item', sa.Column(
+        'created_at', sa.DateTime(),
+        server_default=sa.text("TIMEZONE('utc', now())"), nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_created_at_item_id', 'item',
+                        ['created_at', 'item_id'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_sku_created_at_sku_id', 'sku',
+                        ['created_at', 'sku_id'],
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sku_created_at_sku_id', table_name='sku')
+    op.drop_index('ix_item_created_at_item_id', table_name='item')
+    op.drop_column('item', 'created_at')
@@ -0,0 +1,50 @@
+"""per-sku stock ledger
+
+Revision ID: c3f18d52e6a7
+Revises: b7e2c41a9d03
+Create Date: 2026-10-17 11:04:19.270556
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f18d52e6a7'
+down_revision: Union[str, None] = 'b7e2c41a9d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+STOCKS = {'valid': 'VALID', 'defect': 'DEFECT', 'not_found': 'NOT_FOUND'}
+
+
+def upgrade() -> None:
+    op.create_table('sku_stock',
+    sa.Column('sku_id', sa.UUID(), nullable=False),
+    *[sa.Column(f'{stock}_{state}', sa.Integer(),
+                server_default=sa.text('0'), nullable=False)
+      for stock in STOCKS for state in ('free', 'reserved')],
+    sa.ForeignKeyConstraint(['sku_id'], ['sku.sku_id'], ),
+    sa.PrimaryKeyConstraint('sku_id')
+    )
+
+    columns = ', '.join(f'{stock}_{state}'
+                        for stock in STOCKS for state in ('free', 'reserved'))
+    counts = ', '.join(
+        f"count(item.item_id) FILTER (WHERE item.stock = '{label}' "
+        f"AND {'' if state == 'reserved' else 'NOT '}item.reserved_state)"
+        for label in STOCKS.values() for state in ('free', 'reserved')
+    )
+    op.execute(
+        f'INSERT INTO sku_stock (sku_id, {columns}) '
+        f'SELECT sku.sku_id, {counts} '
+        f'FROM sku LEFT JOIN item ON item.sku_id = sku.sku_id '
+        f'GROUP BY sku.sku_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sku_stock')
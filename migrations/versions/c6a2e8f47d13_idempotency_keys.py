@@ -0,0 +1,45 @@
+"""idempotency keys for the create routes
+
+Revision ID: c6a2e8f47d13
+Revises: b91f4d2c6e08
+Create Date: 2026-10-17 15:36:40.221587
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a2e8f47d13'
+down_revision: Union[str, None] = 'b91f4d2c6e08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'idempotency_key',
+        sa.Column('route', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('request_hash', sa.String(), nullable=False),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_body', postgresql.JSONB(astext_type=sa.Text()),
+                  nullable=True),
+        sa.Column('created_at', sa.DateTime(),
+                  server_default=sa.text("TIMEZONE('utc', now())"),
+                  nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('route', 'key'),
+    )
+    op.create_index('ix_idempotency_key_expires_at', 'idempotency_key',
+                    ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_key_expires_at',
+                  table_name='idempotency_key')
+    op.drop_table('idempotency_key')
@@ -0,0 +1,56 @@
+"""transactional outbox for posting and task events
+
+Revision ID: d3b7f1a05c62
+Revises: c6a2e8f47d13
+Create Date: 2026-10-17 16:21:05.834172
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3b7f1a05c62'
+down_revision: Union[str, None] = 'c6a2e8f47d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox_event',
+        sa.Column('event_id', sa.BigInteger(), sa.Identity(),
+                  nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('aggregate_id', sa.UUID(), nullable=False),
+        sa.Column('posting_id', sa.UUID(), nullable=True),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()),
+                  nullable=False),
+        sa.Column('created_at', sa.DateTime(),
+                  server_default=sa.text("TIMEZONE('utc', now())"),
+                  nullable=False),
+        sa.Column('published_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('event_id'),
+    )
+    op.create_index('ix_outbox_event_unpublished', 'outbox_event',
+                    ['event_id'],
+                    postgresql_where=sa.text('published_at IS NULL'))
+    op.create_index('ix_outbox_event_posting_id_event_id', 'outbox_event',
+                    ['posting_id', 'event_id'])
+    op.create_index('ix_outbox_event_aggregate_id_event_id', 'outbox_event',
+                    ['aggregate_id', 'event_id'])
+    op.create_index('ix_outbox_event_published_at', 'outbox_event',
+                    ['published_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_event_published_at', table_name='outbox_event')
+    op.drop_index('ix_outbox_event_aggregate_id_event_id',
+                  table_name='outbox_event')
+    op.drop_index('ix_outbox_event_posting_id_event_id',
+                  table_name='outbox_event')
+    op.drop_index('ix_outbox_event_unpublished', table_name='outbox_event')
+    op.drop_table('outbox_event')
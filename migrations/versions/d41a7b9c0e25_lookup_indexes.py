@@ -0,0 +1,52 @@
+"""indexes for hot lookup predicates
+
+Revision ID: d41a7b9c0e25
+Revises: c3f18d52e6a7
+Create Date: 2026-10-17 11:48:02.917344
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7b9c0e25'
+down_revision: Union[str, None] = 'c3f18d52e6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_item_sku_id_item_id', 'item', ['sku_id', 'item_id'], None),
+    ('ix_item_free_sku_id_stock', 'item', ['sku_id', 'stock'],
+     'NOT reserved_state'),
+    ('ix_ordered_goods_posting_id', 'ordered_goods', ['posting_id'], None),
+    ('ix_task_posting_id', 'task', ['posting_id'], None),
+    ('ix_task_acceptance_id', 'task', ['acceptance_id'], None),
+    ('ix_task_task_target_id', 'task', ['task_target_id'], None),
+    ('ix_accepted_items_acceptance_id', 'accepted_items', ['acceptance_id'],
+     None),
+    ('ix_discount_sku_association_sku_id', 'discount_sku_association',
+     ['sku_id'], None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps item and task writable while the indexes build.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
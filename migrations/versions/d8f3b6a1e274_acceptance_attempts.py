@@ -0,0 +1,37 @@
+"""attempts counter and FAILED status for background acceptances
+
+Revision ID: d8f3b6a1e274
+Revises: c2e7a4b8d059
+Create Date: 2026-10-17 21:12:40.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b6a1e274'
+down_revision: Union[str, None] = 'c2e7a4b8d059'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE acceptancestatus "
+                   "ADD VALUE IF NOT EXISTS 'FAILED'")
+    op.add_column('acceptance', sa.Column('attempts', sa.Integer(),
+                                          server_default=sa.text('0'),
+                                          nullable=False))
+    op.add_column('acceptance', sa.Column('last_error', sa.String(),
+                                          nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('acceptance', 'last_error')
+    op.drop_column('acceptance', 'attempts')
+    # Postgres cannot drop an enum value; failed acceptances are retried.
+    op.execute("UPDATE acceptance SET status = 'PENDING' "
+               "WHERE status = 'FAILED'")
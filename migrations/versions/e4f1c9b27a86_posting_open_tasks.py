@@ -0,0 +1,40 @@
+"""open picking task counter on posting
+
+Revision ID: e4f1c9b27a86
+Revises: d3b7f1a05c62
+Create Date: 2026-10-17 17:08:42.913550
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f1c9b27a86'
+down_revision: Union[str, None] = 'd3b7f1a05c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posting', sa.Column('open_tasks', sa.Integer(),
+                                       server_default=sa.text('0'),
+                                       nullable=False))
+    op.execute("""
+        UPDATE posting
+        SET open_tasks = picks.open_tasks
+        FROM (
+            SELECT posting_id, count(*) AS open_tasks
+            FROM task
+            WHERE type = 'PICKING' AND status = 'IN_WORK'
+            GROUP BY posting_id
+        ) AS picks
+        WHERE posting.posting_id = picks.posting_id
+          AND posting.posting_status = 'IN_ITEM_PICK'
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('posting', 'open_tasks')
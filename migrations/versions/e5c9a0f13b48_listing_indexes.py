@@ -0,0 +1,42 @@
+"""indexes for keyset listings of tasks and postings
+
+Revision ID: e5c9a0f13b48
+Revises: d41a7b9c0e25
+Create Date: 2026-10-17 12:31:55.604170
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c9a0f13b48'
+down_revision: Union[str, None] = 'd41a7b9c0e25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_task_created_at_task_id', 'task', ['created_at', 'task_id']),
+    ('ix_task_type_status_created_at', 'task',
+     ['type', 'status', 'created_at', 'task_id']),
+    ('ix_posting_created_at_posting_id', 'posting',
+     ['created_at', 'posting_id']),
+    ('ix_posting_status_created_at', 'posting',
+     ['posting_status', 'created_at', 'posting_id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,36 @@
+"""claim and lease columns for the task work queue
+
+Revision ID: f2d86b4c7a19
+Revises: e5c9a0f13b48
+Create Date: 2026-10-17 13:10:27.118903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d86b4c7a19'
+down_revision: Union[str, None] = 'e5c9a0f13b48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('task', sa.Column('claimed_by', sa.String(), nullable=True))
+    op.add_column('task', sa.Column('lease_expires_at', sa.DateTime(),
+                                    nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_task_open_created_at', 'task', ['created_at'],
+                        postgresql_where=sa.text("status = 'IN_WORK'"),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_task_open_created_at', table_name='task',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('task', 'lease_expires_at')
+    op.drop_column('task', 'claimed_by')
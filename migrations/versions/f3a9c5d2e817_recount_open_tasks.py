@@ -0,0 +1,35 @@
+"""recount open picks without cancelled tasks
+
+Revision ID: f3a9c5d2e817
+Revises: d8f3b6a1e274
+Create Date: 2026-10-18 09:41:27.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c5d2e817'
+down_revision: Union[str, None] = 'd8f3b6a1e274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Cancelled picks used to stay counted, leaving postings unsendable.
+    op.execute("""
+        UPDATE posting
+        SET open_tasks = coalesce((
+            SELECT count(*)
+            FROM task
+            WHERE task.posting_id = posting.posting_id
+              AND type = 'PICKING' AND status = 'IN_WORK'
+        ), 0)
+        WHERE posting_status = 'IN_ITEM_PICK'
+    """)
+
+
+def downgrade() -> None:
+    pass
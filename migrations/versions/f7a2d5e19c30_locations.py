@@ -0,0 +1,48 @@
+"""storage locations for items and pick order of tasks
+
+Revision ID: f7a2d5e19c30
+Revises: e4f1c9b27a86
+Create Date: 2026-10-17 18:12:27.550318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a2d5e19c30'
+down_revision: Union[str, None] = 'e4f1c9b27a86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'location',
+        sa.Column('location_id', sa.UUID(), nullable=False),
+        sa.Column('code', sa.String(), nullable=False),
+        sa.Column('zone', sa.String(), nullable=False),
+        sa.Column('x', sa.Float(), nullable=False),
+        sa.Column('y', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('location_id'),
+        sa.UniqueConstraint('code'),
+    )
+    op.add_column('item', sa.Column('location_id', sa.UUID(), nullable=True))
+    op.create_foreign_key('item_location_id_fkey', 'item', 'location',
+                          ['location_id'], ['location_id'])
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_sku_id_location_id', 'item',
+                        ['sku_id', 'location_id'],
+                        postgresql_where=sa.text('location_id IS NOT NULL'),
+                        postgresql_concurrently=True)
+    op.add_column('task', sa.Column('pick_seq', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('task', 'pick_seq')
+    op.drop_index('ix_item_sku_id_location_id', table_name='item')
+    op.drop_constraint('item_location_id_fkey', 'item', type_='foreignkey')
+    op.drop_column('item', 'location_id')
+    op.drop_table('location')
@@ -0,0 +1,168 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from uuid import UUID
+
+import orjson
+
+from config import settings
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL.
+
+    Invalidations only reach the worker that performed the write, so it
+    is for single-worker deployments; ``check_workers`` refuses it
+    otherwise.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._version = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def version(self) -> int:
+        return self._version
+
+    async def bump(self) -> None:
+        self._version += 1
+
+
+class RedisBackend:
+    """Cache stored in Redis, shared by every worker.
+
+    ``client`` is anything exposing the async ``get``/``set``/``delete``/
+    ``incr`` subset of ``redis.asyncio.Redis``.
+    """
+
+    version_key = "cache:version"
+
+    def __init__(self, client, ttl: int, prefix: str = "cache:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.client.set(self.prefix + key,
+                              orjson.dumps(value, default=str), ex=self.ttl)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def version(self) -> int:
+        return int(await self.client.get(self.version_key) or 0)
+
+    async def bump(self) -> None:
+        await self.client.incr(self.version_key)
+
+
+class Cache:
+    """Read-through cache for SKU and item-list reads.
+
+    Writers call :meth:`invalidate` after their commit. A reader that
+    loaded from the database concurrently with such a write notices the
+    version bump after storing its value and drops it again, so a stale
+    row cannot outlive the invalidation.
+    """
+
+    delete_chunk = 1000
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    async def get_or_load(self, key: str,
+                          loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.backend is None:
+            return await loader()
+
+        value = await self.backend.get(key)
+        if value is not None:
+            return value
+
+        version = await self.backend.version()
+        value = await loader()
+        if value is not None:
+            await self.backend.set(key, value)
+            if await self.backend.version() != version:
+                await self.backend.delete(key)
+        return value
+
+    async def invalidate(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if self.backend is None or not keys:
+            return
+        await self.backend.bump()
+        for start in range(0, len(keys), self.delete_chunk):
+            await self.backend.delete(*keys[start:start + self.delete_chunk])
+
+    async def invalidate_skus(self, sku_ids: Iterable[UUID],
+                              info: bool = True, items: bool = True) -> None:
+        keys = []
+        for sku_id in set(sku_ids):
+            if info:
+                keys.append(sku_key(sku_id))
+            if items:
+                keys.append(sku_items_key(sku_id))
+        await self.invalidate(keys)
+
+
+def sku_key(sku_id: UUID) -> str:
+    return f"sku:{sku_id}"
+
+
+def sku_items_key(sku_id: UUID) -> str:
+    return f"sku_items:{sku_id}"
+
+
+def check_workers(workers: int) -> None:
+    """Refuse the memory backend when several workers serve requests.
+
+    The other workers would keep serving SKUs a write just invalidated
+    until ``CACHE_TTL`` runs out.
+    """
+    if settings.CACHE_BACKEND == "memory" and workers > 1:
+        raise RuntimeError(
+            f"CACHE_BACKEND=memory cannot be invalidated across {workers} "
+            f"workers; use CACHE_BACKEND=redis or a single worker")
+
+
+def build_cache() -> Cache:
+    if settings.CACHE_BACKEND == "redis":
+        from redis import asyncio as redis
+
+        client = redis.from_url(settings.REDIS_URL)
+        return Cache(RedisBackend(client, settings.CACHE_TTL))
+    if settings.CACHE_BACKEND == "memory":
+        return Cache(MemoryBackend(settings.CACHE_MAX_ENTRIES,
+                                   settings.CACHE_TTL))
+    return Cache()
+
+
+cache = build_cache()
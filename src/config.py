@@ -8,6 +8,115 @@ class Settings(BaseSettings):
     DB_PASS: str
     DB_NAME: str
 
+    # Per gunicorn worker: 4 workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # must stay below Postgres max_connections (100 by default).
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_ECHO: bool = False
+    # Dev mode: log statement shapes one request runs this many times
+    # (N+1 queries). 0 disables the check.
+    N_PLUS_ONE_WARN_THRESHOLD: int = 0
+    # Set to 0 behind pgbouncer in transaction pooling mode.
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Read replicas for GET routes, as a JSON list of
+    # postgresql+asyncpg:// URLs. A replica is skipped while it fails its
+    # health check or lags more than DB_REPLICA_MAX_LAG seconds; clients
+    # read from the primary for READ_YOUR_WRITES_SECONDS after a write.
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 5
+    DB_REPLICA_CHECK_INTERVAL: float = 5
+    DB_REPLICA_CHECK_TIMEOUT: float = 2
+    READ_YOUR_WRITES_SECONDS: float = 10
+
+    # "none", "memory" (per worker process, so a single worker only) or
+    # "redis" (shared by workers).
+    CACHE_BACKEND: str = "none"
+    CACHE_TTL: int = 30
+    CACHE_MAX_ENTRIES: int = 10_000
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Discount windows are applied by one worker at a time, every
+    # DISCOUNT_SCHEDULER_INTERVAL seconds, re-pricing at most
+    # DISCOUNT_REPRICE_CHUNK SKUs per transaction.
+    DISCOUNT_SCHEDULER_ENABLED: bool = True
+    DISCOUNT_SCHEDULER_INTERVAL: float = 5
+    DISCOUNT_SCHEDULER_BATCH: int = 1000
+    DISCOUNT_REPRICE_CHUNK: int = 1000
+
+    # Idempotency-Key handling on the create routes: keys are remembered
+    # for IDEMPOTENCY_TTL seconds, a request holding a key is presumed dead
+    # after IDEMPOTENCY_LOCK_SECONDS, and duplicates wait up to
+    # IDEMPOTENCY_WAIT_SECONDS for its result.
+    IDEMPOTENCY_TTL: int = 86400
+    IDEMPOTENCY_LOCK_SECONDS: int = 120
+    IDEMPOTENCY_WAIT_SECONDS: float = 30
+    IDEMPOTENCY_PURGE_INTERVAL: float = 300
+    IDEMPOTENCY_PURGE_BATCH: int = 10_000
+
+    # Task and posting events are written to the outbox with the state
+    # change and NOTIFY'd by a relay every OUTBOX_RELAY_INTERVAL seconds;
+    # published events are kept OUTBOX_RETENTION_HOURS for SSE clients
+    # resuming with Last-Event-ID. A subscriber falling EVENTS_QUEUE_SIZE
+    # events behind is disconnected and has to resume. A resume also
+    # repeats the events published EVENTS_REPLAY_MARGIN_SECONDS before the
+    # last one seen, as ids are not assigned in commit order.
+    OUTBOX_RELAY_INTERVAL: float = 0.5
+    OUTBOX_RELAY_BATCH: int = 500
+    OUTBOX_RETENTION_HOURS: float = 72
+    OUTBOX_PURGE_INTERVAL: float = 300
+    EVENTS_QUEUE_SIZE: int = 1000
+    EVENTS_HEARTBEAT_SECONDS: float = 15
+    EVENTS_REPLAY_LIMIT: int = 10_000
+    EVENTS_REPLAY_MARGIN_SECONDS: float = 10
+
+    # Pick routes start and end at the packing station (PICK_DEPOT_X/Y,
+    # in the location coordinates); 2-opt improvement of a route stops
+    # after PICK_ROUTE_BUDGET_MS.
+    PICK_DEPOT_X: float = 0
+    PICK_DEPOT_Y: float = 0
+    PICK_ROUTE_BUDGET_MS: float = 20
+    PICK_ROUTE_WINDOW: int = 25
+
+    # Open postings are collected into a wave for WAVE_WINDOW_SECONDS or
+    # until it holds WAVE_MAX_POSTINGS; one worker at a time adds up to
+    # WAVE_PLANNER_BATCH postings per transaction.
+    WAVE_PLANNER_ENABLED: bool = True
+    WAVE_PLANNER_INTERVAL: float = 5
+    WAVE_WINDOW_SECONDS: float = 300
+    WAVE_MAX_POSTINGS: int = 500
+    WAVE_PLANNER_BATCH: int = 200
+
+    # createAcceptance?mode=async hands the items to ACCEPTANCE_WORKERS
+    # background tasks per app worker, which insert ACCEPTANCE_CHUNK units
+    # per transaction and lose an acceptance to another worker when they
+    # stop renewing its lease for ACCEPTANCE_LEASE_SECONDS. An acceptance
+    # still unfinished after ACCEPTANCE_MAX_ATTEMPTS claims is FAILED.
+    ACCEPTANCE_WORKERS: int = 2
+    ACCEPTANCE_CHUNK: int = 5000
+    ACCEPTANCE_LEASE_SECONDS: float = 60
+    ACCEPTANCE_MAX_ATTEMPTS: int = 5
+    ACCEPTANCE_POLL_INTERVAL: float = 2
+
+    # /importSkus COPYs parsed rows IMPORT_COPY_BATCH at a time and lists
+    # at most IMPORT_MAX_ERRORS rejected rows in its report.
+    IMPORT_COPY_BATCH: int = 10_000
+    IMPORT_MAX_ERRORS: int = 1000
+
+    # jobs.export_snapshot streams EXPORT_BATCH rows per record batch into
+    # EXPORT_DIR. Incremental runs stop EXPORT_WATERMARK_LAG seconds short
+    # of now, so rows of transactions still in flight are not skipped.
+    EXPORT_DIR: str = "exports"
+    EXPORT_BATCH: int = 50_000
+    EXPORT_WATERMARK_LAG: float = 60
+
+    @property
+    def DATABASE_URL(self):
+        return f"postgresql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
     @property
     def DATABASE_URL_asyncpg(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -16,4 +125,4 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
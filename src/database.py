@@ -1,16 +1,151 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from config import settings
 
 
-async_engine = create_async_engine(
-    url=settings.DATABASE_URL_asyncpg,
-    echo=True,
-)
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that counts checkouts and time spent waiting for one."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        # With unlimited overflow (-1) a checkout never waits.
+        exhausted = (self._max_overflow >= 0 and self.checkedout()
+                     >= self.size() + self._max_overflow)
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            if exhausted:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - started
+        self.checkouts += 1
+        return connection
+
+
+def create_engine(url: str):
+    return create_async_engine(
+        url=url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+async_engine = create_engine(settings.DATABASE_URL_asyncpg)
 
 async_session_factory = async_sessionmaker(async_engine)
 
 
+class Replica:
+    def __init__(self, url: str):
+        self.engine = create_engine(url)
+        self.session_factory = async_sessionmaker(self.engine)
+        self.healthy = True
+
+
+class ReplicaSet:
+    """Round-robin over the replicas that passed their last health check.
+
+    With no healthy replica (or none configured) reads fall back to the
+    primary.
+    """
+
+    # Replay lag in seconds; 0 when everything received has been replayed,
+    # so an idle primary does not make its replicas look stale.
+    lag_query = text(
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()"
+        " THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM"
+        " now() - pg_last_xact_replay_timestamp()), 0) END"
+    )
+
+    def __init__(self, urls: List[str], max_lag: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.max_lag = max_lag
+        self._turn = itertools.count()
+
+    def session_factory(self) -> async_sessionmaker:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return async_session_factory
+        return healthy[next(self._turn) % len(healthy)].session_factory
+
+    async def replay_lag(self, replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            return float(await conn.scalar(self.lag_query))
+
+    async def check(self, timeout: float) -> None:
+        for number, replica in enumerate(self.replicas):
+            try:
+                lag = await asyncio.wait_for(self.replay_lag(replica),
+                                             timeout)
+                healthy = lag <= self.max_lag
+            except Exception:
+                lag, healthy = None, False
+            if healthy != replica.healthy:
+                logger.warning("replica %d is now %s (lag: %s s)", number,
+                               "healthy" if healthy else "unhealthy", lag)
+            replica.healthy = healthy
+
+    async def run_health_checks(self, interval: float,
+                                timeout: float) -> None:
+        while True:
+            await self.check(timeout)
+            await asyncio.sleep(interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replicas = ReplicaSet(settings.DB_REPLICA_URLS, settings.DB_REPLICA_MAX_LAG)
+
+
+def pool_stats() -> dict:
+    pool = async_engine.sync_engine.pool
+    return {
+        "pid": os.getpid(),
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.checkouts,
+        "waits": pool.waits,
+        "wait_seconds": round(pool.wait_seconds, 6),
+        "timeouts": pool.timeouts,
+    }
+
+
 class Base(DeclarativeBase):
     pass
@@ -1,9 +1,15 @@
+import time
 from typing import AsyncIterable, Annotated
 
-from database import async_session_factory
+from database import async_session_factory, replicas
+from config import settings
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
 
 
 async def provide_session() -> AsyncIterable[AsyncSession]:
@@ -11,3 +17,59 @@ async def provide_session() -> AsyncIterable[AsyncSession]:
         yield session
 
 SessionDep = Annotated[AsyncSession, Depends(provide_session)]
+
+
+def wrote_recently(request: Request) -> bool:
+    try:
+        return float(request.cookies[READ_PRIMARY_COOKIE]) > time.time()
+    except (KeyError, ValueError):
+        return False
+
+
+def provide_read_session_factory(request: Request) -> async_sessionmaker:
+    """A replica for GET requests, unless the client wrote recently."""
+    if request.method != "GET" or wrote_recently(request):
+        return async_session_factory
+    return replicas.session_factory()
+
+ReadSessionFactoryDep = Annotated[async_sessionmaker,
+                                  Depends(provide_read_session_factory)]
+
+
+async def provide_read_session(
+        session_factory: ReadSessionFactoryDep
+        ) -> AsyncIterable[AsyncSession]:
+    async with session_factory() as session:
+        yield session
+
+ReadSessionDep = Annotated[AsyncSession, Depends(provide_read_session)]
+
+
+class ReadYourWritesMiddleware:
+    """Pin a client to the primary for a while after each write.
+
+    Every successful request with an unsafe method sets a cookie holding
+    the time until which that client's GETs skip the replicas, so it reads
+    what it just wrote even while the replicas lag behind.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if (message["type"] == "http.response.start"
+                    and message["status"] < 400):
+                seconds = settings.READ_YOUR_WRITES_SECONDS
+                cookie = (f"{READ_PRIMARY_COOKIE}={time.time() + seconds:.3f}"
+                          f"; Max-Age={int(seconds)}; Path=/; HttpOnly;"
+                          f" SameSite=Lax")
+                message["headers"] = [*message.get("headers", []),
+                                      (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
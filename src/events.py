@@ -0,0 +1,130 @@
+"""Fan out outbox notifications to Server-Sent Events subscribers.
+
+Each worker process keeps one dedicated connection LISTENing on the
+outbox channel, outside the session pool, and hands every notification
+to the in-process subscribers whose filter it matches. A subscriber that
+falls ``EVENTS_QUEUE_SIZE`` events behind is disconnected; its client
+reconnects with ``Last-Event-ID`` and catches up from the outbox table.
+Delivery is at-least-once: a resumed stream can repeat events the client
+has already seen, which it must skip by their ``id``.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Optional, Set
+from uuid import UUID
+
+import asyncpg
+import orjson
+
+from config import settings
+from database import async_session_factory
+from queries.outbox import OUTBOX_CHANNEL, replay_events
+from responses import dumps
+
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    def __init__(self, posting_id: Optional[UUID], task_id: Optional[UUID]):
+        self.posting_id = None if posting_id is None else str(posting_id)
+        self.task_id = None if task_id is None else str(task_id)
+        self.queue: asyncio.Queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        return ((self.posting_id is None
+                 or event["posting_id"] == self.posting_id)
+                and (self.task_id is None
+                     or event["aggregate_id"] == self.task_id))
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+
+    def subscribe(self, posting_id: Optional[UUID],
+                  task_id: Optional[UUID]) -> Subscriber:
+        subscriber = Subscriber(posting_id, task_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def dispatch(self, connection, pid, channel, payload: str) -> None:
+        event = orjson.loads(payload)
+        for subscriber in self.subscribers:
+            if not subscriber.overflowed and subscriber.matches(event):
+                subscriber.push(event)
+
+    async def listen(self, retry_seconds: float = 1) -> None:
+        """LISTEN for the lifetime of the app, reconnecting on errors."""
+        while True:
+            try:
+                connection = await asyncpg.connect(settings.DATABASE_URL)
+            except (OSError, asyncpg.PostgresError):
+                logger.exception("cannot connect to listen for events")
+                await asyncio.sleep(retry_seconds)
+                continue
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(OUTBOX_CHANNEL, self.dispatch)
+                await lost.wait()
+                logger.warning("event listener connection lost")
+            finally:
+                await connection.close()
+
+
+hub = EventHub()
+
+
+def format_event(event: dict) -> bytes:
+    return (f"id: {event['id']}\nevent: {event['type']}\n"
+            f"data: ").encode() + dumps(event) + b"\n\n"
+
+
+async def stream_events(posting_id: Optional[UUID], task_id: Optional[UUID],
+                        last_event_id: Optional[int]) -> AsyncIterator[bytes]:
+    """SSE stream of the events matching the filters.
+
+    The subscription starts before the replay of missed events, so nothing
+    published in between is lost; events delivered by both are sent once.
+    Ids are not in commit order, so the replay also repeats the events
+    published shortly before ``last_event_id``; see ``replay_events``.
+    """
+    subscriber = hub.subscribe(posting_id, task_id)
+    try:
+        replayed = set()
+        if last_event_id is not None:
+            async with async_session_factory() as session:
+                missed = await replay_events(
+                    session, last_event_id, posting_id, task_id,
+                    settings.EVENTS_REPLAY_LIMIT,
+                    settings.EVENTS_REPLAY_MARGIN_SECONDS)
+            for event in missed:
+                yield format_event(event)
+            replayed = {event["id"] for event in missed}
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                return
+            if event["id"] not in replayed:
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,84 @@
+"""Process acceptances created with ``mode=async``.
+
+The app runs ``ACCEPTANCE_WORKERS`` copies of :func:`run_forever` in its
+lifespan; they poll every ``ACCEPTANCE_POLL_INTERVAL`` seconds and are
+woken early when this process enqueues an acceptance. To drain the queue
+by hand, from ``src``:
+
+    python -m jobs.acceptance_worker
+"""
+import asyncio
+import logging
+
+from config import settings
+from database import async_engine, async_session_factory
+from queries.acceptance import claim_acceptance, fail_attempt, process_acceptance
+
+
+logger = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+
+
+def wake() -> None:
+    _wakeup.set()
+
+
+async def run_once() -> int:
+    """Process acceptances until none is left to claim.
+
+    An acceptance that raises is recorded as a failed attempt and the
+    worker moves on to the next one.
+    """
+    processed = 0
+    async with async_session_factory() as session:
+        while True:
+            acceptance_id = await claim_acceptance(
+                session, settings.ACCEPTANCE_LEASE_SECONDS,
+                settings.ACCEPTANCE_MAX_ATTEMPTS)
+            if acceptance_id is None:
+                return processed
+            try:
+                finished = await process_acceptance(
+                    session, acceptance_id, settings.ACCEPTANCE_CHUNK,
+                    settings.ACCEPTANCE_LEASE_SECONDS)
+            except Exception as error:
+                logger.exception("acceptance %s failed", acceptance_id)
+                if await fail_attempt(session, acceptance_id, repr(error),
+                                      settings.ACCEPTANCE_MAX_ATTEMPTS):
+                    logger.error("acceptance %s gave up after %d attempts",
+                                 acceptance_id,
+                                 settings.ACCEPTANCE_MAX_ATTEMPTS)
+                continue
+            if finished:
+                processed += 1
+                logger.info("acceptance %s processed", acceptance_id)
+            else:
+                logger.warning("acceptance %s was taken over by another "
+                               "worker", acceptance_id)
+
+
+async def run_forever() -> None:
+    while True:
+        try:
+            await run_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("acceptance worker failed")
+        try:
+            await asyncio.wait_for(_wakeup.wait(),
+                                   settings.ACCEPTANCE_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+async def main() -> None:
+    print(f"{await run_once()} acceptance(s) processed")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""Start and end time-windowed discounts and re-price their SKUs.
+
+The app runs :func:`run_forever` in its lifespan; to run one pass by hand,
+from ``src``:
+
+    python -m jobs.discount_scheduler
+"""
+import asyncio
+import logging
+import random
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from config import settings
+from database import async_engine, async_session_factory
+from queries.discount import (advance_discount_windows,
+                              reprice_pending_discounts)
+
+
+logger = logging.getLogger(__name__)
+
+# Every gunicorn worker runs the loop; this session-level advisory lock
+# lets one of them do a pass while the others skip it.
+ADVISORY_LOCK_KEY = 0x646973636F756E74
+
+
+async def run_once() -> None:
+    async with async_engine.connect() as conn:
+        locked = await conn.scalar(
+            select(func.pg_try_advisory_lock(ADVISORY_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return
+        try:
+            async with async_session_factory(bind=conn) as session:
+                moved = await advance_discount_windows(
+                    session, settings.DISCOUNT_SCHEDULER_BATCH)
+                changed = await reprice_pending_discounts(
+                    session, settings.DISCOUNT_SCHEDULER_BATCH,
+                    settings.DISCOUNT_REPRICE_CHUNK)
+            if moved or changed:
+                logger.info("discount windows: %d discounts moved, "
+                            "%d SKUs re-priced", moved, len(changed))
+        finally:
+            await conn.scalar(
+                select(func.pg_advisory_unlock(ADVISORY_LOCK_KEY)))
+            await conn.commit()
+
+
+async def run_forever() -> None:
+    interval = settings.DISCOUNT_SCHEDULER_INTERVAL
+    # Workers start together; spread their first wake-up over an interval.
+    await asyncio.sleep(random.uniform(0, interval))
+    while True:
+        try:
+            await run_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("discount scheduler pass failed")
+        await asyncio.sleep(interval)
+
+
+async def main() -> None:
+    await run_once()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""Dump the sku, item, task and posting tables to Parquet or Arrow files.
+
+Run from ``src``:
+
+    python -m jobs.export_snapshot [--tables item,task] [--format arrow]
+                                   [--out DIR] [--full]
+
+Each run writes ``<table>-<cutoff>.<ext>`` per table holding the rows
+created since the previous run; ``--full`` exports every row instead.
+All tables are read from one snapshot through server-side cursors, so
+memory use is bounded by ``EXPORT_BATCH`` rows whatever the table size.
+Rows are only picked up by ``created_at``; later updates to rows already
+exported reach the files with the next ``--full`` export.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import DateTime, Interval, cast, func
+from sqlalchemy.future import select
+
+from config import settings
+from database import async_engine
+from queries.export import EXPORTS, arrow_schema, stream_batches
+
+
+logger = logging.getLogger(__name__)
+
+WATERMARKS = "watermarks.json"
+
+
+def load_watermarks(out: str) -> dict:
+    try:
+        with open(os.path.join(out, WATERMARKS)) as file:
+            return {table: datetime.fromisoformat(value)
+                    for table, value in json.load(file).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def save_watermarks(out: str, watermarks: dict) -> None:
+    path = os.path.join(out, WATERMARKS)
+    with open(path + ".tmp", "w") as file:
+        json.dump({table: value.isoformat()
+                   for table, value in watermarks.items()}, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def open_writer(path: str, schema: pa.Schema, output_format: str):
+    if output_format == "parquet":
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+async def export_table(conn, table: str, since: Optional[datetime],
+                       until: datetime, out: str, output_format: str) -> int:
+    ext = "parquet" if output_format == "parquet" else "arrow"
+    path = os.path.join(out, f"{table}-{until:%Y%m%dT%H%M%S}.{ext}")
+    rows = 0
+    writer = open_writer(path + ".tmp", arrow_schema(table), output_format)
+    try:
+        async for batch in stream_batches(conn, table, since, until,
+                                          settings.EXPORT_BATCH):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        writer.close()
+        os.remove(path + ".tmp")
+        raise
+    writer.close()
+    os.replace(path + ".tmp", path)
+    return rows
+
+
+async def run(tables: List[str], out: str, output_format: str,
+              full: bool) -> None:
+    os.makedirs(out, exist_ok=True)
+    watermarks = load_watermarks(out)
+    lag = cast(timedelta(seconds=settings.EXPORT_WATERMARK_LAG), Interval)
+
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ",
+                                            postgresql_readonly=True)
+        async with conn.begin():
+            until = await conn.scalar(select(
+                func.timezone('utc', func.now(), type_=DateTime) - lag))
+            for table in tables:
+                since = None if full else watermarks.get(table)
+                if since is not None and since >= until:
+                    continue
+                rows = await export_table(conn, table, since, until, out,
+                                          output_format)
+                logger.info("export: %d %s rows up to %s", rows, table, until)
+                watermarks[table] = until
+                save_watermarks(out, watermarks)
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--tables", default=",".join(EXPORTS),
+                        help="comma separated tables to export")
+    parser.add_argument("--out", default=settings.EXPORT_DIR,
+                        help="directory for the files and watermarks")
+    parser.add_argument("--format", dest="output_format",
+                        choices=("parquet", "arrow"), default="parquet")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the watermarks and export every row")
+    args = parser.parse_args()
+
+    tables = [table.strip() for table in args.tables.split(",") if table]
+    unknown = [table for table in tables if table not in EXPORTS]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(tables, args.out, args.output_format, args.full))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Publish outbox events to listeners and drop old published ones.
+
+The app runs :func:`run_forever` in its lifespan; to drain the outbox by
+hand, from ``src``:
+
+    python -m jobs.outbox_relay
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from config import settings
+from database import async_engine, async_session_factory
+from queries.outbox import publish_pending, purge_published
+
+
+logger = logging.getLogger(__name__)
+
+
+async def run_once() -> int:
+    """Publish in batches; SKIP LOCKED lets several workers run it at once."""
+    published = 0
+    async with async_session_factory() as session:
+        while True:
+            sent = await publish_pending(session, settings.OUTBOX_RELAY_BATCH)
+            published += sent
+            if sent < settings.OUTBOX_RELAY_BATCH:
+                return published
+
+
+async def purge() -> int:
+    purged = 0
+    retention = timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+    async with async_session_factory() as session:
+        while True:
+            deleted = await purge_published(
+                session, retention, settings.OUTBOX_RELAY_BATCH)
+            purged += deleted
+            if deleted < settings.OUTBOX_RELAY_BATCH:
+                return purged
+
+
+async def run_forever() -> None:
+    purged_at = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.OUTBOX_RELAY_INTERVAL)
+        try:
+            await run_once()
+            if time.monotonic() - purged_at >= settings.OUTBOX_PURGE_INTERVAL:
+                purged_at = time.monotonic()
+                purged = await purge()
+                if purged:
+                    logger.info("purged %d published outbox events", purged)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("outbox relay failed")
+
+
+async def main() -> None:
+    print(f"{await run_once()} outbox event(s) published")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
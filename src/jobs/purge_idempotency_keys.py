@@ -0,0 +1,50 @@
+"""Delete expired idempotency keys.
+
+The app runs :func:`run_forever` in its lifespan; to purge by hand, from
+``src``:
+
+    python -m jobs.purge_idempotency_keys
+"""
+import asyncio
+import logging
+
+from config import settings
+from database import async_engine, async_session_factory
+from queries.idempotency import purge_expired_keys
+
+
+logger = logging.getLogger(__name__)
+
+
+async def run_once() -> int:
+    """Purge in batches; SKIP LOCKED lets several workers run it at once."""
+    purged = 0
+    async with async_session_factory() as session:
+        while True:
+            deleted = await purge_expired_keys(
+                session, settings.IDEMPOTENCY_PURGE_BATCH)
+            purged += deleted
+            if deleted < settings.IDEMPOTENCY_PURGE_BATCH:
+                return purged
+
+
+async def run_forever() -> None:
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_PURGE_INTERVAL)
+        try:
+            purged = await run_once()
+            if purged:
+                logger.info("purged %d expired idempotency keys", purged)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("idempotency key purge failed")
+
+
+async def main() -> None:
+    print(f"{await run_once()} expired idempotency key(s) purged")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+"""Check the per-SKU stock ledger against the ``item`` table.
+
+Run from ``src``:
+
+    python -m jobs.reconcile_stock [--fix]
+
+Exits with status 1 when mismatches were found and not fixed.
+"""
+import argparse
+import asyncio
+import sys
+
+from database import async_engine, async_session_factory
+from queries.stock import reconcile_stock
+
+
+async def run(fix: bool) -> int:
+    async with async_session_factory() as session:
+        mismatches = await reconcile_stock(session, fix=fix)
+    await async_engine.dispose()
+
+    for mismatch in mismatches:
+        print(f"{mismatch['sku_id']}: ledger={mismatch['ledger']} "
+              f"actual={mismatch['actual']}")
+    action = "fixed" if fix else "found"
+    print(f"{len(mismatches)} mismatching SKU(s) {action}")
+    return 1 if mismatches and not fix else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fix", action="store_true",
+                        help="overwrite mismatching ledger rows")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.fix)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Collect new postings into the open wave and release waves when due.
+
+The app runs :func:`run_forever` in its lifespan; to run one pass by hand,
+from ``src``:
+
+    python -m jobs.wave_planner
+"""
+import asyncio
+import logging
+import random
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from config import settings
+from database import async_engine, async_session_factory
+from queries.waves import plan_waves
+
+
+logger = logging.getLogger(__name__)
+
+# Waves have to be planned by one worker at a time; see
+# jobs.discount_scheduler.
+ADVISORY_LOCK_KEY = 0x77617665706C616E
+
+
+async def run_once() -> None:
+    async with async_engine.connect() as conn:
+        locked = await conn.scalar(
+            select(func.pg_try_advisory_lock(ADVISORY_LOCK_KEY)))
+        await conn.commit()
+        if not locked:
+            return
+        try:
+            async with async_session_factory(bind=conn) as session:
+                while True:
+                    planned = await plan_waves(
+                        session, settings.WAVE_WINDOW_SECONDS,
+                        settings.WAVE_MAX_POSTINGS,
+                        settings.WAVE_PLANNER_BATCH)
+                    if planned["released"] or planned["postings"]:
+                        logger.info("waves: %d postings (%d units) added, "
+                                    "%d released", planned["postings"],
+                                    planned["units"], planned["released"])
+                    if (planned["postings"] < settings.WAVE_PLANNER_BATCH
+                            and not planned["released"]):
+                        break
+        finally:
+            await conn.scalar(
+                select(func.pg_advisory_unlock(ADVISORY_LOCK_KEY)))
+            await conn.commit()
+
+
+async def run_forever() -> None:
+    interval = settings.WAVE_PLANNER_INTERVAL
+    await asyncio.sleep(random.uniform(0, interval))
+    while True:
+        try:
+            await run_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("wave planner pass failed")
+        await asyncio.sleep(interval)
+
+
+async def main() -> None:
+    await run_once()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
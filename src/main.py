@@ -1,10 +1,55 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
+from config import settings
+from database import replicas
+from di import ReadYourWritesMiddleware
+from events import hub
+from jobs.acceptance_worker import run_forever as run_acceptance_worker
+from jobs.discount_scheduler import run_forever as run_discount_scheduler
+from jobs.outbox_relay import run_forever as run_outbox_relay
+from jobs.purge_idempotency_keys import run_forever as run_idempotency_purge
+from jobs.wave_planner import run_forever as run_wave_planner
+from metrics import MetricsMiddleware
+from query_log import QueryLogMiddleware
 from router import router
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(run_idempotency_purge()),
+             asyncio.create_task(run_outbox_relay()),
+             asyncio.create_task(hub.listen())]
+    tasks += [asyncio.create_task(run_acceptance_worker())
+              for _ in range(settings.ACCEPTANCE_WORKERS)]
+    if settings.DISCOUNT_SCHEDULER_ENABLED:
+        tasks.append(asyncio.create_task(run_discount_scheduler()))
+    if settings.WAVE_PLANNER_ENABLED:
+        tasks.append(asyncio.create_task(run_wave_planner()))
+    if replicas.replicas:
+        tasks.append(asyncio.create_task(replicas.run_health_checks(
+            settings.DB_REPLICA_CHECK_INTERVAL,
+            settings.DB_REPLICA_CHECK_TIMEOUT)))
+    yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await replicas.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(MetricsMiddleware)
+if settings.DB_REPLICA_URLS:
+    app.add_middleware(ReadYourWritesMiddleware)
+if settings.N_PLUS_ONE_WARN_THRESHOLD:
+    app.add_middleware(QueryLogMiddleware,
+                       threshold=settings.N_PLUS_ONE_WARN_THRESHOLD)
 
 app.include_router(router)
 
@@ -0,0 +1,151 @@
+"""Prometheus metrics for routes, DB statements and the connection pool.
+
+With several gunicorn workers, ``PROMETHEUS_MULTIPROC_DIR`` must point to
+an empty directory before the workers start (see ``docker/app.sh``);
+every worker then writes its samples there and ``/metrics`` aggregates
+them, whichever worker serves the scrape.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database import pool_stats
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests being served.",
+    multiprocess_mode="livesum",
+)
+DB_STATEMENTS = Histogram(
+    "db_statements_per_request", "DB statements issued by one request.",
+    ["method", "route"],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64, 128, 256, 512),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time one request spent in the DB.",
+    ["method", "route"],
+)
+DB_STATEMENTS_TOTAL = Counter(
+    "db_statements", "DB statements issued, by route.", ["method", "route"],
+)
+WAVE_UNITS_PER_RUN = Histogram(
+    "wave_units_per_pick_run", "Units picked in one pass of a zone.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+)
+WAVE_POSTINGS = Histogram(
+    "wave_postings", "Postings consolidated into one released wave.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+WAVES_RELEASED = Counter("waves_released", "Waves released for picking.")
+POOL = {
+    name: Gauge(f"db_pool_{name}", f"Session pool {name} of this worker.",
+                multiprocess_mode="liveall")
+    for name in ("checked_out", "checked_in", "overflow", "checkouts",
+                 "waits", "wait_seconds", "timeouts")
+}
+
+
+class RequestDbStats:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar(
+    "request_db_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement(conn, cursor, statement, parameters, context,
+                    executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_statement(conn, cursor, statement, parameters, context,
+                  executemany):
+    started = conn.info["statement_started"].pop()
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def fail_statement(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("statement_started"):
+        connection.info["statement_started"].pop()
+
+
+def observe_pool() -> None:
+    stats = pool_stats()
+    for name, gauge in POOL.items():
+        gauge.set(stats[name])
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and its DB work by route.
+
+    Routes are labelled with their template (``/getSkuInfo/{sku_id}``),
+    never the raw path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestDbStats()
+        token = request_db_stats.set(stats)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            request_db_stats.reset(token)
+
+            route = scope.get("route")
+            labels = (scope["method"],
+                      route.path if route is not None else "unmatched")
+            REQUEST_LATENCY.labels(*labels, str(status)).observe(elapsed)
+            DB_STATEMENTS.labels(*labels).observe(stats.statements)
+            DB_TIME.labels(*labels).observe(stats.seconds)
+            DB_STATEMENTS_TOTAL.labels(*labels).inc(stats.statements)
+            observe_pool()
+
+
+def metrics_response() -> tuple[bytes, str]:
+    observe_pool()
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
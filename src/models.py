@@ -3,9 +3,10 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 
-from sqlalchemy import ARRAY, Column, ForeignKey, Table, text
+from sqlalchemy import (ARRAY, BigInteger, Column, ForeignKey, Identity, Index,
+                        Table, text)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID, NUMERIC
+from sqlalchemy.dialects.postgresql import JSONB, UUID, NUMERIC
 
 from database import Base
 
@@ -34,13 +35,29 @@ class PostingStatus(enum.Enum):
 
 
 
+class AcceptanceStatus(enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class WaveStatus(enum.Enum):
+    OPEN = "open"
+    RELEASED = "released"
+
+
 class DiscountStatus (enum.Enum):
     active = "active"
     finished = "finished"
+    scheduled = "scheduled"
     
 
 class Sku(Base):
     __tablename__ = "sku"
+    __table_args__ = (
+        Index("ix_sku_created_at_sku_id", "created_at", "sku_id"),
+    )
 
     sku_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                               default=uuid.uuid4)
@@ -51,25 +68,71 @@ class Sku(Base):
     base_price: Mapped[Decimal] = mapped_column(NUMERIC(10, 2))
     count: Mapped[int]
     is_hidden: Mapped[bool]
+    markdown_percentage: Mapped[int] = mapped_column(nullable=True)
 
     sku_items: Mapped[list["Item"]] = relationship(back_populates="sku")
 
 
+class SkuStock(Base):
+    __tablename__ = "sku_stock"
+
+    sku_id: Mapped[uuid.UUID] = mapped_column(UUID,
+                                              ForeignKey("sku.sku_id"),
+                                              primary_key=True)
+    valid_free: Mapped[int] = mapped_column(server_default=text("0"))
+    valid_reserved: Mapped[int] = mapped_column(server_default=text("0"))
+    defect_free: Mapped[int] = mapped_column(server_default=text("0"))
+    defect_reserved: Mapped[int] = mapped_column(server_default=text("0"))
+    not_found_free: Mapped[int] = mapped_column(server_default=text("0"))
+    not_found_reserved: Mapped[int] = mapped_column(server_default=text("0"))
+
+
+class Location(Base):
+    """A storage bin; ``x``/``y`` are walking coordinates in metres."""
+    __tablename__ = "location"
+
+    location_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
+                                                   default=uuid.uuid4)
+    code: Mapped[str] = mapped_column(unique=True)
+    zone: Mapped[str]
+    x: Mapped[float]
+    y: Mapped[float]
+
+    items: Mapped[list["Item"]] = relationship(back_populates="location")
+
+
 class Item(Base):
     __tablename__ = "item"
+    __table_args__ = (
+        Index("ix_item_sku_id_item_id", "sku_id", "item_id"),
+        Index("ix_item_free_sku_id_stock", "sku_id", "stock",
+              postgresql_where=text("NOT reserved_state")),
+        Index("ix_item_sku_id_location_id", "sku_id", "location_id",
+              postgresql_where=text("location_id IS NOT NULL")),
+        Index("ix_item_created_at_item_id", "created_at", "item_id"),
+    )
 
     item_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                                default=uuid.uuid4)
     sku_id: Mapped[UUID] = mapped_column(ForeignKey("sku.sku_id"))
     stock: Mapped[SkuItemStock]
     reserved_state: Mapped[bool] = mapped_column(default=False)
+    location_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("location.location_id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
 
     sku: Mapped["Sku"] = relationship(back_populates="sku_items")
-    tasks: Mapped["Task"] =  relationship(back_populates="task_target")
+    location: Mapped["Location"] = relationship(back_populates="items")
+    tasks: Mapped[list["Task"]] = relationship(back_populates="task_target")
 
 
 class OrderedGood(Base):
     __tablename__ = 'ordered_goods'
+    __table_args__ = (
+        Index("ix_ordered_goods_posting_id", "posting_id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                           default=uuid.uuid4)
@@ -100,6 +163,15 @@ class OrderedGood(Base):
 
 class Posting(Base):
     __tablename__ = "posting"
+    __table_args__ = (
+        Index("ix_posting_created_at_posting_id", "created_at", "posting_id"),
+        Index("ix_posting_status_created_at",
+              "posting_status", "created_at", "posting_id"),
+        Index("ix_posting_wave_id", "wave_id"),
+        Index("ix_posting_unwaved_created_at", "created_at",
+              postgresql_where=text("wave_id IS NULL "
+                                    "AND posting_status = 'IN_ITEM_PICK'")),
+    )
 
     posting_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                                   default=uuid.uuid4)
@@ -108,7 +180,13 @@ class Posting(Base):
         server_default=text("TIMEZONE('utc', now())")
     )   
     cost: Mapped[Decimal] = mapped_column(NUMERIC(10, 2))
-    not_found: Mapped[list[uuid.UUID]] = mapped_column(UUID, nullable=True)
+    not_found: Mapped[list[uuid.UUID]] = mapped_column(ARRAY(UUID),
+                                                         nullable=True)
+    # Picking tasks not completed yet; the posting is sent when it drops
+    # to zero.
+    open_tasks: Mapped[int] = mapped_column(server_default=text("0"))
+    wave_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("wave.wave_id"), nullable=True)
     ordered_goods: Mapped[list["OrderedGood"]] = relationship(
         back_populates="posting",
         )
@@ -117,6 +195,16 @@ class Posting(Base):
 
 class Task(Base):
     __tablename__ = "task"
+    __table_args__ = (
+        Index("ix_task_posting_id", "posting_id"),
+        Index("ix_task_acceptance_id", "acceptance_id"),
+        Index("ix_task_task_target_id", "task_target_id"),
+        Index("ix_task_created_at_task_id", "created_at", "task_id"),
+        Index("ix_task_type_status_created_at",
+              "type", "status", "created_at", "task_id"),
+        Index("ix_task_open_created_at", "created_at",
+              postgresql_where=text("status = 'IN_WORK'")),
+    )
 
     task_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                                default=uuid.uuid4)
@@ -139,6 +227,10 @@ class Task(Base):
         ForeignKey("posting.posting_id"),
         nullable=True
         )
+    claimed_by: Mapped[str] = mapped_column(nullable=True)
+    lease_expires_at: Mapped[datetime] = mapped_column(nullable=True)
+    # Position in the posting's pick route.
+    pick_seq: Mapped[int] = mapped_column(nullable=True)
 
     task_target: Mapped["Item"] = relationship(back_populates="tasks",
                                                uselist=False
@@ -152,17 +244,30 @@ class Task(Base):
 
 class Acceptance(Base):
     __tablename__ = "acceptance"
+    __table_args__ = (
+        Index("ix_acceptance_unfinished_created_at", "created_at",
+              postgresql_where=text("status != 'DONE'")),
+    )
 
     acceptance_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                                      default=uuid.uuid4)
     created_at: Mapped[datetime] = mapped_column(
         server_default=text("TIMEZONE('utc', now())")
     )   
+    status: Mapped[AcceptanceStatus] = mapped_column(
+        server_default=text("'DONE'"))
+    units_total: Mapped[int] = mapped_column(server_default=text("0"))
+    units_done: Mapped[int] = mapped_column(server_default=text("0"))
+    # Lease of the background worker processing an async acceptance.
+    locked_until: Mapped[datetime] = mapped_column(nullable=True)
+    # Times a worker claimed it; it is FAILED after ACCEPTANCE_MAX_ATTEMPTS.
+    attempts: Mapped[int] = mapped_column(server_default=text("0"))
+    last_error: Mapped[str] = mapped_column(nullable=True)
     accepted: Mapped[list["AcceptedItem"]] = relationship(
         back_populates="acceptance"
         )
 
-    tasks:Mapped["Task"] = relationship(back_populates="acceptance")
+    tasks: Mapped[list["Task"]] = relationship(back_populates="acceptance")
 
 
 discount_sku_association = Table(
@@ -172,12 +277,21 @@ discount_sku_association = Table(
            ),
     Column('sku_id', UUID(as_uuid=True), ForeignKey('sku.sku_id'),
            primary_key=True
-           )
+           ),
+    Index('ix_discount_sku_association_sku_id', 'sku_id'),
 )
 
 
 class Discounts(Base):
     __tablename__ = "discount"
+    __table_args__ = (
+        Index("ix_discount_scheduled_starts_at", "starts_at",
+              postgresql_where=text("status = 'scheduled'")),
+        Index("ix_discount_active_ends_at", "ends_at",
+              postgresql_where=text("status = 'active'")),
+        Index("ix_discount_reprice_pending", "discount_id",
+              postgresql_where=text("reprice_pending")),
+    )
 
     discount_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
                                                    default=uuid.uuid4)
@@ -186,6 +300,10 @@ class Discounts(Base):
         server_default=text("TIMEZONE('utc', now())")
     )   
     percentage: Mapped[int] = mapped_column(default=10)
+    starts_at: Mapped[datetime] = mapped_column(nullable=True)
+    ends_at: Mapped[datetime] = mapped_column(nullable=True)
+    reprice_pending: Mapped[bool] = mapped_column(
+        default=False, server_default=text("false"))
     sku_ids: Mapped[list[Sku]] = relationship(
         'Sku',
         secondary=discount_sku_association,
@@ -195,6 +313,9 @@ class Discounts(Base):
 
 class AcceptedItem(Base):
     __tablename__ = 'accepted_items'
+    __table_args__ = (
+        Index("ix_accepted_items_acceptance_id", "acceptance_id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID,
                                           primary_key=True,
@@ -209,4 +330,85 @@ class AcceptedItem(Base):
                                         UUID,
                                         ForeignKey("acceptance.acceptance_id"),
                                         )
+    # Units of ``count`` already inserted as items; advanced in the same
+    # transaction as the inserts, so processing resumes where it stopped.
+    units_done: Mapped[int] = mapped_column(server_default=text("0"))
+    location_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("location.location_id"), nullable=True)
     acceptance: Mapped["Acceptance"] = relationship(back_populates='accepted')
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_key"
+    __table_args__ = (
+        Index("ix_idempotency_key_expires_at", "expires_at"),
+    )
+
+    route: Mapped[str] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(primary_key=True)
+    request_hash: Mapped[str]
+    response_status: Mapped[int] = mapped_column(nullable=True)
+    response_body: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    locked_until: Mapped[datetime]
+    expires_at: Mapped[datetime]
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_event"
+    __table_args__ = (
+        Index("ix_outbox_event_unpublished", "event_id",
+              postgresql_where=text("published_at IS NULL")),
+        Index("ix_outbox_event_posting_id_event_id", "posting_id", "event_id"),
+        Index("ix_outbox_event_aggregate_id_event_id",
+              "aggregate_id", "event_id"),
+        Index("ix_outbox_event_published_at", "published_at"),
+    )
+
+    event_id: Mapped[int] = mapped_column(BigInteger, Identity(),
+                                          primary_key=True)
+    event_type: Mapped[str]
+    aggregate_id: Mapped[uuid.UUID] = mapped_column(UUID)
+    posting_id: Mapped[uuid.UUID] = mapped_column(UUID, nullable=True)
+    payload: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    published_at: Mapped[datetime] = mapped_column(nullable=True)
+
+
+class Wave(Base):
+    """Postings collected over a time window and picked together."""
+    __tablename__ = "wave"
+    __table_args__ = (
+        # At most one wave takes new postings at a time.
+        Index("ix_wave_open", "status", unique=True,
+              postgresql_where=text("status = 'OPEN'")),
+    )
+
+    wave_id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True,
+                                               default=uuid.uuid4)
+    status: Mapped[WaveStatus]
+    created_at: Mapped[datetime] = mapped_column(
+        server_default=text("TIMEZONE('utc', now())")
+    )
+    closes_at: Mapped[datetime]
+    released_at: Mapped[datetime] = mapped_column(nullable=True)
+    postings: Mapped[int] = mapped_column(server_default=text("0"))
+    units: Mapped[int] = mapped_column(server_default=text("0"))
+
+
+class WaveLine(Base):
+    """Units of one SKU to pick in one zone for a whole wave."""
+    __tablename__ = "wave_line"
+
+    wave_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("wave.wave_id"), primary_key=True)
+    zone: Mapped[str] = mapped_column(primary_key=True)
+    sku_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("sku.sku_id"), primary_key=True)
+    location_id: Mapped[uuid.UUID] = mapped_column(
+        UUID, ForeignKey("location.location_id"), nullable=True)
+    units: Mapped[int]
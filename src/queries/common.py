@@ -0,0 +1,82 @@
+import base64
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List
+from uuid import UUID
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import ARRAY, any_, literal
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import async_session_factory
+
+
+STREAM_BATCH_SIZE = 1000
+
+# Called with the new row's id inside its transaction, just before commit.
+BeforeCommit = Callable[[UUID], Awaitable[None]]
+
+
+def uuid_array(ids: Iterable[UUID]):
+    return literal(list(ids), ARRAY(PG_UUID))
+
+
+def in_ids(column, ids: Iterable[UUID]):
+    """``column = ANY(:ids)``: one bound array instead of one param per id."""
+    return column == any_(uuid_array(ids))
+
+
+def keyed_by_id(ids: List[UUID], found: Dict[UUID, dict]) -> dict:
+    return {
+        "results": {id: found.get(id) for id in ids},
+        "not_found": [id for id in dict.fromkeys(ids) if id not in found],
+    }
+
+
+def encode_cursor(*values) -> str:
+    raw = orjson.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str, *types: Callable[[str], object]) -> list:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return [convert(value) for convert, value in zip(types, values)]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_page(session: AsyncSession, stmt, limit: int,
+                     to_dict: Callable[..., dict],
+                     cursor_of: Callable[..., tuple]) -> dict:
+    """Run a keyset-ordered ``stmt`` and return one page of it.
+
+    One extra row is fetched to know whether a next page exists; its
+    cursor is built from the last row actually returned.
+    """
+    rows = (await session.execute(stmt.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*cursor_of(rows[-1]))
+    return {"items": [to_dict(row) for row in rows],
+            "next_cursor": next_cursor}
+
+
+async def stream_ndjson(stmt, to_dict: Callable[..., dict],
+                        session_factory: async_sessionmaker
+                        = async_session_factory) -> AsyncIterator[bytes]:
+    """Yield ``stmt`` rows as NDJSON through a server-side cursor.
+
+    The session is opened here rather than taken from ``SessionDep``
+    because the request's session is closed before a streaming response
+    body is sent.
+    """
+    async with session_factory() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(orjson.dumps(to_dict(row), default=str) + b"\n"
+                           for row in rows)
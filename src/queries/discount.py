@@ -1,85 +1,219 @@
-from decimal import Decimal
+from datetime import datetime, timezone
+from typing import List, Optional
 from uuid import UUID
 
 from fastapi import HTTPException
+from sqlalchemy import func, insert, literal, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from models import DiscountStatus, Discounts, Item, Sku, SkuItemStock
+from cache import cache
+from models import DiscountStatus, Discounts, Sku, discount_sku_association
+from queries.common import BeforeCommit, in_ids
+from queries.pricing import discount_sku_ids, recompute_prices
 from schemas import CreateDiscountRequest
 
 
+def utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC, like ``created_at``."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def format_time(value: Optional[datetime]) -> Optional[str]:
+    return None if value is None else value.strftime("%Y-%m-%d %H:%M:%S")
+
+
 async def get_discount_info(session: AsyncSession, discount_id: UUID):
-    result = await session.execute(select(Discounts).where(
-        Discounts.discount_id == discount_id))
-    discount = result.scalar_one_or_none()
+    result = await session.execute(
+        select(Discounts.discount_id, Discounts.status, Discounts.created_at,
+               Discounts.percentage, Discounts.starts_at, Discounts.ends_at)
+        .where(Discounts.discount_id == discount_id))
+    discount = result.one_or_none()
 
     if discount is None:
-        None
+        return None
+
+    sku_ids = await session.scalars(
+        select(discount_sku_association.c.sku_id)
+        .where(discount_sku_association.c.discount_id == discount_id)
+    )
 
     discount_info = {
         "id": discount.discount_id,
         "status": discount.status.value,
-        "created_at": discount.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "created_at": format_time(discount.created_at),
         "percentage": int(discount.percentage),
-        "sku_ids": [str(sku_id) for sku_id in discount.sku_ids]
+        "sku_ids": list(sku_ids),
+        "starts_at": format_time(discount.starts_at),
+        "ends_at": format_time(discount.ends_at),
     }
-    return discount_info()
+    return discount_info
 
 
 async def create_discount_info(session: AsyncSession,
-                               discount_info: CreateDiscountRequest) -> UUID:
-    discount = Discounts(**discount_info.dict())
+                               discount_info: CreateDiscountRequest,
+                               before_commit: Optional[BeforeCommit] = None
+                               ) -> UUID:
+    now = utc_naive(datetime.now(timezone.utc))
+    starts_at = utc_naive(discount_info.starts_at)
+    ends_at = utc_naive(discount_info.ends_at)
+    if ends_at is not None and (ends_at <= now or (
+            starts_at is not None and ends_at <= starts_at)):
+        raise HTTPException(status_code=400,
+                            detail="ends_at must be in the future and "
+                                   "after starts_at")
+
+    scheduled = starts_at is not None and starts_at > now
+    discount = Discounts(
+        status=DiscountStatus.scheduled if scheduled
+        else DiscountStatus.active,
+        percentage=discount_info.percentage,
+        starts_at=starts_at,
+        ends_at=ends_at,
+    )
     session.add(discount)
+    await session.flush()
+    discount_id = discount.discount_id
+
+    sku_ids = set(discount_info.sku_ids)
+    linked = await session.execute(
+        insert(discount_sku_association)
+        .from_select(
+            ["discount_id", "sku_id"],
+            select(literal(discount_id, PG_UUID), Sku.sku_id)
+            .where(in_ids(Sku.sku_id, sku_ids))
+        )
+    )
+    if linked.rowcount != len(sku_ids):
+        existing = set(await session.scalars(
+            select(Sku.sku_id).where(in_ids(Sku.sku_id, sku_ids))))
+        missing = min(sku_ids - existing)
+        await session.rollback()
+        raise HTTPException(status_code=404,
+                            detail=f"SKU {missing} not found")
 
-    skus_to_update = []
-    for sku_id in discount_info.sku_ids:
-        sku = await session.get(Sku, sku_id)
-
-        if sku is None:
-            raise HTTPException(status_code=404,
-                                detail=f"SKU {sku_id} not found")
-
-        if sku.actual_price != sku.base_price:
-            new_discounted_price = sku.base_price * (
-                1 - Decimal(discount_info.percentage) / 100)
-
-            if sku.actual_price is None or (
-                        new_discounted_price < sku.actual_price):
-                sku.actual_price = new_discounted_price
-                skus_to_update.append(sku)
-
-    if skus_to_update:
-        session.add_all(skus_to_update)
+    changed = []
+    if not scheduled:
+        changed = await recompute_prices(
+            session, Sku.sku_id.in_(discount_sku_ids(discount_id)))
 
+    if before_commit is not None:
+        await before_commit(discount_id)
     await session.commit()
+    await cache.invalidate_skus(changed, items=False)
 
-    return discount.discount_id
+    return discount_id
 
 
 async def cancel_discount(session: AsyncSession, discount_id: UUID):
-    stmt = select(Discounts).where(Discounts.discount_id == discount_id)
+    stmt = (select(Discounts).where(Discounts.discount_id == discount_id)
+            .with_for_update())
     discount = await session.scalar(stmt)
-    if not discount or discount.status != DiscountStatus.active:
+    if not discount or discount.status == DiscountStatus.finished:
         raise HTTPException(status_code=404,
                             detail="Discount not found or not active")
 
+    was_active = discount.status == DiscountStatus.active
     discount.status = DiscountStatus.finished
+    await session.flush()
 
-    items_result = await session.execute(
-        select(Item).where(Item.sku_id.in_(discount.sku_ids),
-                           Item.stock != SkuItemStock.DEFECT)
-    )
-    items = items_result.scalars().all()
-
-    skus_updated = set()
-    for item in items:
-        sku = await session.get(Sku, item.sku_id)
-        if sku and sku.sku_id not in skus_updated:
-            sku.actual_price = sku.base_price
-            session.add(sku)
-            skus_updated.add(sku.id)
+    changed = []
+    if was_active:
+        changed = await recompute_prices(
+            session, Sku.sku_id.in_(discount_sku_ids(discount_id)))
 
     await session.commit()
-
-    return discount.status.value
\ No newline at end of file
+    await cache.invalidate_skus(changed, items=False)
+
+    return DiscountStatus.finished.value
+
+
+async def advance_discount_windows(session: AsyncSession,
+                                   limit: int) -> int:
+    """Start and end the discounts whose window boundary has passed.
+
+    Only statuses change here, in one short transaction; the affected
+    discounts are flagged ``reprice_pending`` for
+    :func:`reprice_pending_discounts`. Returns the number of discounts
+    moved.
+    """
+    now = func.timezone("utc", func.now())
+    moved = 0
+    for status, boundary, new_status in (
+            (DiscountStatus.scheduled, Discounts.starts_at,
+             DiscountStatus.active),
+            (DiscountStatus.active, Discounts.ends_at,
+             DiscountStatus.finished)):
+        due = (
+            select(Discounts.discount_id)
+            .where(Discounts.status == status, boundary <= now)
+            .order_by(boundary)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .cte("due")
+        )
+        result = await session.execute(
+            update(Discounts)
+            .where(Discounts.discount_id == due.c.discount_id)
+            .values(status=new_status, reprice_pending=True)
+            .execution_options(synchronize_session=False)
+        )
+        moved += result.rowcount
+    await session.commit()
+    return moved
+
+
+async def reprice_pending_discounts(session: AsyncSession, limit: int,
+                                    chunk: int) -> List[UUID]:
+    """Re-price the SKUs of discounts flagged ``reprice_pending``.
+
+    The SKUs of all pending discounts are walked in ``sku_id`` order and
+    re-priced ``chunk`` at a time, one transaction per chunk, so a launch
+    of thousands of discounts never holds more than ``chunk`` SKU row
+    locks at once. The flag is cleared only after the last chunk; after
+    a crash the next run simply starts over, since re-pricing is
+    idempotent. Returns the SKUs whose price changed.
+    """
+    discount_ids = list(await session.scalars(
+        select(Discounts.discount_id)
+        .where(Discounts.reprice_pending)
+        .limit(limit)
+    ))
+    if not discount_ids:
+        return []
+
+    changed = []
+    last_sku_id = None
+    while True:
+        stmt = (
+            select(discount_sku_association.c.sku_id)
+            .where(in_ids(discount_sku_association.c.discount_id,
+                          discount_ids))
+            .distinct()
+            .order_by(discount_sku_association.c.sku_id)
+            .limit(chunk)
+        )
+        if last_sku_id is not None:
+            stmt = stmt.where(discount_sku_association.c.sku_id > last_sku_id)
+        sku_ids = list(await session.scalars(stmt))
+        if not sku_ids:
+            break
+
+        chunk_changed = await recompute_prices(session,
+                                               in_ids(Sku.sku_id, sku_ids))
+        await session.commit()
+        await cache.invalidate_skus(chunk_changed, items=False)
+        changed += chunk_changed
+        last_sku_id = sku_ids[-1]
+
+    await session.execute(
+        update(Discounts)
+        .where(in_ids(Discounts.discount_id, discount_ids))
+        .values(reprice_pending=False)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return changed
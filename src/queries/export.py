@@ -0,0 +1,109 @@
+import enum
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+import pyarrow as pa
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.future import select
+
+from models import Item, Posting, Sku, Task
+
+
+class ExportColumn(NamedTuple):
+    column: object
+    type: pa.DataType
+
+
+UUID = pa.string()
+ENUM = pa.string()
+TIMESTAMP = pa.timestamp("us")
+MONEY = pa.decimal128(10, 2)
+
+EXPORTS: Dict[str, tuple] = {
+    "sku": (Sku.sku_id, [
+        ExportColumn(Sku.sku_id, UUID),
+        ExportColumn(Sku.created_at, TIMESTAMP),
+        ExportColumn(Sku.actual_price, MONEY),
+        ExportColumn(Sku.base_price, MONEY),
+        ExportColumn(Sku.count, pa.int64()),
+        ExportColumn(Sku.is_hidden, pa.bool_()),
+        ExportColumn(Sku.markdown_percentage, pa.int32()),
+    ]),
+    "item": (Item.item_id, [
+        ExportColumn(Item.item_id, UUID),
+        ExportColumn(Item.created_at, TIMESTAMP),
+        ExportColumn(Item.sku_id, UUID),
+        ExportColumn(Item.stock, ENUM),
+        ExportColumn(Item.reserved_state, pa.bool_()),
+        ExportColumn(Item.location_id, UUID),
+    ]),
+    "task": (Task.task_id, [
+        ExportColumn(Task.task_id, UUID),
+        ExportColumn(Task.created_at, TIMESTAMP),
+        ExportColumn(Task.type, ENUM),
+        ExportColumn(Task.status, ENUM),
+        ExportColumn(Task.task_target_id, UUID),
+        ExportColumn(Task.posting_id, UUID),
+        ExportColumn(Task.acceptance_id, UUID),
+        ExportColumn(Task.claimed_by, pa.string()),
+        ExportColumn(Task.lease_expires_at, TIMESTAMP),
+        ExportColumn(Task.pick_seq, pa.int32()),
+    ]),
+    "posting": (Posting.posting_id, [
+        ExportColumn(Posting.posting_id, UUID),
+        ExportColumn(Posting.created_at, TIMESTAMP),
+        ExportColumn(Posting.posting_status, ENUM),
+        ExportColumn(Posting.cost, MONEY),
+        ExportColumn(Posting.not_found, pa.list_(UUID)),
+        ExportColumn(Posting.open_tasks, pa.int32()),
+        ExportColumn(Posting.wave_id, UUID),
+    ]),
+}
+
+
+def arrow_schema(table: str) -> pa.Schema:
+    _, columns = EXPORTS[table]
+    return pa.schema([(export.column.key, export.type) for export in columns])
+
+
+def arrow_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, list):
+        return [arrow_value(element) for element in value]
+    return value
+
+
+async def stream_batches(connection: AsyncConnection, table: str,
+                         since: Optional[datetime], until: datetime,
+                         batch_size: int) -> AsyncIterator[pa.RecordBatch]:
+    """Rows of ``table`` created in ``(since, until]`` as Arrow batches.
+
+    The rows come through a server-side cursor ``batch_size`` at a time,
+    so memory stays bounded by one batch whatever the table size.
+    """
+    key, columns = EXPORTS[table]
+    created_at = columns[1].column
+    stmt = (
+        select(*(export.column for export in columns))
+        .where(created_at <= until)
+        .order_by(created_at, key)
+        .execution_options(yield_per=batch_size)
+    )
+    if since is not None:
+        stmt = stmt.where(created_at > since)
+
+    schema = arrow_schema(table)
+    result = await connection.stream(stmt)
+    async for rows in result.partitions(batch_size):
+        arrays: List[list] = [[] for _ in columns]
+        for row in rows:
+            for values, value in zip(arrays, row):
+                values.append(arrow_value(value))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type)
+             for values, field in zip(arrays, schema)],
+            schema=schema)
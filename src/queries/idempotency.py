@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+import orjson
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import (DateTime, Interval, and_, cast, delete, func, null,
+                        or_, tuple_, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import settings
+from database import async_session_factory
+from models import IdempotencyKey
+from responses import dumps
+
+
+def utc_now():
+    return func.timezone('utc', func.now(), type_=DateTime)
+
+
+def after(seconds: float):
+    return utc_now() + cast(timedelta(seconds=seconds), Interval)
+
+
+Remember = Callable[[AsyncSession, Any], Awaitable[None]]
+
+
+class AlreadyAnswered(Exception):
+    """Another request with the key committed its result first."""
+
+
+def request_hash(request: BaseModel, params: Optional[dict] = None) -> str:
+    """Hash of the body and of the query ``params`` that change the result."""
+    digest = hashlib.sha256(request.model_dump_json().encode())
+    if params:
+        digest.update(orjson.dumps(params, option=orjson.OPT_SORT_KEYS))
+    return digest.hexdigest()
+
+
+async def claim_key(route: str, key: str, digest: str) -> bool:
+    """Insert the key, or take over an expired or abandoned one.
+
+    A key is abandoned when its owner neither stored a result nor released
+    it within ``IDEMPOTENCY_LOCK_SECONDS``; only a retry of the same
+    request may take it over.
+    """
+    stmt = insert(IdempotencyKey).values(
+        route=route,
+        key=key,
+        request_hash=digest,
+        locked_until=after(settings.IDEMPOTENCY_LOCK_SECONDS),
+        expires_at=after(settings.IDEMPOTENCY_TTL),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.route, IdempotencyKey.key],
+        set_={
+            "request_hash": stmt.excluded.request_hash,
+            "response_status": null(),
+            "response_body": null(),
+            "locked_until": stmt.excluded.locked_until,
+            "expires_at": stmt.excluded.expires_at,
+        },
+        where=or_(
+            IdempotencyKey.expires_at < utc_now(),
+            and_(IdempotencyKey.response_status.is_(None),
+                 IdempotencyKey.locked_until < utc_now(),
+                 IdempotencyKey.request_hash == stmt.excluded.request_hash),
+        ),
+    ).returning(IdempotencyKey.key)
+
+    async with async_session_factory() as session:
+        claimed = await session.scalar(stmt)
+        await session.commit()
+    return claimed is not None
+
+
+async def load_key(route: str, key: str):
+    async with async_session_factory() as session:
+        return (await session.execute(
+            select(IdempotencyKey.request_hash,
+                   IdempotencyKey.response_status,
+                   IdempotencyKey.response_body)
+            .where(IdempotencyKey.route == route, IdempotencyKey.key == key)
+        )).one_or_none()
+
+
+async def store_response(route: str, key: str, status: int,
+                         body: Any) -> None:
+    async with async_session_factory() as session:
+        await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.route == route, IdempotencyKey.key == key,
+                   IdempotencyKey.response_status.is_(None))
+            .values(response_status=status,
+                    response_body=orjson.loads(dumps(body)))
+        )
+        await session.commit()
+
+
+def response_recorder(route: str, key: str, digest: str) -> Remember:
+    """Store the result in the session doing the work, before it commits.
+
+    The key and the rows it answers for then commit together, so a retry
+    can never find the work done but the key unanswered. The key is
+    upserted in case it was released meanwhile. If another holder of the
+    key answered first, its transaction has committed by the time the
+    upsert gets the row lock, and ``AlreadyAnswered`` makes the caller
+    roll back.
+    """
+    async def remember(session: AsyncSession, body: Any) -> None:
+        stmt = insert(IdempotencyKey).values(
+            route=route,
+            key=key,
+            request_hash=digest,
+            response_status=200,
+            response_body=orjson.loads(dumps(body)),
+            locked_until=utc_now(),
+            expires_at=after(settings.IDEMPOTENCY_TTL),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.route, IdempotencyKey.key],
+            set_={
+                "response_status": stmt.excluded.response_status,
+                "response_body": stmt.excluded.response_body,
+            },
+            where=and_(
+                IdempotencyKey.response_status.is_(None),
+                IdempotencyKey.request_hash == stmt.excluded.request_hash),
+        ).returning(IdempotencyKey.key)
+        if await session.scalar(stmt) is None:
+            await session.rollback()
+            raise AlreadyAnswered()
+    return remember
+
+
+async def forget(session: AsyncSession, body: Any) -> None:
+    pass
+
+
+async def release_key(route: str, key: str) -> None:
+    async with async_session_factory() as session:
+        await session.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.route == route, IdempotencyKey.key == key)
+        )
+        await session.commit()
+
+
+def replay(status: int, body: Any) -> Any:
+    if status >= 400:
+        raise HTTPException(status_code=status, detail=body["detail"])
+    return body
+
+
+async def run_claimed(route: str, key: str, digest: str,
+                      action: Callable[[Remember], Awaitable[Any]]) -> Any:
+    """Run ``action`` for a key we hold.
+
+    ``action`` stores its result through the recorder it is given, in its
+    own transaction. Client errors are remembered afterwards, so a retry
+    gets the same answer. Conflicts, server errors and crashes release
+    the key so the retry can do the work again.
+    """
+    try:
+        return await action(response_recorder(route, key, digest))
+    except AlreadyAnswered:
+        stored = await load_key(route, key)
+        return replay(stored.response_status, stored.response_body)
+    except HTTPException as error:
+        if error.status_code < 500 and error.status_code != 409:
+            await store_response(route, key, error.status_code,
+                                 {"detail": error.detail})
+        else:
+            await release_key(route, key)
+        raise
+    except Exception:
+        await release_key(route, key)
+        raise
+
+
+async def idempotent(route: str, key: Optional[str], request: BaseModel,
+                     action: Callable[[Remember], Awaitable[Any]],
+                     params: Optional[dict] = None) -> Any:
+    """Run ``action`` at most once per ``Idempotency-Key`` of ``route``.
+
+    ``action`` is passed a ``remember(session, body)`` coroutine that it
+    must await with its response body in the transaction of its writes,
+    just before committing.
+
+    A repeated key returns the stored result of the first request, which
+    costs one key lookup instead of redoing the work. While the first
+    request is still running, duplicates poll for its result with
+    exponential backoff for up to ``IDEMPOTENCY_WAIT_SECONDS``; the wait
+    holds no DB connection. Reusing a key for a different request body
+    or different ``params`` is rejected with 422.
+    """
+    if key is None:
+        return await action(forget)
+
+    digest = request_hash(request, params)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        if await claim_key(route, key, digest):
+            return await run_claimed(route, key, digest, action)
+
+        stored = await load_key(route, key)
+        if stored is not None:
+            if stored.request_hash != digest:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a "
+                           "different request")
+            if stored.response_status is not None:
+                return replay(stored.response_status, stored.response_body)
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still "
+                       "in progress")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+async def purge_expired_keys(session: AsyncSession, limit: int) -> int:
+    expired = (
+        select(IdempotencyKey.route, IdempotencyKey.key)
+        .where(IdempotencyKey.expires_at < utc_now())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.execute(
+        delete(IdempotencyKey)
+        .where(tuple_(IdempotencyKey.route, IdempotencyKey.key).in_(expired))
+    )
+    await session.commit()
+    return result.rowcount
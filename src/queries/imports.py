@@ -0,0 +1,227 @@
+import codecs
+import csv
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, List, Optional, Tuple
+from uuid import UUID
+
+import orjson
+from sqlalchemy import Boolean, Integer, column, func, or_, table, text, update
+from sqlalchemy.dialects.postgresql import NUMERIC, UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from cache import cache
+from config import settings
+from models import Sku
+from queries.common import in_ids
+from queries.pricing import recompute_prices
+
+
+IMPORT_COLUMNS = ("line", "sku_id", "base_price", "is_hidden")
+
+sku_import = table(
+    "sku_import",
+    column("line", Integer),
+    column("sku_id", PG_UUID),
+    column("base_price", NUMERIC(10, 2)),
+    column("is_hidden", Boolean),
+)
+
+TRUE = {"true", "t", "1", "yes", "y"}
+FALSE = {"false", "f", "0", "no", "n"}
+MAX_PRICE = Decimal("99999999.99")
+
+
+class RowError(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode an upload line by line, holding one partial line at most."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def parse_price(value) -> Optional[Decimal]:
+    if value is None or value == "":
+        return None
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f"invalid base_price {value!r}")
+    if not price.is_finite() or price < 0 or price > MAX_PRICE:
+        raise RowError(f"base_price {value!r} out of range")
+    if price != price.quantize(Decimal("0.01")):
+        raise RowError(f"base_price {value!r} has more than 2 decimals")
+    return price
+
+
+def parse_hidden(value) -> Optional[bool]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in TRUE:
+        return True
+    if str(value).strip().lower() in FALSE:
+        return False
+    raise RowError(f"invalid is_hidden {value!r}")
+
+
+def parse_row(values: dict) -> Tuple[UUID, Optional[Decimal], Optional[bool]]:
+    try:
+        sku_id = UUID(str(values.get("sku_id")))
+    except ValueError:
+        raise RowError(f"invalid sku_id {values.get('sku_id')!r}")
+    price = parse_price(values.get("base_price"))
+    hidden = parse_hidden(values.get("is_hidden"))
+    if price is None and hidden is None:
+        raise RowError("neither base_price nor is_hidden given")
+    return sku_id, price, hidden
+
+
+async def iter_rows(chunks: AsyncIterator[bytes],
+                    input_format: str) -> AsyncIterator[Tuple[int, object]]:
+    """``(row number, values dict or RowError)`` for every non-empty row.
+
+    CSV needs a header naming its columns; quoted fields cannot span
+    lines. Rows are numbered from 1, not counting the CSV header.
+    """
+    header = None
+    row = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        if input_format == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            if len(values) != len(header):
+                yield row, RowError(f"expected {len(header)} fields, "
+                                    f"got {len(values)}")
+                continue
+            yield row, dict(zip(header, values))
+        else:
+            row += 1
+            try:
+                values = orjson.loads(line)
+            except orjson.JSONDecodeError as error:
+                yield row, RowError(f"invalid JSON: {error}")
+                continue
+            if not isinstance(values, dict):
+                yield row, RowError("expected a JSON object")
+                continue
+            yield row, values
+
+
+async def import_skus(session: AsyncSession, chunks: AsyncIterator[bytes],
+                      input_format: str) -> dict:
+    """Apply ``(sku_id, base_price, is_hidden)`` rows from an upload.
+
+    Valid rows are COPYed into a temporary table while the upload is
+    still being read, then applied with one ``UPDATE ... FROM`` and one
+    price recompute for the SKUs whose base price was given. Invalid rows
+    and unknown SKUs are reported and skipped; a SKU listed twice takes
+    its last row. Empty cells leave the field unchanged. The SKUs are
+    locked ``FOR NO KEY UPDATE``, as in ``recompute_prices``, so the
+    import does not wait on discounts being linked to them.
+    """
+    await session.execute(text(
+        "CREATE TEMPORARY TABLE sku_import ("
+        "line integer, sku_id uuid, base_price numeric(10, 2), "
+        "is_hidden boolean) ON COMMIT DROP"))
+    connection = await session.connection()
+    driver = (await connection.get_raw_connection()).driver_connection
+
+    rows = 0
+    errors: List[dict] = []
+    error_count = 0
+
+    def report(row: int, error: str) -> None:
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < settings.IMPORT_MAX_ERRORS:
+            errors.append({"row": row, "error": error})
+
+    batch = []
+    async for row, values in iter_rows(chunks, input_format):
+        rows = row
+        if isinstance(values, RowError):
+            report(row, str(values))
+            continue
+        try:
+            batch.append((row, *parse_row(values)))
+        except RowError as error:
+            report(row, str(error))
+            continue
+        if len(batch) >= settings.IMPORT_COPY_BATCH:
+            await driver.copy_records_to_table(
+                "sku_import", records=batch, columns=IMPORT_COLUMNS)
+            batch = []
+    if batch:
+        await driver.copy_records_to_table(
+            "sku_import", records=batch, columns=IMPORT_COLUMNS)
+    await session.execute(text("ANALYZE sku_import"))
+
+    unknown = await session.execute(
+        select(sku_import.c.line, sku_import.c.sku_id)
+        .where(~select(Sku.sku_id)
+               .where(Sku.sku_id == sku_import.c.sku_id).exists())
+        .order_by(sku_import.c.line)
+    )
+    for row in unknown:
+        report(row.line, f"unknown sku_id {row.sku_id}")
+
+    latest = (
+        select(sku_import)
+        .distinct(sku_import.c.sku_id)
+        .order_by(sku_import.c.sku_id, sku_import.c.line.desc())
+        .subquery("latest")
+    )
+    locked = (
+        select(Sku.sku_id)
+        .where(Sku.sku_id.in_(select(sku_import.c.sku_id)))
+        .order_by(Sku.sku_id)
+        .with_for_update(key_share=True)
+        .cte("locked")
+    )
+    base_price = func.coalesce(latest.c.base_price, Sku.base_price)
+    is_hidden = func.coalesce(latest.c.is_hidden, Sku.is_hidden)
+    updated = (await session.execute(
+        update(Sku)
+        .where(Sku.sku_id == locked.c.sku_id,
+               Sku.sku_id == latest.c.sku_id,
+               or_(Sku.base_price.is_distinct_from(base_price),
+                   Sku.is_hidden.is_distinct_from(is_hidden)))
+        .values(base_price=base_price, is_hidden=is_hidden)
+        .returning(Sku.sku_id,
+                   latest.c.base_price.is_not(None).label("repriced"))
+        .execution_options(synchronize_session=False)
+    )).all()
+
+    updated_ids = [sku.sku_id for sku in updated]
+    repriced = [sku.sku_id for sku in updated if sku.repriced]
+    changed = []
+    if repriced:
+        changed = await recompute_prices(session, in_ids(Sku.sku_id,
+                                                         repriced))
+    await session.commit()
+    await cache.invalidate_skus(updated_ids, items=False)
+
+    return {
+        "rows": rows,
+        "updated": len(updated_ids),
+        "repriced": len(changed),
+        "error_count": error_count,
+        "errors": errors,
+    }
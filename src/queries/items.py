@@ -1,75 +1,127 @@
-from decimal import Decimal
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 
-from models import DiscountStatus, Discounts, Item, Sku, SkuItemStock, Task, TaskStatus
-from queries.posting import find_similar_item
-from schemas import ItemResponse, MarkdownItem, MoveToNotFound, SetSkuPrice, SkuItemsResponse, ToggleIsHidden
+from cache import cache, sku_items_key, sku_key
+from models import Item, Sku, SkuItemStock, Task, TaskStatus, TaskType
+from queries.common import decode_cursor, fetch_page, in_ids, stream_ndjson
+from queries.outbox import add_events, task_event
+from queries.posting import close_pick, find_similar_item, lock_posting
+from queries.pricing import recompute_prices
+from queries.stock import apply_stock_deltas, new_deltas, stock_column
+from schemas import MarkdownItem, SetSkuPrice, ToggleIsHidden
+
+
+async def get_items_info(session: AsyncSession,
+                         item_ids: List[UUID]) -> Dict[UUID, dict]:
+    items = await session.execute(
+        select(Item.item_id, Item.sku_id, Item.stock, Item.reserved_state)
+        .where(in_ids(Item.item_id, item_ids))
+    )
+    return {
+        item.item_id: {
+            "id": item.item_id,
+            "sku_id": item.sku_id,
+            "stock_state": item.stock.value,
+            "reserved_state": item.reserved_state
+        }
+        for item in items
+    }
 
 
 async def get_item_info(session: AsyncSession, item_id: UUID):
-    stmt = select(Item).where(Item.item_id == item_id)
+    items_info = await get_items_info(session, [item_id])
+    return items_info.get(item_id)
+
+
+async def get_skus_info(session: AsyncSession,
+                        sku_ids: List[UUID]) -> Dict[UUID, dict]:
+    skus = await session.execute(
+        select(Sku.sku_id, Sku.created_at, Sku.actual_price, Sku.base_price,
+               Sku.count, Sku.is_hidden)
+        .where(in_ids(Sku.sku_id, sku_ids))
+    )
+    return {
+        sku.sku_id: {
+            "id": sku.sku_id,
+            "created_at": sku.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "actual_price": sku.actual_price,
+            "base_price": sku.base_price,
+            "count": sku.count,
+            "is_hidden": sku.is_hidden
+        }
+        for sku in skus
+    }
 
-    item = await session.scalar(stmt)
 
-    if item is None:
-        None
+async def get_sku_info(session: AsyncSession, sku_id: UUID):
+    return await cache.get_or_load(sku_key(sku_id),
+                                   lambda: load_sku_info(session, sku_id))
 
-    item_info = {
-        "id": item.item_id,
-        "sku_id": item.sku_id,
-        "stock": item.stock.value,
-        "reserved_state": item.reserved_state
-    }
 
-    return item_info
+async def load_sku_info(session: AsyncSession, sku_id: UUID):
+    skus_info = await get_skus_info(session, [sku_id])
+    return skus_info.get(sku_id)
 
 
-async def get_sku_info(session: AsyncSession, sku_id: UUID):
-    stmt = select(Sku).where(Sku.sku_id == sku_id)
+async def get_item_info_by_sku(session: AsyncSession, sku_id: UUID):
+    return await cache.get_or_load(
+        sku_items_key(sku_id), lambda: load_item_info_by_sku(session, sku_id))
 
-    sku = await session.scalar(stmt)
 
-    if sku is None:
-        None
-
-    sku_info = {
-        "id": sku.sku_id,
-        "created_at": sku.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "actual_price": sku.actual_price,
-        "base_price": sku.base_price,
-        "count": sku.count,
-        "is_hidden": sku.is_hidden
+async def load_item_info_by_sku(session: AsyncSession, sku_id: UUID):
+    stmt = (select(Item.item_id, Item.stock, Item.reserved_state)
+            .where(Item.sku_id == sku_id))
+    items = (await session.execute(stmt)).all()
+
+    if not items:
+        return None
+
+    items_info_list = [item_row(item) for item in items]
+
+    return {"items": items_info_list}
+
+
+def item_row(item) -> dict:
+    return {
+        "item_id": item.item_id,
+        "stock": item.stock.value,
+        "reserved_state": item.reserved_state
     }
 
-    return sku_info
 
+def list_items_by_sku_stmt(sku_id: UUID, cursor: Optional[str]):
+    stmt = (
+        select(Item.item_id, Item.stock, Item.reserved_state)
+        .where(Item.sku_id == sku_id)
+        .order_by(Item.item_id)
+    )
+    if cursor is not None:
+        item_id, = decode_cursor(cursor, UUID)
+        stmt = stmt.where(Item.item_id > item_id)
+    return stmt
 
-async def get_item_info_by_sku(session: AsyncSession,
-                               sku_id: UUID) -> SkuItemsResponse:
-    stmt = select(Item).where(Item.sku_id == sku_id)
-    items_result = await session.execute(stmt)
-    items = items_result.scalars().all()
 
-    if not items:
-        None
+async def list_items_by_sku(session: AsyncSession, sku_id: UUID,
+                            cursor: Optional[str], limit: int) -> dict:
+    return await fetch_page(session, list_items_by_sku_stmt(sku_id, cursor),
+                            limit, item_row, lambda item: (item.item_id,))
 
-    items_info_list = [ItemResponse(
-        item_id=item.item_id,
-        stock=item.stock,
-        reserved_state=item.reserved_state
-    ) for item in items]
 
-    return SkuItemsResponse(items=items_info_list)
+def stream_items_by_sku(sku_id: UUID, cursor: Optional[str],
+                        session_factory: async_sessionmaker):
+    return stream_ndjson(list_items_by_sku_stmt(sku_id, cursor), item_row,
+                         session_factory)
 
 
 async def markdown_item(session: AsyncSession, markdown_info: MarkdownItem):
     item_id = markdown_info.id
-    percentage = Decimal(markdown_info.percentage) / 100
-    item = await session.get(Item, item_id)
+    item = await session.scalar(
+        select(Item).where(Item.item_id == item_id).with_for_update())
 
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -78,47 +130,73 @@ async def markdown_item(session: AsyncSession, markdown_info: MarkdownItem):
     if not sku:
         raise HTTPException(status_code=404, detail="SKU not found")
 
+    deltas = new_deltas()
     if item.stock != SkuItemStock.DEFECT:
+        deltas[sku.sku_id][stock_column(item.stock,
+                                        item.reserved_state)] -= 1
         item.stock = SkuItemStock.DEFECT
 
-        sku_markdown_price = sku_markdown_price = sku.base_price * (
-                Decimal('1') - percentage
-                )
+        if item.reserved_state:
+            await replace_picking_target(session, item, deltas)
+        deltas[sku.sku_id][stock_column(item.stock,
+                                        item.reserved_state)] += 1
 
-        discounts_statement = select(Discounts).where(
-            Discounts.sku_id == sku.sku_id,
-            Discounts.status == DiscountStatus.active
-        )
-        active_discounts = await session.execute(discounts_statement)
-        for discount in active_discounts.scalars().all():
-            potential_discounted_price = sku.base_price * (
-                    Decimal('1') - Decimal(discount.percentage) / 100
-                    )
-            if potential_discounted_price < sku_markdown_price:
-                sku_markdown_price = potential_discounted_price
+        sku.markdown_percentage = max(sku.markdown_percentage or 0,
+                                      markdown_info.percentage)
+        await session.flush()
+        await recompute_prices(session, Sku.sku_id == sku.sku_id)
 
-        sku.actual_price = sku_markdown_price
-        session.add(sku)
-
-    await session.commit()
-
-    tasks_stmt = await session.execute(
-        select(Task).where(Task.task_target.contains({'Id': str(item_id),
-                                                      'stock': (SkuItemStock.VALID)})))
-    tasks_to_update = await session.execute(tasks_stmt)
-    for task in tasks_to_update.scalars().all():
-        if task.status == TaskStatus.IN_WORK:
-            similar_item_id = await find_similar_item(session, item.sku_id,
-                                                      SkuItemStock.VALID)
-        if similar_item_id:
-            task.task_target['Id'] = str(similar_item_id)
-            task.task_target['stock'] = 'valid'
-            session.add(task)
-        else:
-            task.status = TaskStatus.CANCELLED
-            session.add(task)
+    await apply_stock_deltas(session, deltas)
 
+    sku_id = sku.sku_id
     await session.commit()
+    await cache.invalidate_skus([sku_id])
+
+
+async def replace_picking_target(session: AsyncSession, item: Item,
+                                 deltas) -> None:
+    """Move an open picking task off ``item`` onto a free valid item.
+
+    The task is cancelled when the SKU has no free valid item left, which
+    closes it on its posting. The posting is locked before the task, as
+    ``finish_task`` does.
+    """
+    open_pick = (
+        select(Task).where(Task.task_target_id == item.item_id,
+                           Task.type == TaskType.PICKING,
+                           Task.status == TaskStatus.IN_WORK)
+    )
+    task = await session.scalar(open_pick)
+    if task is None:
+        return
+    posting = None
+    if task.posting_id is not None:
+        posting = await lock_posting(session, task.posting_id)
+    task = await session.scalar(
+        open_pick.with_for_update()
+        .execution_options(populate_existing=True))
+    if task is None:
+        return
+
+    item.reserved_state = False
+    similar_item_id = await find_similar_item(session, item.sku_id,
+                                              SkuItemStock.VALID)
+    if similar_item_id:
+        await session.execute(
+            update(Item).where(Item.item_id == similar_item_id)
+            .values(reserved_state=True)
+            .execution_options(synchronize_session=False)
+        )
+        deltas[item.sku_id][stock_column(SkuItemStock.VALID, False)] -= 1
+        deltas[item.sku_id][stock_column(SkuItemStock.VALID, True)] += 1
+        task.task_target_id = similar_item_id
+    else:
+        task.status = TaskStatus.CANCELED
+        events = [task_event(task.task_id, TaskType.PICKING,
+                             TaskStatus.CANCELED, task.posting_id)]
+        if posting is not None:
+            events += await close_pick(session, task.posting_id, posting)
+        await add_events(session, events)
 
 
 async def set_sku_price(session: AsyncSession, price_info: SetSkuPrice):
@@ -131,8 +209,11 @@ async def set_sku_price(session: AsyncSession, price_info: SetSkuPrice):
         raise HTTPException(status_code=404, detail="SKU not found")
 
     sku.base_price = price_info.base_price
+    await session.flush()
+    await recompute_prices(session, Sku.sku_id == price_info.sku_id)
 
     await session.commit()
+    await cache.invalidate_skus([price_info.sku_id], items=False)
 
 
 async def toggle_is_hidden(session: AsyncSession, toggle: ToggleIsHidden):
@@ -147,10 +228,11 @@ async def toggle_is_hidden(session: AsyncSession, toggle: ToggleIsHidden):
     sku.is_hidden = toggle.is_hidden
 
     await session.commit()
+    await cache.invalidate_skus([toggle.sku_id], items=False)
 
 
-async def move_to_not_found(session: AsyncSession, item_info: MoveToNotFound):
-    stmt = select(Item).where(Item.item_id == item_info.id)
+async def move_to_not_found(session: AsyncSession, item_id: UUID):
+    stmt = select(Item).where(Item.item_id == item_id).with_for_update()
 
     result = await session.execute(stmt)
     item = result.scalar_one_or_none()
@@ -158,7 +240,15 @@ async def move_to_not_found(session: AsyncSession, item_info: MoveToNotFound):
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
 
-    item.stock = "not found"
+    deltas = new_deltas()
+    if item.stock != SkuItemStock.NOT_FOUND:
+        deltas[item.sku_id][stock_column(item.stock,
+                                         item.reserved_state)] -= 1
+        deltas[item.sku_id][stock_column(SkuItemStock.NOT_FOUND,
+                                         item.reserved_state)] += 1
+        item.stock = SkuItemStock.NOT_FOUND
+    await apply_stock_deltas(session, deltas)
 
-    session.add(item)
+    sku_id = item.sku_id
     await session.commit()
+    await cache.invalidate_skus([sku_id])
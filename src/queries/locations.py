@@ -0,0 +1,141 @@
+import time
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config import settings
+from models import Item, Location, Task, TaskStatus, TaskType
+from queries.common import in_ids
+from routing import Stop, plan_route, route_length
+from schemas import CreateLocationsRequest
+
+
+async def create_locations(session: AsyncSession,
+                           request: CreateLocationsRequest) -> dict:
+    """Insert bins, or move existing ones with the same code.
+
+    A code listed twice takes its last entry: one upsert may not touch a
+    row twice.
+    """
+    locations = {location.code: location for location in request.locations}
+    if not locations:
+        return {"ids": {}}
+    stmt = insert(Location).values([
+        {"code": location.code, "zone": location.zone,
+         "x": location.x, "y": location.y}
+        for location in locations.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Location.code],
+        set_={"zone": stmt.excluded.zone, "x": stmt.excluded.x,
+              "y": stmt.excluded.y},
+    ).returning(Location.code, Location.location_id)
+    locations = await session.execute(stmt)
+    ids = {location.code: location.location_id for location in locations}
+    await session.commit()
+    return {"ids": ids}
+
+
+async def sku_slots(session: AsyncSession,
+                    sku_ids: Iterable[UUID]) -> Dict[UUID, Optional[UUID]]:
+    """Where to store new units of each SKU.
+
+    Units go next to the ones already in stock; a SKU seen for the first
+    time gets a random bin. ``None`` while no location exists yet.
+    """
+    sku_ids = list(dict.fromkeys(sku_ids))
+    if not sku_ids:
+        return {}
+    slots = dict((await session.execute(
+        select(Item.sku_id, Item.location_id)
+        .distinct(Item.sku_id)
+        .where(in_ids(Item.sku_id, sku_ids), Item.location_id.is_not(None))
+        .order_by(Item.sku_id)
+    )).all())
+
+    new_skus = [sku_id for sku_id in sku_ids if sku_id not in slots]
+    if new_skus:
+        spare = list(await session.scalars(
+            select(Location.location_id)
+            .order_by(func.random())
+            .limit(len(new_skus))
+        ))
+        for i, sku_id in enumerate(new_skus):
+            slots[sku_id] = spare[i % len(spare)] if spare else None
+    return slots
+
+
+async def missing_locations(session: AsyncSession,
+                            location_ids: Iterable[UUID]) -> List[UUID]:
+    location_ids = set(location_ids)
+    if not location_ids:
+        return []
+    found = set(await session.scalars(
+        select(Location.location_id)
+        .where(in_ids(Location.location_id, location_ids))
+    ))
+    return [location_id for location_id in location_ids
+            if location_id not in found]
+
+
+def depot():
+    return settings.PICK_DEPOT_X, settings.PICK_DEPOT_Y
+
+
+def plan(stops: List[Stop]) -> List[Stop]:
+    return plan_route(stops, depot(), settings.PICK_ROUTE_BUDGET_MS / 1000,
+                      settings.PICK_ROUTE_WINDOW)
+
+
+async def pick_order(session: AsyncSession,
+                     item_ids: List[UUID]) -> List[UUID]:
+    """``item_ids`` in walking order."""
+    items = await session.execute(
+        select(Item.item_id, Location.zone, Location.x, Location.y)
+        .outerjoin(Location, Location.location_id == Item.location_id)
+        .where(in_ids(Item.item_id, item_ids))
+    )
+    stops = {item.item_id: Stop(item.item_id, item.zone, item.x, item.y)
+             for item in items}
+    return [stop.key for stop in plan([stops[item_id]
+                                       for item_id in item_ids])]
+
+
+async def plan_pick_route(session: AsyncSession,
+                          posting_ids: List[UUID]) -> dict:
+    """One walk over the open picks of ``posting_ids`` (a wave)."""
+    tasks = await session.execute(
+        select(Task.task_id, Task.posting_id, Item.item_id, Item.sku_id,
+               Location.code, Location.zone, Location.x, Location.y)
+        .join(Item, Item.item_id == Task.task_target_id)
+        .outerjoin(Location, Location.location_id == Item.location_id)
+        .where(in_ids(Task.posting_id, posting_ids),
+               Task.type == TaskType.PICKING,
+               Task.status == TaskStatus.IN_WORK)
+        .order_by(Task.created_at, Task.pick_seq, Task.task_id)
+    )
+    stops = [Stop(task, task.zone, task.x, task.y) for task in tasks]
+
+    started = time.perf_counter()
+    route = plan(stops)
+    planning_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "stops": [
+            {
+                "task_id": stop.key.task_id,
+                "posting_id": stop.key.posting_id,
+                "item_id": stop.key.item_id,
+                "sku_id": stop.key.sku_id,
+                "location": stop.key.code,
+                "zone": stop.zone,
+            }
+            for stop in route
+        ],
+        "length": route_length(route, depot()),
+        "planning_ms": planning_ms,
+    }
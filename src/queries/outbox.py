@@ -0,0 +1,149 @@
+from datetime import timedelta
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import ARRAY, DateTime, Interval, Text, cast, delete, func, insert, literal, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import OutboxEvent, PostingStatus, TaskStatus, TaskType
+from responses import dumps
+
+
+OUTBOX_CHANNEL = "outbox_events"
+
+
+def posting_event(posting_id: UUID, status: PostingStatus) -> dict:
+    return {
+        "event_type": f"posting.{status.value}",
+        "aggregate_id": posting_id,
+        "posting_id": posting_id,
+        "payload": {"posting_id": str(posting_id), "status": status.value},
+    }
+
+
+def task_event(task_id: UUID, task_type: TaskType, status: TaskStatus,
+               posting_id: Optional[UUID]) -> dict:
+    return {
+        "event_type": f"task.{status.value}",
+        "aggregate_id": task_id,
+        "posting_id": posting_id,
+        "payload": {
+            "task_id": str(task_id),
+            "type": task_type.value,
+            "status": status.value,
+            "posting_id": None if posting_id is None else str(posting_id),
+        },
+    }
+
+
+async def add_events(session: AsyncSession, events: List[dict]) -> None:
+    """Queue ``events`` in the caller's transaction.
+
+    They become visible to the relay only if that transaction commits, so
+    an event is published exactly for the state changes that happened.
+    """
+    if events:
+        await session.execute(insert(OutboxEvent), events)
+
+
+def event_row(event) -> dict:
+    return {
+        "id": event.event_id,
+        "type": event.event_type,
+        "aggregate_id": event.aggregate_id,
+        "posting_id": event.posting_id,
+        "payload": event.payload,
+        "created_at": event.created_at,
+    }
+
+
+def event_columns():
+    return (OutboxEvent.event_id, OutboxEvent.event_type,
+            OutboxEvent.aggregate_id, OutboxEvent.posting_id,
+            OutboxEvent.payload, OutboxEvent.created_at)
+
+
+async def publish_pending(session: AsyncSession, limit: int) -> int:
+    """NOTIFY the oldest unpublished events and mark them published.
+
+    Notifications are delivered when this transaction commits, together
+    with the ``published_at`` marks, so a crash in between re-sends the
+    batch rather than losing it. Listeners must tolerate duplicates.
+    """
+    events = (await session.execute(
+        select(*event_columns())
+        .where(OutboxEvent.published_at.is_(None))
+        .order_by(OutboxEvent.event_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )).all()
+    if not events:
+        return 0
+
+    notices = func.unnest(
+        literal([dumps(event_row(event)).decode() for event in events],
+                ARRAY(Text))
+    ).table_valued("notice").render_derived()
+    await session.execute(
+        select(func.pg_notify(OUTBOX_CHANNEL, notices.c.notice)))
+    await session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.event_id.in_([event.event_id for event in events]))
+        .values(published_at=func.timezone('utc', func.now()))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return len(events)
+
+
+async def purge_published(session: AsyncSession, retention: timedelta,
+                          limit: int) -> int:
+    cutoff = (func.timezone('utc', func.now(), type_=DateTime)
+              - cast(retention, Interval))
+    old = (
+        select(OutboxEvent.event_id)
+        .where(OutboxEvent.published_at < cutoff)
+        .limit(limit)
+    )
+    result = await session.execute(
+        delete(OutboxEvent).where(OutboxEvent.event_id.in_(old)))
+    await session.commit()
+    return result.rowcount
+
+
+def events_filter(posting_id: Optional[UUID], task_id: Optional[UUID]):
+    conditions = []
+    if posting_id is not None:
+        conditions.append(OutboxEvent.posting_id == posting_id)
+    if task_id is not None:
+        conditions.append(OutboxEvent.aggregate_id == task_id)
+    return conditions
+
+
+async def replay_events(session: AsyncSession, after_id: int,
+                        posting_id: Optional[UUID], task_id: Optional[UUID],
+                        limit: int, margin_seconds: float) -> List[dict]:
+    """Events a client that last saw ``after_id`` may have missed.
+
+    Ids are taken at insert, not at commit, so an event with a lower id
+    than ``after_id`` can be published after it. Besides the higher ids,
+    every event published from ``margin_seconds`` before ``after_id`` on
+    is therefore sent again; some of those the client has already seen
+    and must skip by id. Oldest id first.
+    """
+    margin = cast(timedelta(seconds=margin_seconds), Interval)
+    last_published = (
+        select(OutboxEvent.published_at)
+        .where(OutboxEvent.event_id == after_id)
+        .scalar_subquery()
+    )
+    events = await session.execute(
+        select(*event_columns())
+        .where(or_(OutboxEvent.event_id > after_id,
+                   OutboxEvent.published_at >= last_published - margin),
+               *events_filter(posting_id, task_id))
+        .order_by(OutboxEvent.event_id)
+        .limit(limit)
+    )
+    return [event_row(event) for event in events]
@@ -1,219 +1,449 @@
+from collections import defaultdict
 from datetime import datetime
 from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy import and_
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import ARRAY, Integer, String, and_, cast, func, insert, literal, true, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
-
-from models import Item, Posting, PostingStatus, Sku, SkuItemStock, Task, TaskStatus, TaskType
-from schemas import CancelPostingRequest, CreatePostingRequest
 
+from cache import cache
+from models import Item, OrderedGood, Posting, PostingStatus, Sku, SkuItemStock, Task, TaskStatus, TaskType
+from queries.common import BeforeCommit, decode_cursor, fetch_page, in_ids, stream_ndjson, uuid_array
+from queries.locations import pick_order
+from queries.outbox import add_events, posting_event, task_event
+from queries.stock import apply_stock_deltas, new_deltas, stock_column
+from queries.waves import remove_from_open_wave
+from schemas import CancelPostingRequest, CreatePostingRequest, PostingStatusEnum
+
+
+async def get_postings_info(session: AsyncSession,
+                            posting_ids: List[UUID]) -> Dict[UUID, dict]:
+    postings = await session.execute(
+        select(Posting.posting_id, Posting.posting_status, Posting.created_at,
+               Posting.cost, Posting.not_found, Posting.wave_id)
+        .where(in_ids(Posting.posting_id, posting_ids))
+    )
+    postings_info = {}
+    for posting in postings:
+        postings_info[posting.posting_id] = {
+            "posting_id": posting.posting_id,
+            "posting_status": posting.posting_status.value,
+            "created_at": posting.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "cost": posting.cost,
+            "ordered_goods": {},
+            "not_found": list(posting.not_found or []),
+            "task_ids": [],
+            "wave_id": posting.wave_id,
+        }
+    if not postings_info:
+        return postings_info
 
-async def get_posting_info(session: AsyncSession, posting_id: UUID):
-    stmt = await session.execute(
-        select(Posting)
-        .options(
-            joinedload(Posting.ordered_goods),
-            joinedload(Posting.tasks),
+    ordered_goods = await session.execute(
+        select(OrderedGood.posting_id, OrderedGood.sku_id)
+        .where(in_ids(OrderedGood.posting_id, postings_info))
+    )
+    for row in ordered_goods:
+        postings_info[row.posting_id]["ordered_goods"].setdefault(
+            row.sku_id,
+            {"sku": row.sku_id, "from_valid_ids": [], "from_defect_ids": []},
         )
-        .where(Posting.posting_id == posting_id)
+
+    tasks = await session.execute(
+        select(Task.posting_id, Task.task_id, Task.type, Task.status,
+               Item.item_id, Item.sku_id, Item.stock)
+        .join(Item, Item.item_id == Task.task_target_id)
+        .where(in_ids(Task.posting_id, postings_info))
+        .order_by(Task.created_at, Task.pick_seq)
     )
+    for row in tasks:
+        posting_info = postings_info[row.posting_id]
+        posting_info["task_ids"].append({
+            "id": row.task_id,
+            "type": row.type.value,
+            "status": row.status.value,
+        })
+        if row.type != TaskType.PICKING:
+            continue
+        ordered_good = posting_info["ordered_goods"].setdefault(
+            row.sku_id,
+            {"sku": row.sku_id, "from_valid_ids": [], "from_defect_ids": []},
+        )
+        if row.stock == SkuItemStock.DEFECT:
+            ordered_good["from_defect_ids"].append(row.item_id)
+        else:
+            ordered_good["from_valid_ids"].append(row.item_id)
+
+    for posting_info in postings_info.values():
+        posting_info["ordered_goods"] = list(
+            posting_info["ordered_goods"].values())
+
+    return postings_info
 
-    posting = stmt.scalar_one_or_none()
 
-    if not posting:
-        return None
+async def get_posting_info(session: AsyncSession, posting_id: UUID):
+    postings_info = await get_postings_info(session, [posting_id])
+    return postings_info.get(posting_id)
+
 
-    posting_info = {
-        "id": posting.posting_id,
-        "status": posting.posting_status.value,
+def posting_row(posting) -> dict:
+    return {
+        "posting_id": posting.posting_id,
+        "posting_status": posting.posting_status.value,
         "created_at": posting.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "cost": str(posting.cost),
-        "ordered_goods": [],
-        "not_found": [],
-        "task_ids": [],
+        "cost": posting.cost,
     }
 
-    for item in posting.ordered_goods:
-        ordered_goods_info = {
-            "sku_id": item.sku_id,
-            "from_valid_ids": [str(uuid) for uuid in item.from_valid_ids],
-            "from_defect_ids": [str(uuid) for uuid in item.from_defect_ids],
-        }
-        posting_info["ordered_goods"].append(ordered_goods_info)
 
-    for item in posting.not_found:
-        item_info = {
-            "sku_id": str(item.sku_id),
-        }
-        posting_info["not_found"].append(item_info)
+def list_postings_stmt(status: Optional[PostingStatusEnum],
+                       cursor: Optional[str]):
+    stmt = (
+        select(Posting.posting_id, Posting.posting_status,
+               Posting.created_at, Posting.cost)
+        .order_by(Posting.created_at, Posting.posting_id)
+    )
+    if status is not None:
+        stmt = stmt.where(
+            Posting.posting_status == PostingStatus(status.value))
+    if cursor is not None:
+        created_at, posting_id = decode_cursor(
+            cursor, datetime.fromisoformat, UUID)
+        stmt = stmt.where(tuple_(Posting.created_at, Posting.posting_id)
+                          > tuple_(created_at, posting_id))
+    return stmt
 
-    for task in posting.tasks:
-        task_info = {
-            "id": task.task_id,
-            "type": task.type.value,
-            "status": task.status.value,
-        }
-        posting_info["task_ids"].append(task_info)
 
-    return posting_info
+async def list_postings(session: AsyncSession,
+                        status: Optional[PostingStatusEnum],
+                        cursor: Optional[str], limit: int) -> dict:
+    return await fetch_page(session, list_postings_stmt(status, cursor),
+                            limit, posting_row,
+                            lambda posting: (posting.created_at.isoformat(),
+                                             posting.posting_id))
+
+
+def stream_postings(status: Optional[PostingStatusEnum],
+                    cursor: Optional[str],
+                    session_factory: async_sessionmaker):
+    return stream_ndjson(list_postings_stmt(status, cursor), posting_row,
+                         session_factory)
 
 
 async def find_similar_item(session: AsyncSession, sku_id: UUID,
                             stock: SkuItemStock):
-    stmt = select(Item).where(
+    stmt = select(Item.item_id).where(
         Item.sku_id == sku_id,
         Item.stock == stock,
-        not Item.reserved_state
-    ).limit(1)
+        Item.reserved_state.is_(False)
+    ).limit(1).with_for_update(skip_locked=True)
+
+    return await session.scalar(stmt)
+
+
+def requested_units(posting_info: CreatePostingRequest
+                    ) -> List[Tuple[UUID, SkuItemStock, UUID]]:
+    units = []
+    for order_goods in posting_info.ordered_goods:
+        units += [(order_goods.sku, SkuItemStock.VALID, item_id)
+                  for item_id in order_goods.from_valid_ids]
+        units += [(order_goods.sku, SkuItemStock.DEFECT, item_id)
+                  for item_id in order_goods.from_defect_ids]
+    return units
+
+
+async def reserve_items(session: AsyncSession,
+                        units: List[Tuple[UUID, SkuItemStock, UUID]]
+                        ) -> Tuple[List[UUID], List[UUID]]:
+    """Reserve one item per requested unit in a constant number of queries.
+
+    Requested items are locked with ``FOR UPDATE SKIP LOCKED`` and marked
+    reserved by the same ``UPDATE``: an item held by a concurrent posting
+    is treated as a miss instead of blocking on it, and so is an item of
+    another SKU or stock state. Misses are replaced by free items of the
+    same SKU and stock state, all picked and reserved by one ``UPDATE``
+    over a ``LATERAL`` query. Returns the reserved item ids and the SKU id
+    of every unit that could not be filled.
+    """
+    requested = func.unnest(
+        uuid_array(item_id for _, _, item_id in units),
+        uuid_array(sku_id for sku_id, _, _ in units),
+        literal([stock.name for _, stock, _ in units], ARRAY(String)),
+    ).table_valued("item_id", "sku_id", "stock").render_derived("requested")
+    lockable = (
+        select(Item.item_id)
+        .join(requested, and_(
+            Item.item_id == requested.c.item_id,
+            Item.sku_id == requested.c.sku_id,
+            Item.stock == cast(requested.c.stock,
+                               Item.__table__.c.stock.type)))
+        .where(Item.reserved_state.is_(False))
+        .with_for_update(of=Item, skip_locked=True)
+    )
+    locked = await session.execute(
+        update(Item)
+        .where(Item.item_id.in_(lockable))
+        .values(reserved_state=True)
+        .returning(Item.item_id, Item.sku_id, Item.stock)
+        .execution_options(synchronize_session=False)
+    )
+    free = {row.item_id: (row.sku_id, row.stock) for row in locked}
+
+    reserved = []
+    deltas = new_deltas()
+    missing: Dict[Tuple[UUID, SkuItemStock], int] = defaultdict(int)
+    for sku_id, stock, item_id in units:
+        # Every locked item matches one of its units; an item requested
+        # twice fills the first matching unit only.
+        if free.get(item_id) == (sku_id, stock):
+            del free[item_id]
+            reserved.append(item_id)
+            deltas[sku_id][stock_column(stock, False)] -= 1
+            deltas[sku_id][stock_column(stock, True)] += 1
+        else:
+            missing[(sku_id, stock)] += 1
+
+    not_found = []
+    if missing:
+        wanted = func.unnest(
+            uuid_array(sku_id for sku_id, _ in missing),
+            literal([stock.name for _, stock in missing], ARRAY(String)),
+            literal(list(missing.values()), ARRAY(Integer)),
+        ).table_valued("sku_id", "stock", "need").render_derived("wanted")
+
+        # The items reserved above already read as reserved here.
+        substitute = (
+            select(Item.item_id)
+            .where(
+                Item.sku_id == wanted.c.sku_id,
+                Item.stock == cast(wanted.c.stock, Item.__table__.c.stock.type),
+                Item.reserved_state.is_(False),
+            )
+            .limit(wanted.c.need)
+            .with_for_update(skip_locked=True)
+            .lateral("substitute")
+        )
+        picked = (
+            select(wanted.c.sku_id, wanted.c.stock, substitute.c.item_id)
+            .select_from(wanted.join(substitute, true()))
+            .subquery("picked")
+        )
+        substitutes = await session.execute(
+            update(Item)
+            .where(Item.item_id == picked.c.item_id)
+            .values(reserved_state=True)
+            .returning(picked.c.sku_id, picked.c.stock, Item.item_id)
+            .execution_options(synchronize_session=False)
+        )
+        for row in substitutes:
+            stock = SkuItemStock[row.stock]
+            reserved.append(row.item_id)
+            missing[(row.sku_id, stock)] -= 1
+            deltas[row.sku_id][stock_column(stock, False)] -= 1
+            deltas[row.sku_id][stock_column(stock, True)] += 1
+
+        for (sku_id, _), count in missing.items():
+            not_found += [sku_id] * count
 
-    similar_item = await session.execute(stmt)
-    similar_item = similar_item.scalars().first()
+    if reserved:
+        await apply_stock_deltas(session, deltas)
 
-    return similar_item.item_id if similar_item else None
+    return reserved, not_found
 
 
 async def create_posting(session: AsyncSession,
-                         posting_info: CreatePostingRequest):
+                         posting_info: CreatePostingRequest,
+                         before_commit: Optional[BeforeCommit] = None):
+    """Reserve the ordered items and create the posting with its picks.
+
+    ``before_commit(posting_id)`` runs in the posting's transaction, e.g.
+    to store the idempotent response together with the posting.
+    """
+    reserved, not_found = await reserve_items(
+        session, requested_units(posting_info))
+
+    cost = (
+        select(func.coalesce(func.sum(Sku.actual_price), Decimal('0')))
+        .join(Item, Item.sku_id == Sku.sku_id)
+        .where(in_ids(Item.item_id, reserved))
+        .scalar_subquery()
+    )
     posting = Posting(
-        cost = Decimal('0'),
-        posting_status = PostingStatus.IN_ITEM_PICK
+        cost=cost,
+        posting_status=PostingStatus.IN_ITEM_PICK,
+        not_found=not_found,
+        open_tasks=len(reserved),
         )
     session.add(posting)
+    await session.flush()
+
+    if posting_info.ordered_goods:
+        await session.execute(insert(OrderedGood), [
+            {"sku_id": order_goods.sku, "posting_id": posting.posting_id}
+            for order_goods in posting_info.ordered_goods
+        ])
+
+    if reserved:
+        await session.execute(insert(Task), [
+            {
+                "type": TaskType.PICKING,
+                "status": TaskStatus.IN_WORK,
+                "task_target_id": item_id,
+                "posting_id": posting.posting_id,
+                "pick_seq": pick_seq,
+            }
+            for pick_seq, item_id in enumerate(
+                await pick_order(session, reserved))
+        ])
+
+    posting_id = posting.posting_id
+    if before_commit is not None:
+        await before_commit(posting_id)
     await session.commit()
+    await cache.invalidate_skus(
+        [order_goods.sku for order_goods in posting_info.ordered_goods],
+        info=False)
+
+    return posting_id
+
+
+async def close_pick(session: AsyncSession, posting_id: UUID,
+                     posting) -> List[dict]:
+    """Count one pick of a locked posting as no longer open.
+
+    ``posting`` holds the ``posting_status`` and ``open_tasks`` read under
+    the lock; closing the last open pick sends the posting, whether the
+    pick was completed or cancelled. Returns the outbox events to add.
+    """
+    if not posting.open_tasks:
+        return []
+    values = {"open_tasks": Posting.open_tasks - 1}
+    events = []
+    if (posting.open_tasks == 1
+            and posting.posting_status == PostingStatus.IN_ITEM_PICK):
+        values["posting_status"] = PostingStatus.SENT
+        events.append(posting_event(posting_id, PostingStatus.SENT))
+    await session.execute(
+        update(Posting)
+        .where(Posting.posting_id == posting_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return events
 
 
-    total_cost = Decimal('0')
-    tasks = []
-    for order_goods in posting_info.ordered_goods:
-        for item_id in (
-             order_goods.from_valid_ids + order_goods.from_defect_ids):
-                item = await session.get(Item, item_id)
-
-                if item and not item.reserved_state:
-                    item.reserved_state = True
-                    sku = await session.get(Sku, item.sku_id)
-                    item_cost = sku.actual_price
-                    total_cost += item_cost
-
-                    task_target = {"stock": item.stock.value, "Id": str(item.item_id)}
-                    task_info = Task(
-                        status=TaskStatus.IN_WORK,
-                        created_at=datetime.utcnow(),
-                        type=TaskType.PICKING,
-                        task_target=task_target
-                    )
-                    tasks.append(task_info)
-
-                else:
-                    stock = SkuItemStock.VALID if item in (
-                        order_goods.from_valid_ids) else SkuItemStock.DEFECT
-                    similar_item_id = await find_similar_item(session,
-                                                            order_goods.sku,
-                                                            stock)
-                    
-                    if similar_item_id:
-                        task_target = {"stock": stock, "Id": str(similar_item_id)}
-                        task_info = Task(
-                            status=TaskStatus.IN_WORK,
-                            created_at=datetime.utcnow(),
-                            type=TaskType.PICKING,
-                            task_target=task_target,
-                            posting_id=posting.posting_id,
-                        )
-
-                    else:
-                        task_target = {"stock": stock, "Id": str(item_id)}
-                        task_info = Task(
-                            status=TaskStatus.CANCELED,
-                            task_target=task_target,
-                            posting_id=posting.posting_id,
-                        )
-                    new_item = Item(
-                        sku_id=order_goods.sku, 
-                        stock=SkuItemStock.NOT_FOUND
-                    )
-                    session.add(new_item)
-                    tasks.append(task_info)
-
-    posting.cost = total_cost
-    session.add_all(tasks)
-    await session.commit()
-
-    return posting.posting_id
+async def lock_posting(session: AsyncSession, posting_id: UUID):
+    return (await session.execute(
+        select(Posting.posting_status, Posting.open_tasks)
+        .where(Posting.posting_id == posting_id)
+        .with_for_update()
+    )).one()
 
 
 async def send_posting(session: AsyncSession, posting_id: UUID) -> None:
-    posting = await session.get(Posting, posting_id)
+    """Send a posting by hand; ``finish_task`` sends it on the last pick."""
+    posting = (await session.execute(
+        select(Posting.posting_status, Posting.open_tasks)
+        .where(Posting.posting_id == posting_id)
+        .with_for_update()
+    )).one_or_none()
     if posting is None:
         raise HTTPException(status_code=404, detail="Posting not found")
-
-    tasks_stmt = select(Task).where(Task.posting_id == posting_id)
-    tasks_result = await session.execute(tasks_stmt)
-    tasks = tasks_result.scalars().all()
-
-    if all(task.status == TaskStatus.COMPLETED for task in tasks):
-        posting.status = PostingStatus.SENT
-        session.add(posting)
-    else:
+    if posting.posting_status != PostingStatus.IN_ITEM_PICK:
+        raise HTTPException(status_code=400,
+                            detail="Posting cannot be sent")
+    if posting.open_tasks:
         raise HTTPException(status_code=400,
                             detail="Not all tasks are completed")
 
+    await session.execute(
+        update(Posting)
+        .where(Posting.posting_id == posting_id)
+        .values(posting_status=PostingStatus.SENT)
+        .execution_options(synchronize_session=False)
+    )
+    await add_events(session, [posting_event(posting_id, PostingStatus.SENT)])
     await session.commit()
 
 
 async def cancel_posting(session: AsyncSession,
                          posting_info: CancelPostingRequest):
     result = await session.execute(select(Posting).where(
-        Posting.posting_id == posting_info.id)
+        Posting.posting_id == posting_info.id).with_for_update()
         )
     posting = result.scalar_one_or_none()
 
     if posting is None:
         raise HTTPException(status_code=404, detail="Posting not found")
 
-    if posting.posting_status == PostingStatus.IN_ITEM_PICK:
-        posting.posting_status = PostingStatus.CANCELED
-        tasks = await session.execute(
-            select(Task).where(
-                and_(Task.posting_id == posting_info.id,
-                     Task.status.in_(TaskStatus.IN_WORK))
-            )
+    if posting.posting_status != PostingStatus.IN_ITEM_PICK:
+        raise HTTPException(status_code=400,
+                            detail="Posting cannot be canceled")
+
+    if posting.wave_id is not None:
+        await remove_from_open_wave(session, posting.wave_id,
+                                    posting_info.id)
+    posting.posting_status = PostingStatus.CANCELED
+    posting.open_tasks = 0
+
+    picks = await session.execute(
+        select(Task.task_target_id, Task.status).where(
+            and_(Task.posting_id == posting_info.id,
+                 Task.type == TaskType.PICKING,
+                 Task.status != TaskStatus.CANCELED)
         )
+    )
+    targets, picked = [], set()
+    for pick in picks:
+        targets.append(pick.task_target_id)
+        if pick.status == TaskStatus.COMPLETED:
+            picked.add(pick.task_target_id)
+
+    canceled = await session.scalars(
+        update(Task)
+        .where(Task.posting_id == posting_info.id,
+               Task.type == TaskType.PICKING,
+               Task.status == TaskStatus.IN_WORK)
+        .values(status=TaskStatus.CANCELED)
+        .returning(Task.task_id)
+        .execution_options(synchronize_session=False)
+    )
+    events = [posting_event(posting_info.id, PostingStatus.CANCELED)]
+    events += [task_event(task_id, TaskType.PICKING, TaskStatus.CANCELED,
+                          posting_info.id)
+               for task_id in canceled]
+
+    released = await session.execute(
+        update(Item)
+        .where(in_ids(Item.item_id, targets), Item.reserved_state.is_(True))
+        .values(reserved_state=False)
+        .returning(Item.item_id, Item.sku_id, Item.stock)
+        .execution_options(synchronize_session=False)
+    )
+    deltas = new_deltas()
+    placing = []
+    for item in released:
+        deltas[item.sku_id][stock_column(item.stock, True)] -= 1
+        deltas[item.sku_id][stock_column(item.stock, False)] += 1
+        if item.item_id in picked:
+            placing.append({
+                "type": TaskType.PLACING,
+                "status": TaskStatus.IN_WORK,
+                "task_target_id": item.item_id,
+                "posting_id": posting_info.id,
+            })
+
+    if placing:
+        placed = await session.scalars(
+            insert(Task).returning(Task.task_id), placing)
+        events += [task_event(task_id, TaskType.PLACING, TaskStatus.IN_WORK,
+                              posting_info.id)
+                   for task_id in placed]
+    await apply_stock_deltas(session, deltas)
+    await add_events(session, events)
 
-    tasks = tasks.scalars().all()
-    for task in tasks:
-        task.status = TaskStatus.CANCELED
-        session.add(task)
-
-    task = []
-    for orders_goods in posting.ordered_goods:
-        for item_id in (orders_goods.from_valid_ids
-                        + orders_goods.from_defect_ids):
-            stock = "valid" if item_id in (
-                orders_goods.from_valid_ids) else "defect"
-            item = await session.get(Item, item_id)
-            if item and item.reserved_state:
-                item.reserved_state = False
-                session.add(item)
-
-                task_target = {"Id": str(item.sku_id), "stock": stock}
-                task_info = Task(
-                    status=TaskStatus.IN_WORK,
-                    created_at=datetime.utcnow(),
-                    type=TaskType.PLACING,
-                    task_target=task_target,
-                    posting_id=posting.posting_id
-                )
-                task.append(task_info)
-
-        session.add_all(task)
-        await session.commit()
-
-        return {"status": "Posting canceled successfully"}
-    else:
-        raise HTTPException(status_code=400,
-                            detail="Posting cannot be canceled")
\ No newline at end of file
+    await session.commit()
+    await cache.invalidate_skus(deltas, info=False)
+
+    return {"status": "Posting canceled successfully"}
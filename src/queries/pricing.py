@@ -0,0 +1,67 @@
+from typing import List
+from uuid import UUID
+
+from sqlalchemy import NUMERIC, cast, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import DiscountStatus, Discounts, Sku, discount_sku_association
+
+
+def best_discount_percentage():
+    """Largest active discount on the SKU of the row being updated."""
+    return (
+        select(func.max(Discounts.percentage))
+        .select_from(discount_sku_association.join(Discounts))
+        .where(discount_sku_association.c.sku_id == Sku.sku_id,
+               Discounts.status == DiscountStatus.active)
+        .scalar_subquery()
+    )
+
+
+def best_price():
+    """``base_price`` reduced by the best discount or markdown, whichever
+    is larger; both are percentages, so the largest one wins."""
+    percentage = func.greatest(
+        func.coalesce(best_discount_percentage(), 0),
+        func.coalesce(Sku.markdown_percentage, 0),
+    )
+    return func.round(
+        Sku.base_price * (1 - cast(percentage, NUMERIC) / 100), 2)
+
+
+def discount_sku_ids(discount_id: UUID):
+    return (
+        select(discount_sku_association.c.sku_id)
+        .where(discount_sku_association.c.discount_id == discount_id)
+    )
+
+
+async def recompute_prices(session: AsyncSession, sku_filter) -> List[UUID]:
+    """Store the best price of every SKU matching ``sku_filter``.
+
+    One UPDATE covers all the SKUs, whatever their number. Rows are locked
+    in ``sku_id`` order first, so two promotions over overlapping SKUs
+    wait on each other instead of deadlocking. The lock is ``FOR NO KEY
+    UPDATE``: a plain ``FOR UPDATE`` would also wait on the key-share locks
+    that inserting ``discount_sku_association`` rows takes on the same SKUs,
+    in no particular order. Returns the SKUs whose ``actual_price``
+    actually changed.
+    """
+    locked = (
+        select(Sku.sku_id)
+        .where(sku_filter)
+        .order_by(Sku.sku_id)
+        .with_for_update(key_share=True)
+        .cte("locked")
+    )
+    price = best_price()
+    changed = await session.scalars(
+        update(Sku)
+        .where(Sku.sku_id == locked.c.sku_id,
+               Sku.actual_price.is_distinct_from(price))
+        .values(actual_price=price)
+        .returning(Sku.sku_id)
+        .execution_options(synchronize_session=False)
+    )
+    return list(changed)
@@ -0,0 +1,133 @@
+from collections import Counter, defaultdict
+from typing import Dict, List
+from uuid import UUID
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import Item, SkuItemStock, SkuStock
+
+
+STOCK_COLUMNS = [
+    f"{stock.value}_{state}"
+    for stock in SkuItemStock
+    for state in ("free", "reserved")
+]
+
+
+def stock_column(stock: SkuItemStock, reserved: bool) -> str:
+    return f"{stock.value}_{'reserved' if reserved else 'free'}"
+
+
+def new_deltas() -> Dict[UUID, Counter]:
+    return defaultdict(Counter)
+
+
+async def apply_stock_deltas(session: AsyncSession,
+                             deltas: Dict[UUID, Counter]) -> None:
+    """Add ``deltas`` to the per-SKU ledger in one upsert.
+
+    Rows are written in ``sku_id`` order so that concurrent transactions
+    touching the same SKUs always lock them in the same order.
+    """
+    rows = [
+        {"sku_id": sku_id,
+         **{column: deltas[sku_id][column] for column in STOCK_COLUMNS}}
+        for sku_id in sorted(deltas)
+        if any(deltas[sku_id].values())
+    ]
+    if not rows:
+        return
+
+    stmt = insert(SkuStock).values(rows)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[SkuStock.sku_id],
+        set_={column: getattr(SkuStock, column) + stmt.excluded[column]
+              for column in STOCK_COLUMNS},
+    ))
+
+
+async def get_sku_availability(session: AsyncSession, sku_id: UUID):
+    stock = (await session.execute(
+        select(SkuStock.sku_id,
+               *[getattr(SkuStock, column) for column in STOCK_COLUMNS])
+        .where(SkuStock.sku_id == sku_id)
+    )).one_or_none()
+
+    if stock is None:
+        return None
+
+    return {
+        "sku_id": stock.sku_id,
+        **{column: getattr(stock, column) for column in STOCK_COLUMNS},
+    }
+
+
+async def reconcile_stock(session: AsyncSession,
+                          fix: bool = False) -> List[dict]:
+    """Compare the ledger with counts aggregated from the ``item`` table.
+
+    Both sides are read from one REPEATABLE READ snapshot. With ``fix`` the
+    mismatching ledger rows are overwritten with the aggregated counts in
+    the same transaction, so a write that raced with the check makes the
+    fix fail with a serialization error instead of being lost.
+    """
+    await session.connection(
+        execution_options={"isolation_level": "REPEATABLE READ"})
+
+    actual = (
+        select(
+            Item.sku_id,
+            *[func.count().filter(Item.stock == stock,
+                                  Item.reserved_state.is_(reserved))
+              .label(stock_column(stock, reserved))
+              for stock in SkuItemStock
+              for reserved in (False, True)],
+        )
+        .group_by(Item.sku_id)
+        .subquery("actual")
+    )
+    ledger = SkuStock.__table__
+
+    stmt = (
+        select(
+            func.coalesce(actual.c.sku_id, ledger.c.sku_id).label("sku_id"),
+            *[func.coalesce(actual.c[column], 0).label(f"actual_{column}")
+              for column in STOCK_COLUMNS],
+            *[func.coalesce(ledger.c[column], 0).label(f"ledger_{column}")
+              for column in STOCK_COLUMNS],
+        )
+        .select_from(actual.join(ledger,
+                                 actual.c.sku_id == ledger.c.sku_id,
+                                 full=True))
+        .where(or_(*[
+            func.coalesce(actual.c[column], 0)
+            != func.coalesce(ledger.c[column], 0)
+            for column in STOCK_COLUMNS
+        ]))
+    )
+    mismatches = [
+        {
+            "sku_id": row.sku_id,
+            "actual": {column: row._mapping[f"actual_{column}"]
+                       for column in STOCK_COLUMNS},
+            "ledger": {column: row._mapping[f"ledger_{column}"]
+                       for column in STOCK_COLUMNS},
+        }
+        for row in await session.execute(stmt)
+    ]
+
+    if fix and mismatches:
+        stmt = insert(SkuStock).values([
+            {"sku_id": mismatch["sku_id"], **mismatch["actual"]}
+            for mismatch in mismatches
+        ])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[SkuStock.sku_id],
+            set_={column: stmt.excluded[column] for column in STOCK_COLUMNS},
+        ))
+        await session.commit()
+
+    return mismatches
@@ -1,47 +1,230 @@
-import datetime
-from decimal import Decimal
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from fastapi import HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import DateTime, Interval, cast, func, or_, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased
 
-from models import Task, TaskStatus
-from schemas import FinishTaskRequest
+from models import Item, Posting, PostingStatus, Task, TaskStatus, TaskType
+from queries.common import decode_cursor, fetch_page, in_ids, stream_ndjson
+from queries.outbox import add_events, task_event
+from queries.posting import close_pick, lock_posting
+from schemas import ClaimTasksRequest, FinishTaskRequest, HeartbeatTasksRequest, TaskStatusEnum, TaskTypeEnum
+
+
+def task_row(task) -> dict:
+    return {
+        "id": task.task_id,
+        "type": task.type.value,
+        "status": task.status.value,
+        "posting_id": task.posting_id,
+        "stock_state": task.stock.value,
+        "stock_item_id": task.item_id,
+    }
+
+
+def tasks_stmt():
+    return (
+        select(Task.task_id, Task.type, Task.status, Task.posting_id,
+               Task.created_at, Item.item_id, Item.stock)
+        .join(Item, Item.item_id == Task.task_target_id)
+    )
+
+
+async def get_tasks_info(session: AsyncSession,
+                         task_ids: List[UUID]) -> Dict[UUID, dict]:
+    tasks = await session.execute(
+        tasks_stmt().where(in_ids(Task.task_id, task_ids))
+    )
+    return {task.task_id: task_row(task) for task in tasks}
 
 
 async def get_task_info(session: AsyncSession, task_id: UUID):
-    task = await session.execute(
-    select(Task).options(joinedload(Task.task_target))
+    tasks_info = await get_tasks_info(session, [task_id])
+    return tasks_info.get(task_id)
+
+
+def list_tasks_stmt(type: Optional[TaskTypeEnum],
+                    status: Optional[TaskStatusEnum],
+                    cursor: Optional[str]):
+    stmt = tasks_stmt().order_by(Task.created_at, Task.task_id)
+    if type is not None:
+        stmt = stmt.where(Task.type == TaskType(type.value))
+    if status is not None:
+        stmt = stmt.where(Task.status == TaskStatus(status.value))
+    if cursor is not None:
+        created_at, task_id = decode_cursor(cursor, datetime.fromisoformat,
+                                            UUID)
+        stmt = stmt.where(tuple_(Task.created_at, Task.task_id)
+                          > tuple_(created_at, task_id))
+    return stmt
+
+
+async def list_tasks(session: AsyncSession, type: Optional[TaskTypeEnum],
+                     status: Optional[TaskStatusEnum], cursor: Optional[str],
+                     limit: int) -> dict:
+    return await fetch_page(session, list_tasks_stmt(type, status, cursor),
+                            limit, task_row,
+                            lambda task: (task.created_at.isoformat(),
+                                          task.task_id))
+
+
+def stream_tasks(type: Optional[TaskTypeEnum],
+                 status: Optional[TaskStatusEnum], cursor: Optional[str],
+                 session_factory: async_sessionmaker):
+    return stream_ndjson(list_tasks_stmt(type, status, cursor), task_row,
+                         session_factory)
+
+
+async def claim_tasks(session: AsyncSession,
+                      claim: ClaimTasksRequest) -> List[dict]:
+    """Hand ``claim.worker_id`` the oldest open tasks nobody holds a lease on.
+
+    Candidate rows are locked with ``FOR UPDATE SKIP LOCKED``, so workers
+    claiming at the same time each get a disjoint batch without waiting on
+    one another. With ``group_by_posting`` the batch is taken from a single
+    posting, and the posting row itself is the skip-locked unit.
+    """
+    now = func.timezone('utc', func.now(), type_=DateTime)
+    lease = cast(timedelta(seconds=claim.lease_seconds), Interval)
+
+    def claimable(task) -> list:
+        conditions = [
+            task.status == TaskStatus.IN_WORK,
+            or_(task.lease_expires_at.is_(None),
+                task.lease_expires_at < now),
+        ]
+        if claim.type is not None:
+            conditions.append(task.type == TaskType(claim.type.value))
+        return conditions
+
+    candidates = select(Task.task_id).where(*claimable(Task))
+    if claim.group_by_posting:
+        open_task = aliased(Task)
+        posting_id = (
+            select(Posting.posting_id)
+            .where(Posting.posting_status == PostingStatus.IN_ITEM_PICK,
+                   select(open_task.task_id)
+                   .where(open_task.posting_id == Posting.posting_id,
+                          *claimable(open_task))
+                   .exists())
+            .order_by(Posting.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        candidates = candidates.where(Task.posting_id == posting_id)
+    candidates = (
+        candidates
+        .order_by(Task.created_at, Task.pick_seq, Task.task_id)
+        .limit(claim.limit)
+        .with_for_update(skip_locked=True)
+        .cte("candidates")
     )
-    task = task.scalar_one_or_none()
 
-    task_info = {
-        "id": task.task_id,
-        "status": task.status.value,
-        "created_at": task.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-        "type": task.type.value,
-            "task_target": {
-            "stock": task.task_target.stock,
-            "item_id": str(task.task_target.item_id)
-        },
-        "posting_id": task.posting_id
+    claimed = await session.execute(
+        update(Task)
+        .where(Task.task_id == candidates.c.task_id)
+        .values(claimed_by=claim.worker_id,
+                lease_expires_at=now + lease)
+        .returning(Task.task_id, Task.type, Task.posting_id,
+                   Task.task_target_id, Task.created_at, Task.pick_seq,
+                   Task.lease_expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    tasks = sorted(claimed, key=lambda task: (
+        task.created_at, task.pick_seq is None, task.pick_seq or 0,
+        task.task_id))
+    await session.commit()
+
+    return [
+        {
+            "id": task.task_id,
+            "type": task.type.value,
+            "posting_id": task.posting_id,
+            "stock_item_id": task.task_target_id,
+            "lease_expires_at": task.lease_expires_at,
+        }
+        for task in tasks
+    ]
+
+
+async def heartbeat_tasks(session: AsyncSession,
+                          heartbeat: HeartbeatTasksRequest) -> dict:
+    """Extend the leases ``heartbeat.worker_id`` still holds.
+
+    A lease that already ran out is not renewed: the task may have been
+    claimed by another worker in the meantime.
+    """
+    now = func.timezone('utc', func.now(), type_=DateTime)
+    lease = cast(timedelta(seconds=heartbeat.lease_seconds), Interval)
+    renewed = await session.scalars(
+        update(Task)
+        .where(in_ids(Task.task_id, heartbeat.task_ids),
+               Task.claimed_by == heartbeat.worker_id,
+               Task.status == TaskStatus.IN_WORK,
+               Task.lease_expires_at >= now)
+        .values(lease_expires_at=now + lease)
+        .returning(Task.task_id)
+        .execution_options(synchronize_session=False)
+    )
+    renewed = set(renewed)
+    await session.commit()
+
+    return {
+        "renewed": [id for id in heartbeat.task_ids if id in renewed],
+        "lost": [id for id in heartbeat.task_ids if id not in renewed],
     }
-    return task_info
 
 
 async def finish_task(session: AsyncSession, task_info: FinishTaskRequest):
-    stmt = select(Task).where(Task.task_id == task_info.id)
-    result = await session.execute(stmt)
-    task = result.scalar_one_or_none()
+    """Finish a task; finishing the last open pick sends its posting.
+
+    The posting row is locked before the task, in the order
+    ``cancel_posting`` takes them, and only its ``open_tasks`` counter is
+    read, so the cost does not grow with the number of tasks. A cancelled
+    pick is no longer open either.
+    """
+    status = TaskStatus(task_info.status.value)
+    if status not in (TaskStatus.COMPLETED, TaskStatus.CANCELED):
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    task = (await session.execute(
+        select(Task.type, Task.posting_id)
+        .where(Task.task_id == task_info.id)
+    )).one_or_none()
 
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    if task_info.status not in [TaskStatus.COMPLETED, TaskStatus.CANCELED]:
-        raise HTTPException(status_code=400, detail="Invalid status")
+    picking = task.type == TaskType.PICKING and task.posting_id is not None
+    if picking:
+        posting = await lock_posting(session, task.posting_id)
+
+    current = await session.scalar(
+        select(Task.status)
+        .where(Task.task_id == task_info.id)
+        .with_for_update()
+    )
+    if current == status:
+        return
+    if current != TaskStatus.IN_WORK:
+        raise HTTPException(status_code=400,
+                            detail="Task is already finished")
+
+    await session.execute(
+        update(Task)
+        .where(Task.task_id == task_info.id)
+        .values(status=status, claimed_by=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    events = [task_event(task_info.id, task.type, status, task.posting_id)]
+
+    if picking:
+        events += await close_pick(session, task.posting_id, posting)
 
-    task.status = task_info.status.value
-    session.add(task)
-    await session.commit()
\ No newline at end of file
+    await add_events(session, events)
+    await session.commit()
@@ -0,0 +1,204 @@
+from collections import defaultdict
+from datetime import timedelta
+from typing import List, Optional
+from uuid import UUID
+
+from sqlalchemy import DateTime, Interval, cast, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from metrics import WAVE_POSTINGS, WAVE_UNITS_PER_RUN, WAVES_RELEASED
+from models import (Item, Location, Posting, PostingStatus, Task, TaskStatus,
+                    TaskType, Wave, WaveLine, WaveStatus)
+from queries.common import in_ids
+from queries.locations import plan
+from routing import Stop
+
+
+def utc_now():
+    return func.timezone('utc', func.now(), type_=DateTime)
+
+
+async def add_to_wave(session: AsyncSession, wave_id: UUID,
+                      posting_ids: List[UUID], sign: int = 1) -> int:
+    """Fold the open picks of ``posting_ids`` into the wave's lines.
+
+    Lines are keyed by zone and SKU and only their unit counts change, so
+    joining a wave costs the same whatever the wave already holds. With
+    ``sign=-1`` the postings are taken out again. Returns the units moved.
+    """
+    zone = func.coalesce(Location.zone, "")
+    picks = await session.execute(
+        select(zone.label("zone"), Item.sku_id,
+               func.count().label("units"),
+               func.array_agg(Item.location_id)[1].label("location_id"))
+        .select_from(Task)
+        .join(Item, Item.item_id == Task.task_target_id)
+        .outerjoin(Location, Location.location_id == Item.location_id)
+        .where(in_ids(Task.posting_id, posting_ids),
+               Task.type == TaskType.PICKING,
+               Task.status == TaskStatus.IN_WORK)
+        .group_by(zone, Item.sku_id)
+    )
+    lines = [
+        {"wave_id": wave_id, "zone": pick.zone, "sku_id": pick.sku_id,
+         "location_id": pick.location_id, "units": sign * pick.units}
+        for pick in picks
+    ]
+    units = sum(line["units"] for line in lines)
+    if lines:
+        stmt = insert(WaveLine).values(lines)
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[WaveLine.wave_id, WaveLine.zone,
+                            WaveLine.sku_id],
+            set_={"units": WaveLine.units + stmt.excluded.units,
+                  "location_id": func.coalesce(WaveLine.location_id,
+                                               stmt.excluded.location_id)},
+        ))
+    await session.execute(
+        update(Wave)
+        .where(Wave.wave_id == wave_id)
+        .values(postings=Wave.postings + sign * len(posting_ids),
+                units=Wave.units + units)
+        .execution_options(synchronize_session=False)
+    )
+    return units
+
+
+async def remove_from_open_wave(session: AsyncSession, wave_id: UUID,
+                                posting_id: UUID) -> None:
+    """Take a cancelled posting out of its wave unless already released."""
+    status = await session.scalar(
+        select(Wave.status).where(Wave.wave_id == wave_id).with_for_update())
+    if status == WaveStatus.OPEN:
+        await add_to_wave(session, wave_id, [posting_id], sign=-1)
+
+
+async def release_wave(session: AsyncSession, wave_id: UUID) -> List[int]:
+    """Close the wave to new postings; returns the units of each pick run."""
+    await session.execute(
+        update(Wave)
+        .where(Wave.wave_id == wave_id)
+        .values(status=WaveStatus.RELEASED, released_at=utc_now())
+        .execution_options(synchronize_session=False)
+    )
+    return list(await session.scalars(
+        select(func.sum(WaveLine.units))
+        .where(WaveLine.wave_id == wave_id, WaveLine.units > 0)
+        .group_by(WaveLine.zone)
+    ))
+
+
+def observe_release(postings: int, runs: List[int]) -> None:
+    WAVES_RELEASED.inc()
+    WAVE_POSTINGS.observe(postings)
+    for units in runs:
+        WAVE_UNITS_PER_RUN.observe(units)
+
+
+async def plan_waves(session: AsyncSession, window_seconds: float,
+                     max_postings: int, batch: int) -> dict:
+    """Add up to ``batch`` unassigned postings to the open wave.
+
+    The open wave is released once its window has passed or it holds
+    ``max_postings``; the next posting then opens a new one. Callers must
+    make sure only one planner runs at a time.
+    """
+    released = None
+    wave = (await session.execute(
+        select(Wave.wave_id, Wave.postings,
+               (Wave.closes_at <= utc_now()).label("due"))
+        .where(Wave.status == WaveStatus.OPEN)
+        .with_for_update()
+    )).one_or_none()
+    if wave is not None and (wave.due or wave.postings >= max_postings):
+        released = (wave.postings,
+                    await release_wave(session, wave.wave_id))
+        wave = None
+
+    room = max_postings - (wave.postings if wave is not None else 0)
+    posting_ids = list(await session.scalars(
+        select(Posting.posting_id)
+        .where(Posting.wave_id.is_(None),
+               Posting.posting_status == PostingStatus.IN_ITEM_PICK)
+        .order_by(Posting.created_at)
+        .limit(min(batch, room))
+        .with_for_update(skip_locked=True)
+    ))
+    if not posting_ids:
+        await session.commit()
+        if released:
+            observe_release(*released)
+        return {"released": bool(released), "postings": 0, "units": 0}
+
+    if wave is None:
+        wave_id = await session.scalar(
+            insert(Wave)
+            .values(status=WaveStatus.OPEN,
+                    closes_at=utc_now()
+                    + cast(timedelta(seconds=window_seconds), Interval))
+            .returning(Wave.wave_id)
+        )
+    else:
+        wave_id = wave.wave_id
+
+    await session.execute(
+        update(Posting)
+        .where(in_ids(Posting.posting_id, posting_ids))
+        .values(wave_id=wave_id)
+        .execution_options(synchronize_session=False)
+    )
+    units = await add_to_wave(session, wave_id, posting_ids)
+    await session.commit()
+    if released:
+        observe_release(*released)
+    return {"released": bool(released), "postings": len(posting_ids),
+            "units": units}
+
+
+async def get_wave_info(session: AsyncSession,
+                        wave_id: UUID) -> Optional[dict]:
+    wave = (await session.execute(
+        select(Wave.wave_id, Wave.status, Wave.created_at, Wave.closes_at,
+               Wave.released_at, Wave.postings, Wave.units)
+        .where(Wave.wave_id == wave_id)
+    )).one_or_none()
+    if wave is None:
+        return None
+
+    lines = await session.execute(
+        select(WaveLine.zone, WaveLine.sku_id, WaveLine.units,
+               Location.code, Location.x, Location.y)
+        .outerjoin(Location, Location.location_id == WaveLine.location_id)
+        .where(WaveLine.wave_id == wave_id, WaveLine.units > 0)
+    )
+    zones = defaultdict(list)
+    for line in lines:
+        zones[line.zone].append(Stop(line, line.zone, line.x, line.y))
+
+    runs = []
+    for zone in sorted(zones):
+        route = plan(zones[zone])
+        runs.append({
+            "zone": zone or None,
+            "units": sum(stop.key.units for stop in route),
+            "lines": [
+                {"sku_id": stop.key.sku_id, "units": stop.key.units,
+                 "location": stop.key.code}
+                for stop in route
+            ],
+        })
+
+    return {
+        "wave_id": wave.wave_id,
+        "status": wave.status.value,
+        "created_at": wave.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "closes_at": wave.closes_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "released_at": (wave.released_at.strftime("%Y-%m-%d %H:%M:%S")
+                        if wave.released_at else None),
+        "postings": wave.postings,
+        "units": wave.units,
+        "units_per_run": wave.units / len(runs) if runs else 0,
+        "runs": runs,
+    }
@@ -0,0 +1,122 @@
+"""Record the statements a request sends to Postgres.
+
+Recording is scoped with a context variable, so it follows one request
+(or one test) through ``await``s and SQLAlchemy's greenlets without
+seeing statements of concurrent requests::
+
+    with query_budget(6, "createPostnig"):
+        await client.post("/createPostnig", json=payload)
+
+raises :class:`QueryBudgetExceeded` listing the statements when the call
+ran more than six. With ``N_PLUS_ONE_WARN_THRESHOLD`` set,
+:class:`QueryLogMiddleware` logs every statement shape a single request
+repeated that many times.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\$\d+(?:::[\w\[\]]+)?"
+                               r"(?:\s*,\s*\$\d+(?:::[\w\[\]]+)?)*\s*\)")
+_PLACEHOLDER = re.compile(r"\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """``statement`` with its bound parameters and IN-list lengths erased."""
+    shape = _PLACEHOLDER_LIST.sub("(...)", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class StatementLog:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def shapes(self) -> Counter:
+        return Counter(statement_shape(statement)
+                       for statement in self.statements)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Shapes run at least ``threshold`` times, most repeated first."""
+        return [(shape, count)
+                for shape, count in self.shapes().most_common()
+                if count >= threshold]
+
+    def describe(self) -> str:
+        return "\n".join(f"{count:>5} x {shape}"
+                         for shape, count in self.shapes().most_common())
+
+
+_active_logs: ContextVar[Tuple[StatementLog, ...]] = ContextVar(
+    "active_statement_logs", default=())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    for log in _active_logs.get():
+        log.statements.append(statement)
+
+
+@contextmanager
+def record_statements() -> Iterator[StatementLog]:
+    """Collect the statements run inside the block; recorders nest."""
+    log = StatementLog()
+    token = _active_logs.set(_active_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active_logs.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_statements: int,
+                 label: str = "block") -> Iterator[StatementLog]:
+    with record_statements() as log:
+        yield log
+    if len(log) > max_statements:
+        raise QueryBudgetExceeded(
+            f"{label} ran {len(log)} statements, budget is "
+            f"{max_statements}:\n{log.describe()}")
+
+
+class QueryLogMiddleware:
+    """Dev-mode ASGI middleware warning about N+1 statement patterns."""
+
+    def __init__(self, app, threshold: int):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with record_statements() as log:
+            await self.app(scope, receive, send)
+
+        repeated = log.repeated(self.threshold)
+        if repeated:
+            route = scope.get("route")
+            path = route.path if route is not None else scope["path"]
+            for shape, count in repeated:
+                logger.warning("%s %s ran the same statement %d times "
+                               "(%d statements in total): %s",
+                               scope["method"], path, count, len(log), shape)
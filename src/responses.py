@@ -0,0 +1,76 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Type, Union, get_args, get_origin
+from uuid import UUID
+
+import msgspec
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        # Same as pydantic's JSON output for Decimal fields.
+        return str(value)
+    if isinstance(value, UUID):
+        # asyncpg returns its own UUID subclass, which orjson rejects.
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=default,
+                        option=orjson.OPT_NON_STR_KEYS)
+
+
+def annotation(hint: Any) -> Any:
+    if isinstance(hint, type) and issubclass(hint, BaseModel):
+        return struct_of(hint)
+    origin = get_origin(hint)
+    if origin is None:
+        return hint
+    args = tuple(annotation(arg) for arg in get_args(hint))
+    return Union[args] if origin is Union else origin[args]
+
+
+@lru_cache(maxsize=None)
+def struct_of(model: Type[BaseModel]) -> Type[msgspec.Struct]:
+    """The msgspec Struct with the fields of a pydantic response model."""
+    fields = []
+    for name, field in model.model_fields.items():
+        if field.is_required():
+            fields.append((name, annotation(field.annotation)))
+        else:
+            fields.append((name, annotation(field.annotation),
+                           field.default))
+    return msgspec.defstruct(model.__name__, fields, kw_only=True)
+
+
+def typed(model: Type[BaseModel], content: Any) -> msgspec.Struct:
+    """Validate ``content`` against ``model`` once, in msgspec.
+
+    A missing field or a value of the wrong type raises
+    ``msgspec.ValidationError``; keys the model does not have are dropped.
+    """
+    return msgspec.convert(content, struct_of(model))
+
+
+encoder = msgspec.json.Encoder()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by msgspec or orjson.
+
+    Returning it from a handler skips FastAPI's second pass over the
+    content (validation against ``response_model`` and ``jsonable_encoder``).
+    Handlers pass ``typed(Model, rows)``, the route's ``response_model``
+    built once as a msgspec Struct, which is encoded natively; other
+    content is encoded by orjson. UUIDs, enums and datetimes are encoded
+    natively, Decimals as strings.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, msgspec.Struct):
+            return encoder.encode(content)
+        return dumps(content)
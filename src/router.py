@@ -1,13 +1,26 @@
+from typing import Annotated, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
-from di import SessionDep
-from queries.acceptance import create_acceptance, get_acceptance_info
+from database import pool_stats
+from di import ReadSessionDep, ReadSessionFactoryDep, SessionDep
+from events import stream_events
+from jobs.acceptance_worker import wake as wake_acceptance_workers
+from metrics import metrics_response
+from queries.acceptance import create_acceptance, enqueue_acceptance, get_acceptance_info
 from queries.discount import cancel_discount, create_discount_info, get_discount_info
-from queries.items import get_item_info, get_item_info_by_sku, get_sku_info, markdown_item, move_to_not_found, set_sku_price, toggle_is_hidden
-from queries.posting import cancel_posting, create_posting, get_posting_info
-from queries.tasks import finish_task, get_task_info
+from queries.common import keyed_by_id
+from queries.idempotency import idempotent
+from queries.imports import import_skus
+from queries.items import get_item_info, get_item_info_by_sku, get_items_info, get_sku_info, get_skus_info, list_items_by_sku, markdown_item, move_to_not_found, set_sku_price, stream_items_by_sku, toggle_is_hidden
+from queries.locations import create_locations, plan_pick_route
+from queries.posting import cancel_posting, create_posting, get_posting_info, get_postings_info, list_postings, send_posting, stream_postings
+from queries.stock import get_sku_availability
+from queries.tasks import claim_tasks, finish_task, heartbeat_tasks, get_task_info, get_tasks_info, list_tasks, stream_tasks
+from queries.waves import get_wave_info
+from responses import FastJSONResponse, typed
 from schemas import (Posting, Task, Item, SKU, Discount, CreatePostingRequest,
                      CreatePostingResponse, FinishTaskRequest,
                      CreateDiscountRequest,
@@ -15,27 +28,75 @@ from schemas import (Posting, Task, Item, SKU, Discount, CreatePostingRequest,
                      CreateAcceptanceRequest,
                      CreateAcceptanceResponse,
                      SetSkuPrice, ToggleIsHidden, MarkdownItem, Acceptance,
-                     CancelPostingRequest)
+                     CancelPostingRequest, SendPostingRequest, PoolStats,
+                     BatchRequest,
+                     SkuBatchResponse, ItemBatchResponse, TaskBatchResponse,
+                     PostingBatchResponse, SkuAvailability, ItemPage,
+                     TaskPage, PostingPage, PostingStatusEnum,
+                     TaskStatusEnum, TaskTypeEnum, ClaimTasksRequest,
+                     ClaimTasksResponse, HeartbeatTasksRequest,
+                     HeartbeatTasksResponse, CreateLocationsRequest,
+                     CreateLocationsResponse, PickRoute, Wave,
+                     ImportReport)
 
 
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
+
+Limit = Annotated[int, Query(ge=1, le=1000)]
+OutputFormat = Annotated[Literal["json", "ndjson"], Query(alias="format")]
+InputFormat = Annotated[Optional[Literal["csv", "ndjson"]],
+                        Query(alias="format")]
+IdempotencyKeyHeader = Annotated[
+    Optional[str], Header(alias="Idempotency-Key", max_length=255)]
 
 
 @router.get("/getPosting/{posting_id}", response_model=Posting)
-async def get_posting_info_endpoint(posting_id: UUID, session: SessionDep):
+async def get_posting_info_endpoint(posting_id: UUID,
+                                    session: ReadSessionDep):
     data = await get_posting_info(session, posting_id)
     if not data:
         raise HTTPException(status_code=404, detail="Posting not found")
-    return data
+    return FastJSONResponse(typed(Posting, data))
+
+
+@router.post("/getPostingBatch", response_model=PostingBatchResponse)
+async def get_posting_batch_endpoint(request: BatchRequest,
+                                     session: SessionDep):
+        data = await get_postings_info(session, request.ids)
+        return FastJSONResponse(typed(PostingBatchResponse,
+                                      keyed_by_id(request.ids, data)))
+
+
+@router.get("/listPostings", response_model=PostingPage)
+async def list_postings_endpoint(session: ReadSessionDep,
+                                 session_factory: ReadSessionFactoryDep,
+                                 status: Optional[PostingStatusEnum] = None,
+                                 cursor: Optional[str] = None,
+                                 limit: Limit = 100,
+                                 output_format: OutputFormat = "json"):
+        if output_format == "ndjson":
+            return StreamingResponse(stream_postings(status, cursor,
+                                                     session_factory),
+                                     media_type="application/x-ndjson")
+        page = await list_postings(session, status, cursor, limit)
+        return FastJSONResponse(typed(PostingPage, page))
 
 
 @router.post("/createPostnig", response_model=CreatePostingResponse)
-async def create_posting_endpoint(posting: CreatePostingRequest,
-                                  session: SessionDep):
-        posting_id = await create_posting(session, posting)
+async def create_posting_endpoint(
+        posting: CreatePostingRequest, session: SessionDep,
+        idempotency_key: IdempotencyKeyHeader = None):
+        async def create(remember):
+            async def respond(posting_id):
+                await remember(session, {"id": posting_id})
 
-        return CreatePostingResponse(id=posting_id)
+            posting_id = await create_posting(session, posting, respond)
+            return {"id": posting_id}
+
+        created = await idempotent("createPostnig", idempotency_key,
+                                   posting, create)
+        return FastJSONResponse(typed(CreatePostingResponse, created))
 
 
 @router.post("/cancelPosting")
@@ -45,12 +106,56 @@ async def cancel_posting_endpoint(cancel_posting_request: CancelPostingRequest,
         return {"detail": "Posting canceled successfully"}
 
 
+@router.post("/sendPosting")
+async def send_posting_endpoint(send_posting_request: SendPostingRequest,
+                                session: SessionDep):
+        await send_posting(session, send_posting_request.id)
+        return {"detail": "Posting sent successfully"}
+
+
 @router.get("/getTaskInfo/{task_id}", response_model=Task)
-async def get_task_info_endpoint(task_id: UUID, session: SessionDep):
+async def get_task_info_endpoint(task_id: UUID, session: ReadSessionDep):
         data = await get_task_info(session, task_id)
         if not data:
             raise HTTPException(status_code=404, detail="Task not found")
-        return data
+        return FastJSONResponse(typed(Task, data))
+
+
+@router.post("/getTaskInfoBatch", response_model=TaskBatchResponse)
+async def get_task_info_batch_endpoint(request: BatchRequest,
+                                       session: SessionDep):
+        data = await get_tasks_info(session, request.ids)
+        return FastJSONResponse(typed(TaskBatchResponse,
+                                      keyed_by_id(request.ids, data)))
+
+
+@router.get("/listTasks", response_model=TaskPage)
+async def list_tasks_endpoint(session: ReadSessionDep,
+                              session_factory: ReadSessionFactoryDep,
+                              type: Optional[TaskTypeEnum] = None,
+                              status: Optional[TaskStatusEnum] = None,
+                              cursor: Optional[str] = None,
+                              limit: Limit = 100,
+                              output_format: OutputFormat = "json"):
+        if output_format == "ndjson":
+            return StreamingResponse(stream_tasks(type, status, cursor,
+                                                  session_factory),
+                                     media_type="application/x-ndjson")
+        page = await list_tasks(session, type, status, cursor, limit)
+        return FastJSONResponse(typed(TaskPage, page))
+
+
+@router.post("/claimTasks", response_model=ClaimTasksResponse)
+async def claim_tasks_endpoint(claim: ClaimTasksRequest, session: SessionDep):
+        tasks = await claim_tasks(session, claim)
+        return FastJSONResponse(typed(ClaimTasksResponse, {"tasks": tasks}))
+
+
+@router.post("/heartbeatTasks", response_model=HeartbeatTasksResponse)
+async def heartbeat_tasks_endpoint(heartbeat: HeartbeatTasksRequest,
+                                   session: SessionDep):
+        renewed = await heartbeat_tasks(session, heartbeat)
+        return FastJSONResponse(typed(HeartbeatTasksResponse, renewed))
 
 
 @router.post("/finishTask")
@@ -60,20 +165,52 @@ async def finish_task_endpoint(task: FinishTaskRequest,
         return {"detail": "Task updated successfully"}
 
 
+@router.post("/planPickRoute", response_model=PickRoute)
+async def plan_pick_route_endpoint(request: BatchRequest,
+                                   session: SessionDep):
+        route = await plan_pick_route(session, request.ids)
+        return FastJSONResponse(typed(PickRoute, route))
+
+
+@router.get("/getWave/{wave_id}", response_model=Wave)
+async def get_wave_endpoint(wave_id: UUID, session: ReadSessionDep):
+        data = await get_wave_info(session, wave_id)
+        if not data:
+            raise HTTPException(status_code=404, detail="Wave not found")
+        return FastJSONResponse(typed(Wave, data))
+
+
+@router.post("/createLocations", response_model=CreateLocationsResponse)
+async def create_locations_endpoint(request: CreateLocationsRequest,
+                                    session: SessionDep):
+        locations = await create_locations(session, request)
+        return FastJSONResponse(typed(CreateLocationsResponse, locations))
+
+
 @router.get("/getDiscount/{discount_id}", response_model=Discount)
-async def get_discount_info_endpoint(discount_id: UUID, session: SessionDep):
+async def get_discount_info_endpoint(discount_id: UUID,
+                                     session: ReadSessionDep):
         data = await get_discount_info(session, discount_id)
         if not data:
             raise HTTPException(status_code=404, detail="Task not found")
-        return data
+        return FastJSONResponse(typed(Discount, data))
 
 
 @router.post("/createDiscount", response_model=CreateDiscountResponse)
-async def create_discount_info_endpoint(discount: CreateDiscountRequest,
-                                        session: SessionDep):
-        discount_id = await create_discount_info(session, discount)
+async def create_discount_info_endpoint(
+        discount: CreateDiscountRequest, session: SessionDep,
+        idempotency_key: IdempotencyKeyHeader = None):
+        async def create(remember):
+            async def respond(discount_id):
+                await remember(session, {"id": discount_id})
+
+            discount_id = await create_discount_info(session, discount,
+                                                     respond)
+            return {"id": discount_id}
 
-        return CreateDiscountResponse(id=discount_id)
+        created = await idempotent("createDiscount", idempotency_key,
+                                   discount, create)
+        return FastJSONResponse(typed(CreateDiscountResponse, created))
 
 
 @router.post("/cancelDiscount")
@@ -82,20 +219,58 @@ async def cancel_discount_endpoint(id: UUID, session: SessionDep):
         return {"detail": "Discount canceled successfully"}
 
 
+@router.post("/importSkus", response_model=ImportReport)
+async def import_skus_endpoint(request: Request, session: SessionDep,
+                               input_format: InputFormat = None):
+        if input_format is None:
+            content_type = request.headers.get("content-type", "")
+            input_format = "ndjson" if "json" in content_type else "csv"
+        report = await import_skus(session, request.stream(), input_format)
+        return FastJSONResponse(typed(ImportReport, report))
+
+
 @router.get("/geItemInfo/{item_id}", response_model=Item)
-async def get_item_info_endpoint(item_id: UUID, session: SessionDep):
+async def get_item_info_endpoint(item_id: UUID, session: ReadSessionDep):
         data = await get_item_info(session, item_id)
         if not data:
             raise HTTPException(status_code=404, detail="Item not found")
-        return data
+        return FastJSONResponse(typed(Item, data))
+
 
+@router.post("/getItemInfoBatch", response_model=ItemBatchResponse)
+async def get_item_info_batch_endpoint(request: BatchRequest,
+                                       session: SessionDep):
+        data = await get_items_info(session, request.ids)
+        return FastJSONResponse(typed(ItemBatchResponse,
+                                      keyed_by_id(request.ids, data)))
 
+
+# The two read-through cached routes stay on the primary: a lagging
+# replica could refill the cache with a row older than the write that
+# just invalidated it.
 @router.get("/getSkuInfo/{sku_id}", response_model=SKU)
 async def get_sku_info_endpoint(sku_id: UUID, session: SessionDep):
         data = await get_sku_info(session, sku_id)
         if not data:
             raise HTTPException(status_code=404, detail="SKU not found")
-        return data
+        return FastJSONResponse(typed(SKU, data))
+
+
+@router.post("/getSkuInfoBatch", response_model=SkuBatchResponse)
+async def get_sku_info_batch_endpoint(request: BatchRequest,
+                                      session: SessionDep):
+        data = await get_skus_info(session, request.ids)
+        return FastJSONResponse(typed(SkuBatchResponse,
+                                      keyed_by_id(request.ids, data)))
+
+
+@router.get("/getSkuAvailability/{sku_id}", response_model=SkuAvailability)
+async def get_sku_availability_endpoint(sku_id: UUID,
+                                        session: ReadSessionDep):
+        data = await get_sku_availability(session, sku_id)
+        if not data:
+            raise HTTPException(status_code=404, detail="SKU not found")
+        return FastJSONResponse(typed(SkuAvailability, data))
 
 
 @router.get("/getItemInfoBySkuId/{sku_id}", response_model=SkuItemsResponse)
@@ -103,7 +278,21 @@ async def get_item_info_by_sku_endpoint(sku_id: UUID, session: SessionDep):
         data = await get_item_info_by_sku(session, sku_id)
         if not data:
             raise HTTPException(status_code=404, detail="SKU not found")
-        return data
+        return FastJSONResponse(typed(SkuItemsResponse, data))
+
+
+@router.get("/listItemsBySku/{sku_id}", response_model=ItemPage)
+async def list_items_by_sku_endpoint(sku_id: UUID, session: ReadSessionDep,
+                                     session_factory: ReadSessionFactoryDep,
+                                     cursor: Optional[str] = None,
+                                     limit: Limit = 100,
+                                     output_format: OutputFormat = "json"):
+        if output_format == "ndjson":
+            return StreamingResponse(stream_items_by_sku(sku_id, cursor,
+                                                         session_factory),
+                                     media_type="application/x-ndjson")
+        page = await list_items_by_sku(session, sku_id, cursor, limit)
+        return FastJSONResponse(typed(ItemPage, page))
 
 
 @router.post("/markdownItem")
@@ -133,17 +322,59 @@ async def move_to_not_found_endpoint(id: UUID, session: SessionDep):
 
 @router.get("/getAcceptance/{acceptance_id}", response_model=Acceptance)
 async def get_acceptance_info_endpoint(acceptance_id: UUID,
-                                       session: SessionDep) -> Acceptance:
+                                       session: ReadSessionDep) -> Acceptance:
         data = await get_acceptance_info(session, acceptance_id)
         if not data:
             raise HTTPException(status_code=404, detail="Acceptance not found")
-        return data
+        return FastJSONResponse(typed(Acceptance, data))
 
 
 @router.post("/createAcceptance", response_model=CreateAcceptanceResponse)
-async def create_acceptance_endpoint(acceptance: CreateAcceptanceRequest,
-                                     session: SessionDep):
-
-        acceptance_id = await create_acceptance(session, acceptance)
-
-        return CreateAcceptanceResponse(id=acceptance_id)
+async def create_acceptance_endpoint(
+        acceptance: CreateAcceptanceRequest, session: SessionDep,
+        mode: Literal["sync", "async"] = "sync",
+        idempotency_key: IdempotencyKeyHeader = None):
+        status = "pending" if mode == "async" else "done"
+
+        async def create(remember):
+            async def respond(acceptance_id):
+                await remember(session, {"id": acceptance_id,
+                                         "status": status})
+
+            if mode == "async":
+                acceptance_id = await enqueue_acceptance(
+                    session, acceptance, respond)
+                wake_acceptance_workers()
+            else:
+                acceptance_id = await create_acceptance(
+                    session, acceptance, respond)
+            return {"id": acceptance_id, "status": status}
+
+        created = await idempotent("createAcceptance", idempotency_key,
+                                   acceptance, create, params={"mode": mode})
+        return FastJSONResponse(typed(CreateAcceptanceResponse, created))
+
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def events_endpoint(
+        posting_id: Optional[UUID] = None,
+        task_id: Optional[UUID] = None,
+        last_event_id: Annotated[
+            Optional[int], Header(alias="Last-Event-ID")] = None):
+        return StreamingResponse(
+            stream_events(posting_id, task_id, last_event_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache",
+                     "X-Accel-Buffering": "no"})
+
+
+@router.get("/poolStats", response_model=PoolStats)
+async def pool_stats_endpoint():
+        return pool_stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+        body, content_type = metrics_response()
+        return Response(content=body, media_type=content_type)
@@ -0,0 +1,166 @@
+"""Order pick stops into a short walk through the warehouse.
+
+Distances are rectilinear (``|dx| + |dy|``), which is how a picker moves
+between aisles. A route starts and ends at the depot (the packing
+station):
+
+1. zone batching: zones are visited one after another, nearest zone
+   centroid first, so a picker never leaves a zone with work left in it;
+2. nearest neighbour inside each zone, starting where the previous zone
+   ended;
+3. windowed 2-opt over the whole route until no move improves it or the
+   time budget runs out. A stop is only swapped with the next ``window``
+   stops, so a pass is linear in the number of stops rather than
+   quadratic; nearest neighbour already leaves the stops that belong
+   together close to each other in the route.
+
+Steps 1 and 2 take milliseconds for 1 000 stops; 2-opt then uses what
+is left of the budget. Stops without a location go to the end of the
+route in their original order.
+"""
+import time
+from collections import defaultdict
+from typing import (Any, Dict, Hashable, List, NamedTuple, Optional,
+                    Sequence, Tuple)
+
+
+Point = Tuple[float, float]
+
+
+class Stop(NamedTuple):
+    key: Any
+    zone: Optional[Hashable]
+    x: Optional[float]
+    y: Optional[float]
+
+
+def distance(a: Point, b: Point) -> float:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def route_length(stops: Sequence[Stop], depot: Point = (0.0, 0.0)) -> float:
+    """Length of the closed walk depot → stops → depot, located stops only."""
+    length, position = 0.0, depot
+    for stop in stops:
+        if stop.x is None:
+            continue
+        length += distance(position, (stop.x, stop.y))
+        position = (stop.x, stop.y)
+    return length + distance(position, depot)
+
+
+def nearest_neighbour(stops: List[Stop], start: Point) -> List[Stop]:
+    """Greedy walk to the closest remaining stop.
+
+    Stops are bucketed in a grid of about one stop per cell, and the
+    search widens ring by ring around the current cell only until no
+    closer stop can exist, so a step costs a few cells, not every stop.
+    """
+    if not stops:
+        return []
+    min_x = min(stop.x for stop in stops)
+    min_y = min(stop.y for stop in stops)
+    width = max(stop.x for stop in stops) - min_x
+    height = max(stop.y for stop in stops) - min_y
+    cell = max((width * height / len(stops)) ** 0.5,
+               max(width, height) / len(stops), 1e-9)
+
+    def cell_of(x: float, y: float) -> Tuple[int, int]:
+        return int((x - min_x) // cell), int((y - min_y) // cell)
+
+    grid: Dict[Tuple[int, int], List[Stop]] = defaultdict(list)
+    for stop in stops:
+        grid[cell_of(stop.x, stop.y)].append(stop)
+    cols, rows = cell_of(min_x + width, min_y + height)
+
+    route, position = [], start
+    while grid:
+        cx, cy = cell_of(*position)
+        # Rings are clipped to the grid, and those short of it skipped:
+        # the position can lie far outside, e.g. at the depot.
+        first_ring = max(-cx, cx - cols, -cy, cy - rows, 0)
+        best, best_distance = None, float("inf")
+        for ring in range(first_ring, first_ring + max(cols, rows) + 2):
+            for gx in range(max(cx - ring, 0), min(cx + ring, cols) + 1):
+                if abs(gx - cx) == ring:
+                    column = range(max(cy - ring, 0), min(cy + ring, rows) + 1)
+                else:
+                    column = [gy for gy in (cy - ring, cy + ring)
+                              if 0 <= gy <= rows]
+                for gy in column:
+                    for stop in grid.get((gx, gy), ()):
+                        d = distance(position, (stop.x, stop.y))
+                        if d < best_distance:
+                            best, best_distance = stop, d
+            if best is not None and best_distance <= ring * cell:
+                break
+        key = cell_of(best.x, best.y)
+        grid[key].remove(best)
+        if not grid[key]:
+            del grid[key]
+        route.append(best)
+        position = (best.x, best.y)
+    return route
+
+
+def zone_batches(stops: List[Stop], depot: Point) -> List[Stop]:
+    zones: Dict[Hashable, List[Stop]] = defaultdict(list)
+    for stop in stops:
+        zones[stop.zone].append(stop)
+
+    centroids = {
+        zone: (sum(stop.x for stop in members) / len(members),
+               sum(stop.y for stop in members) / len(members))
+        for zone, members in zones.items()
+    }
+    route, position = [], depot
+    while centroids:
+        zone = min(centroids, key=lambda z: distance(position, centroids[z]))
+        del centroids[zone]
+        route += nearest_neighbour(zones[zone], position)
+        position = (route[-1].x, route[-1].y)
+    return route
+
+
+def two_opt(route: List[Stop], depot: Point, deadline: float,
+            window: int) -> List[Stop]:
+    """Reverse segments of ``route`` while that shortens it.
+
+    A segment never spans two zones, so the zone batches stay intact.
+    """
+    points = [depot] + [(stop.x, stop.y) for stop in route] + [depot]
+    zones = [None] + [stop.zone for stop in route] + [None]
+    order = list(range(len(route)))
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, len(points) - 2):
+            a, b = points[i - 1], points[i]
+            ab = distance(a, b)
+            for j in range(i + 1, min(i + window, len(points) - 1)):
+                if zones[j] != zones[i]:
+                    break
+                c, d = points[j], points[j + 1]
+                delta = (distance(a, c) + distance(b, d)
+                         - ab - distance(c, d))
+                if delta < -1e-9:
+                    points[i:j + 1] = points[i:j + 1][::-1]
+                    order[i - 1:j] = order[i - 1:j][::-1]
+                    b = points[i]
+                    ab = distance(a, b)
+                    improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return [route[k] for k in order]
+
+
+def plan_route(stops: Sequence[Stop], depot: Point = (0.0, 0.0),
+               budget: float = 0.02, window: int = 25) -> List[Stop]:
+    """``stops`` in walking order; improvement stops after ``budget`` s."""
+    deadline = time.perf_counter() + budget
+    located = [stop for stop in stops if stop.x is not None]
+    unlocated = [stop for stop in stops if stop.x is None]
+    route = zone_batches(located, depot)
+    if budget > 0 and len(route) > 3:
+        route = two_opt(route, depot, deadline, window)
+    return route + unlocated
@@ -1,10 +1,11 @@
+from datetime import datetime
 from decimal import Decimal
 from uuid import UUID
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional
 
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class StockStateEnum(str, Enum):
@@ -30,9 +31,22 @@ class PostingStatusEnum(str, Enum):
     CANCELED = "canceled"
 
 
+class AcceptanceStatusEnum(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class WaveStatusEnum(str, Enum):
+    OPEN = "open"
+    RELEASED = "released"
+
+
 class DiscountStatus (str, Enum):
     active = "active"
     finished = "finished"
+    scheduled = "scheduled"
 
 
 class TaskStatusInfo(BaseModel):
@@ -60,7 +74,7 @@ class Task(BaseModel):
     id: UUID
     type: TaskTypeEnum
     status: TaskStatusEnum
-    posting_id: UUID
+    posting_id: Optional[UUID] = None
     stock_state: StockStateEnum
     stock_item_id: UUID
 
@@ -79,6 +93,7 @@ class Posting(BaseModel):
     ordered_goods: List["OrderedGood"]
     not_found: List[UUID]
     task_ids: List["PostingTask"]
+    wave_id: Optional[UUID] = None
 
 
 class Discount(BaseModel):
@@ -87,17 +102,26 @@ class Discount(BaseModel):
     created_at: str
     percentage: int = 10
     sku_ids: List[UUID]
+    starts_at: Optional[str] = None
+    ends_at: Optional[str] = None
 
 
 class ItemToAccept(BaseModel):
     sku_id: UUID
     stock: StockStateEnum
     count: int
+    location_id: Optional[UUID] = None
 
 
 class Acceptance(BaseModel):
     id: UUID
     created_at: str
+    status: AcceptanceStatusEnum
+    units_total: int
+    units_done: int
+    progress: float
+    attempts: int
+    last_error: Optional[str] = None
     accepted: List[ItemToAccept]
     task_ids: List[TaskStatusInfo]
 
@@ -135,6 +159,10 @@ class CancelPostingRequest(BaseModel):
     status: PostingStatusEnum
 
 
+class SendPostingRequest(BaseModel):
+    id: UUID
+
+
 class FinishTaskRequest(BaseModel):
     id: UUID
     status: TaskStatusEnum
@@ -143,6 +171,8 @@ class FinishTaskRequest(BaseModel):
 class CreateDiscountRequest(BaseModel):
     sku_ids: List[UUID] = []
     percentage: int = 10
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
 
 
 class CreateDiscountResponse(BaseModel):
@@ -174,3 +204,171 @@ class MoveToNotFound(BaseModel):
 
 class CreateAcceptanceResponse(BaseModel):
     id: UUID
+    status: AcceptanceStatusEnum = AcceptanceStatusEnum.DONE
+
+
+class PoolStats(BaseModel):
+    pid: int
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checkouts: int
+    waits: int
+    wait_seconds: float
+    timeouts: int
+
+
+class BatchRequest(BaseModel):
+    ids: List[UUID] = Field(max_length=1000)
+
+
+class SkuBatchResponse(BaseModel):
+    results: Dict[UUID, Optional[SKU]]
+    not_found: List[UUID]
+
+
+class ItemBatchResponse(BaseModel):
+    results: Dict[UUID, Optional[Item]]
+    not_found: List[UUID]
+
+
+class TaskBatchResponse(BaseModel):
+    results: Dict[UUID, Optional[Task]]
+    not_found: List[UUID]
+
+
+class PostingBatchResponse(BaseModel):
+    results: Dict[UUID, Optional[Posting]]
+    not_found: List[UUID]
+
+
+class SkuAvailability(BaseModel):
+    sku_id: UUID
+    valid_free: int
+    valid_reserved: int
+    defect_free: int
+    defect_reserved: int
+    not_found_free: int
+    not_found_reserved: int
+
+
+class ItemPage(BaseModel):
+    items: List[ItemResponse]
+    next_cursor: Optional[str] = None
+
+
+class TaskPage(BaseModel):
+    items: List[Task]
+    next_cursor: Optional[str] = None
+
+
+class PostingSummary(BaseModel):
+    posting_id: UUID
+    posting_status: PostingStatusEnum
+    created_at: str
+    cost: Decimal
+
+
+class PostingPage(BaseModel):
+    items: List[PostingSummary]
+    next_cursor: Optional[str] = None
+
+
+class ClaimTasksRequest(BaseModel):
+    worker_id: str
+    limit: int = Field(default=10, ge=1, le=100)
+    lease_seconds: int = Field(default=300, ge=10, le=3600)
+    type: Optional[TaskTypeEnum] = None
+    group_by_posting: bool = False
+
+
+class ClaimedTask(BaseModel):
+    id: UUID
+    type: TaskTypeEnum
+    posting_id: Optional[UUID] = None
+    stock_item_id: UUID
+    lease_expires_at: datetime
+
+
+class ClaimTasksResponse(BaseModel):
+    tasks: List[ClaimedTask]
+
+
+class HeartbeatTasksRequest(BaseModel):
+    worker_id: str
+    task_ids: List[UUID] = Field(max_length=1000)
+    lease_seconds: int = Field(default=300, ge=10, le=3600)
+
+
+class HeartbeatTasksResponse(BaseModel):
+    renewed: List[UUID]
+    lost: List[UUID]
+
+
+class LocationIn(BaseModel):
+    code: str
+    zone: str
+    x: float
+    y: float
+
+
+class CreateLocationsRequest(BaseModel):
+    locations: List[LocationIn] = Field(max_length=10_000)
+
+
+class CreateLocationsResponse(BaseModel):
+    ids: Dict[str, UUID]
+
+
+class PickStop(BaseModel):
+    task_id: UUID
+    posting_id: UUID
+    item_id: UUID
+    sku_id: UUID
+    location: Optional[str] = None
+    zone: Optional[str] = None
+
+
+class PickRoute(BaseModel):
+    stops: List[PickStop]
+    length: float
+    planning_ms: float
+
+
+class WaveLine(BaseModel):
+    sku_id: UUID
+    units: int
+    location: Optional[str] = None
+
+
+class PickRun(BaseModel):
+    zone: Optional[str] = None
+    units: int
+    lines: List[WaveLine]
+
+
+class Wave(BaseModel):
+    wave_id: UUID
+    status: WaveStatusEnum
+    created_at: str
+    closes_at: str
+    released_at: Optional[str] = None
+    postings: int
+    units: int
+    units_per_run: float
+    runs: List[PickRun]
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ImportReport(BaseModel):
+    rows: int
+    updated: int
+    repriced: int
+    error_count: int
+    errors: List[ImportRowError]
@@ -0,0 +1,61 @@
+"""Shared fixtures.
+
+Tests taking ``engine`` run against the database configured by the
+``DB_*`` settings, which must be migrated (``alembic upgrade head``);
+they are skipped when no server answers there. Any other error, from
+the settings or the database itself, fails them.
+"""
+from uuid import uuid4
+
+import httpx
+import pytest
+from asyncpg.exceptions import CannotConnectNowError
+from sqlalchemy.future import select
+
+
+@pytest.fixture
+async def engine():
+    from database import async_engine
+
+    try:
+        async with async_engine.connect():
+            pass
+    except (OSError, CannotConnectNowError) as error:
+        pytest.skip(f"database unavailable: {error}")
+    yield async_engine
+    # Pooled connections belong to this test's event loop.
+    await async_engine.dispose()
+
+
+@pytest.fixture
+async def client(engine):
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def stocked_skus(engine):
+    async def stocked_skus(count: int, units: int) -> dict:
+        """``count`` new SKUs with ``units`` free valid items each."""
+        from database import async_session_factory
+        from models import Item
+        from queries.acceptance import create_acceptance
+        from schemas import CreateAcceptanceRequest
+
+        sku_ids = [uuid4() for _ in range(count)]
+        async with async_session_factory() as session:
+            await create_acceptance(session, CreateAcceptanceRequest(
+                items_to_accept=[{"sku_id": sku_id, "stock": "valid",
+                                  "count": units} for sku_id in sku_ids]))
+            items = await session.execute(
+                select(Item.sku_id, Item.item_id)
+                .where(Item.sku_id.in_(sku_ids)))
+        stock = {sku_id: [] for sku_id in sku_ids}
+        for sku_id, item_id in items:
+            stock[sku_id].append(item_id)
+        return stock
+
+    return stocked_skus
@@ -0,0 +1,46 @@
+import asyncio
+import random
+from uuid import uuid4
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from models import Item, Sku
+from queries.acceptance import create_acceptance
+from schemas import CreateAcceptanceRequest
+
+
+async def accept(sku_ids: list, units: int):
+    from database import async_session_factory
+
+    lines = [{"sku_id": sku_id, "stock": "valid", "count": units}
+             for sku_id in sku_ids]
+    random.shuffle(lines)
+    async with async_session_factory() as session:
+        return await create_acceptance(
+            session, CreateAcceptanceRequest(items_to_accept=lines))
+
+
+async def test_concurrent_acceptances_of_the_same_new_skus(engine):
+    from database import async_session_factory
+
+    sku_ids = [uuid4() for _ in range(20)]
+    await asyncio.gather(*(accept(sku_ids, units=2) for _ in range(6)))
+
+    async with async_session_factory() as session:
+        assert await session.scalar(
+            select(func.count()).where(Sku.sku_id.in_(sku_ids))) == 20
+        assert await session.scalar(
+            select(func.count()).where(Item.sku_id.in_(sku_ids))) == 240
+
+
+async def test_acceptance_keeps_known_skus(engine):
+    from database import async_session_factory
+
+    (sku_id,) = sku_ids = [uuid4()]
+    await accept(sku_ids, units=3)
+    await accept(sku_ids, units=5)
+
+    async with async_session_factory() as session:
+        sku = await session.get(Sku, sku_id)
+        assert sku.count == 3
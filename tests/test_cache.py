@@ -0,0 +1,18 @@
+import pytest
+
+from cache import check_workers
+from config import settings
+
+
+@pytest.mark.parametrize("backend, workers", [
+    ("memory", 1), ("redis", 4), ("none", 4),
+])
+def test_backends_allowed(monkeypatch, backend, workers):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", backend)
+    check_workers(workers)
+
+
+def test_memory_backend_refused_with_several_workers(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_BACKEND", "memory")
+    with pytest.raises(RuntimeError, match="CACHE_BACKEND=redis"):
+        check_workers(4)
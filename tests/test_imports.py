@@ -0,0 +1,84 @@
+import asyncio
+from decimal import Decimal
+from uuid import uuid4
+
+import orjson
+from sqlalchemy import insert, text
+
+from models import DiscountStatus, Discounts, Sku, discount_sku_association
+from queries.imports import import_skus
+
+
+async def new_skus(count: int) -> list:
+    from database import async_session_factory
+
+    sku_ids = [uuid4() for _ in range(count)]
+    async with async_session_factory() as session:
+        await session.execute(insert(Sku), [
+            {"sku_id": sku_id, "base_price": Decimal("100.00"),
+             "actual_price": Decimal("100.00"), "count": 0,
+             "is_hidden": False}
+            for sku_id in sku_ids])
+        await session.commit()
+    return sku_ids
+
+
+async def upload(sku_ids: list, price: str):
+    yield b"".join(orjson.dumps({"sku_id": str(sku_id), "base_price": price})
+                   + b"\n" for sku_id in sku_ids)
+
+
+async def test_import_does_not_wait_on_discount_links(engine):
+    from database import async_session_factory
+
+    sku_ids = await new_skus(20)
+    async with async_session_factory() as linking, \
+            async_session_factory() as importing:
+        # The foreign keys of the links hold FOR KEY SHARE on the SKUs
+        # until the discount commits.
+        discount_id = uuid4()
+        await linking.execute(insert(Discounts).values(
+            discount_id=discount_id, status=DiscountStatus.active,
+            percentage=10))
+        await linking.execute(insert(discount_sku_association), [
+            {"discount_id": discount_id, "sku_id": sku_id}
+            for sku_id in reversed(sku_ids)])
+
+        await importing.execute(text("SET LOCAL lock_timeout = '2s'"))
+        report = await import_skus(importing, upload(sku_ids, "90.00"),
+                                   "ndjson")
+        await linking.rollback()
+    assert report["updated"] == len(sku_ids)
+    assert report["error_count"] == 0
+
+
+async def test_import_and_discount_linking_the_same_skus(engine):
+    from database import async_session_factory
+
+    sku_ids = sorted(await new_skus(20))
+    discount_id = uuid4()
+
+    async def link(session, sku_ids):
+        await session.execute(insert(discount_sku_association), [
+            {"discount_id": discount_id, "sku_id": sku_id}
+            for sku_id in sku_ids])
+
+    async def run_import():
+        async with async_session_factory() as session:
+            return await import_skus(session, upload(sku_ids, "90.00"),
+                                     "ndjson")
+
+    async with async_session_factory() as linking:
+        await linking.execute(insert(Discounts).values(
+            discount_id=discount_id, status=DiscountStatus.active,
+            percentage=10))
+        # The discount links its SKUs out of the order the import locks
+        # them in, and the import starts in between.
+        await link(linking, sku_ids[10:])
+        imported = asyncio.create_task(run_import())
+        await asyncio.sleep(0.5)
+        await link(linking, sku_ids[:10])
+        await linking.commit()
+        report = await imported
+    assert report["updated"] == len(sku_ids)
+
@@ -0,0 +1,47 @@
+"""Statement budgets of the write routes.
+
+The budgets guard the set-wise queries: the number of statements a route
+runs must not grow with the size of the request.
+"""
+from uuid import uuid4
+
+import pytest
+
+from query_log import query_budget
+
+
+CREATE_POSTING_BUDGET = 6
+
+
+def posting_request(stock: dict) -> dict:
+    return {"ordered_goods": [
+        {"sku": str(sku_id), "from_valid_ids": [str(item_ids.pop())],
+         "from_defect_ids": []}
+        for sku_id, item_ids in stock.items()
+    ]}
+
+
+@pytest.mark.parametrize("lines", [1, 25])
+async def test_create_posting_statement_budget(client, stocked_skus,
+                                               lines):
+    stock = await stocked_skus(lines, units=2)
+    with query_budget(CREATE_POSTING_BUDGET,
+                      f"createPostnig with {lines} lines") as log:
+        response = await client.post("/createPostnig",
+                                     json=posting_request(stock))
+    assert response.status_code == 200, response.text
+    assert len(log) <= CREATE_POSTING_BUDGET, log.describe()
+
+
+async def test_create_posting_budget_with_substitutes(client,
+                                                      stocked_skus):
+    stock = await stocked_skus(25, units=2)
+    request = posting_request(stock)
+    for line in request["ordered_goods"]:
+        line["from_valid_ids"] = [str(uuid4())]
+    with query_budget(CREATE_POSTING_BUDGET + 1,
+                      "createPostnig replacing every item") as log:
+        response = await client.post("/createPostnig", json=request)
+    assert response.status_code == 200, response.text
+    assert response.json()["id"]
+    assert len(log) <= CREATE_POSTING_BUDGET + 1, log.describe()
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from query_log import (QueryBudgetExceeded, query_budget, record_statements,
+                       statement_shape)
+
+
+def test_statement_shape_erases_parameters_and_list_lengths():
+    assert statement_shape(
+        "SELECT item.item_id FROM item\n  WHERE item.item_id IN "
+        "($1::UUID, $2::UUID, $3::UUID) AND item.stock = $4"
+    ) == "SELECT item.item_id FROM item WHERE item.item_id IN (...) " \
+         "AND item.stock = ?"
+    assert statement_shape("SELECT x FROM t WHERE id IN ($1)") == \
+        statement_shape("SELECT x FROM t WHERE id IN ($1, $2, $3, $4)")
+
+
+async def run(engine, count: int, pause: float = 0) -> None:
+    async with engine.connect() as conn:
+        for i in range(count):
+            await conn.execute(text("SELECT :i"), {"i": str(i)})
+            await asyncio.sleep(pause)
+
+
+async def test_records_the_statements_of_the_block(engine):
+    await run(engine, 1)
+    with record_statements() as log:
+        await run(engine, 3)
+    await run(engine, 2)
+    assert len(log) == 3
+    assert log.shapes() == {"SELECT ?": 3}
+
+
+async def test_recorders_nest(engine):
+    with record_statements() as outer:
+        await run(engine, 1)
+        with record_statements() as inner:
+            await run(engine, 2)
+    assert len(inner) == 2
+    assert len(outer) == 3
+
+
+async def test_concurrent_tasks_record_only_their_own_statements(engine):
+    async def recorded(count: int):
+        with record_statements() as log:
+            await run(engine, count, pause=0.001)
+        return log
+
+    with record_statements() as everything:
+        logs = await asyncio.gather(*(recorded(count)
+                                      for count in (1, 4, 7)))
+    assert [len(log) for log in logs] == [1, 4, 7]
+    assert len(everything) == 12
+
+
+async def test_budget_lists_the_statement_shapes_when_exceeded(engine):
+    with pytest.raises(QueryBudgetExceeded) as exceeded:
+        with query_budget(2, "three selects"):
+            await run(engine, 3)
+    message = str(exceeded.value)
+    assert "three selects ran 3 statements, budget is 2" in message
+    assert "3 x SELECT ?" in message
+
+
+async def test_budget_within_limit_passes(engine):
+    with query_budget(3) as log:
+        await run(engine, 3)
+    assert len(log) == 3
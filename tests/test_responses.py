@@ -0,0 +1,71 @@
+from datetime import datetime
+from decimal import Decimal
+from uuid import uuid4
+
+import msgspec
+import orjson
+import pytest
+from pydantic import BaseModel
+
+from responses import FastJSONResponse, struct_of, typed
+from schemas import ClaimTasksResponse, Posting, SkuBatchResponse
+
+
+def posting(**changes) -> dict:
+    data = {
+        "posting_id": uuid4(),
+        "posting_status": "in_item_pick",
+        "created_at": "2026-10-18 09:30:00",
+        "cost": Decimal("1234.50"),
+        "ordered_goods": [{"sku": uuid4(), "from_valid_ids": [uuid4()],
+                           "from_defect_ids": []}],
+        "not_found": [],
+        "task_ids": [{"id": uuid4(), "type": "picking",
+                      "status": "in_work"}],
+    }
+    data.update(changes)
+    return data
+
+
+def render(model, data) -> dict:
+    return orjson.loads(FastJSONResponse(typed(model, data)).body)
+
+
+@pytest.mark.parametrize("model, data", [
+    (Posting, posting()),
+    (Posting, posting(wave_id=uuid4())),
+    (SkuBatchResponse, {"results": {uuid4(): None}, "not_found": []}),
+    (ClaimTasksResponse, {"tasks": [{
+        "id": uuid4(), "type": "picking", "stock_item_id": uuid4(),
+        "lease_expires_at": datetime(2026, 10, 18, 9, 30, 0, 125000)}]}),
+])
+def test_renders_like_the_response_model(model, data):
+    assert render(model, data) == orjson.loads(
+        model.model_validate(data).model_dump_json())
+
+
+def test_drops_keys_the_model_does_not_have():
+    assert "internal" not in render(Posting, posting(internal=1))
+
+
+@pytest.mark.parametrize("data", [
+    {key: value for key, value in posting().items() if key != "cost"},
+    posting(posting_status="in_transit"),
+    posting(task_ids=[{"id": "not a uuid", "type": "picking",
+                       "status": "in_work"}]),
+])
+def test_rejects_content_unlike_the_model(data):
+    with pytest.raises(msgspec.ValidationError):
+        typed(Posting, data)
+
+
+def test_every_routed_response_model_has_a_struct():
+    from router import router
+
+    models = [route.response_model for route in router.routes
+              if isinstance(getattr(route, "response_model", None), type)
+              and issubclass(route.response_model, BaseModel)]
+    assert Posting in models
+    for model in models:
+        assert struct_of(model).__struct_fields__ == tuple(
+            model.model_fields)
@@ -0,0 +1,90 @@
+import random
+import time
+
+import pytest
+
+from routing import Stop, nearest_neighbour, plan_route, route_length, two_opt
+
+
+DEPOT = (0.0, 0.0)
+
+
+def random_stops(count: int, zones: str = "ABC", unlocated: int = 0,
+                 seed: int = 0):
+    rng = random.Random(seed)
+    stops = [Stop(i, rng.choice(zones), rng.uniform(0, 100),
+                  rng.uniform(0, 50))
+             for i in range(count)]
+    stops += [Stop(count + i, None, None, None) for i in range(unlocated)]
+    rng.shuffle(stops)
+    return stops
+
+
+def zone_runs(route):
+    return [stop.zone for i, stop in enumerate(route)
+            if i == 0 or route[i - 1].zone != stop.zone]
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 4, 50, 300])
+def test_plan_route_is_a_permutation(count):
+    stops = random_stops(count, unlocated=count // 5, seed=count)
+    route = plan_route(stops, DEPOT)
+    assert sorted(stop.key for stop in route) == sorted(
+        stop.key for stop in stops)
+
+
+def test_unlocated_stops_go_last_in_their_order():
+    stops = random_stops(40, unlocated=7, seed=1)
+    route = plan_route(stops, DEPOT)
+    unlocated = [stop for stop in stops if stop.x is None]
+    assert route[-len(unlocated):] == unlocated
+    assert all(stop.x is not None for stop in route[:-len(unlocated)])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_each_zone_is_walked_in_one_go(seed):
+    route = plan_route(random_stops(120, zones="ABCD", seed=seed), DEPOT,
+                       budget=0.05)
+    runs = zone_runs(route)
+    assert len(runs) == len(set(runs))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_two_opt_never_lengthens_the_route(seed):
+    stops = random_stops(150, zones="AB", seed=seed)
+    before = nearest_neighbour(stops, DEPOT)
+    after = two_opt(list(before), DEPOT, time.perf_counter() + 1, window=25)
+    assert sorted(stop.key for stop in after) == sorted(
+        stop.key for stop in before)
+    assert route_length(after, DEPOT) <= route_length(before, DEPOT) + 1e-9
+    assert zone_runs(after) == zone_runs(before)
+
+
+def test_two_opt_untangles_a_crossing():
+    square = [Stop("a", None, 0, 10), Stop("c", None, 10, 0),
+              Stop("b", None, 10, 10), Stop("d", None, 0, 0.5)]
+    route = two_opt(square, DEPOT, time.perf_counter() + 1, window=25)
+    assert route_length(route, DEPOT) < route_length(square, DEPOT)
+
+
+def test_nearest_neighbour_takes_the_closest_stop_each_time():
+    stops = random_stops(80, zones="A", seed=3)
+    position, route = DEPOT, nearest_neighbour(stops, DEPOT)
+    remaining = list(stops)
+    for stop in route:
+        closest = min(abs(position[0] - other.x) + abs(position[1] - other.y)
+                      for other in remaining)
+        assert (abs(position[0] - stop.x)
+                + abs(position[1] - stop.y)) == pytest.approx(closest)
+        remaining.remove(stop)
+        position = (stop.x, stop.y)
+
+
+@pytest.mark.parametrize("stops", [
+    [Stop(0, "A", 5, 5)],
+    [Stop(i, "A", 5, 5) for i in range(10)],
+    [Stop(i, "A", 3, float(i)) for i in range(10)],
+])
+def test_point_like_zones_far_from_the_depot(stops):
+    route = plan_route(stops, (-5000.0, 8000.0), budget=0.05)
+    assert sorted(stop.key for stop in route) == [stop.key for stop in stops]
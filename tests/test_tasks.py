@@ -0,0 +1,96 @@
+from sqlalchemy.future import select
+
+from models import Task
+
+
+async def create_posting(client, stock: dict):
+    response = await client.post("/createPostnig", json={"ordered_goods": [
+        {"sku": str(sku_id), "from_valid_ids": [str(item_ids[0])],
+         "from_defect_ids": []}
+        for sku_id, item_ids in stock.items()
+    ]})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+async def picks(posting_id) -> list:
+    from database import async_session_factory
+
+    async with async_session_factory() as session:
+        return list(await session.execute(
+            select(Task.task_id, Task.task_target_id, Task.status)
+            .where(Task.posting_id == posting_id)
+            .order_by(Task.pick_seq)))
+
+
+async def posting_status(client, posting_id) -> str:
+    response = await client.get(f"/getPosting/{posting_id}")
+    assert response.status_code == 200, response.text
+    return response.json()["posting_status"]
+
+
+async def finish(client, task_id, status: str) -> None:
+    response = await client.post("/finishTask", json={"id": str(task_id),
+                                                      "status": status})
+    assert response.status_code == 200, response.text
+
+
+async def test_cancelled_pick_then_completed_pick_sends_posting(
+        client, stocked_skus):
+    posting_id = await create_posting(client, await stocked_skus(2, units=1))
+    first, second = await picks(posting_id)
+
+    await finish(client, first.task_id, "canceled")
+    assert await posting_status(client, posting_id) == "in_item_pick"
+    await finish(client, second.task_id, "completed")
+    assert await posting_status(client, posting_id) == "sent"
+
+
+async def test_cancelling_every_pick_sends_posting(client, stocked_skus):
+    posting_id = await create_posting(client, await stocked_skus(2, units=1))
+    for task in await picks(posting_id):
+        await finish(client, task.task_id, "canceled")
+    assert await posting_status(client, posting_id) == "sent"
+
+
+async def test_finishing_twice_counts_the_pick_once(client, stocked_skus):
+    posting_id = await create_posting(client, await stocked_skus(2, units=1))
+    first, second = await picks(posting_id)
+
+    await finish(client, first.task_id, "completed")
+    await finish(client, first.task_id, "completed")
+    assert await posting_status(client, posting_id) == "in_item_pick"
+    response = await client.post("/sendPosting", json={"id": posting_id})
+    assert response.status_code == 400
+
+
+async def test_markdown_cancelling_a_pick_closes_it(client, stocked_skus):
+    posting_id = await create_posting(client, await stocked_skus(2, units=1))
+    first, second = await picks(posting_id)
+
+    # No free valid item is left to move the pick onto.
+    response = await client.post("/markdownItem", json={
+        "id": str(first.task_target_id), "percentage": 30})
+    assert response.status_code == 200, response.text
+    first, second = await picks(posting_id)
+    assert first.status.value == "canceled"
+    assert await posting_status(client, posting_id) == "in_item_pick"
+
+    await finish(client, second.task_id, "completed")
+    assert await posting_status(client, posting_id) == "sent"
+
+
+async def test_markdown_moving_a_pick_keeps_it_open(client, stocked_skus):
+    posting_id = await create_posting(client, await stocked_skus(1, units=2))
+    (pick,) = await picks(posting_id)
+
+    response = await client.post("/markdownItem", json={
+        "id": str(pick.task_target_id), "percentage": 30})
+    assert response.status_code == 200, response.text
+    (moved,) = await picks(posting_id)
+    assert moved.status.value == "in_work"
+    assert moved.task_target_id != pick.task_target_id
+    assert await posting_status(client, posting_id) == "in_item_pick"
+
+    await finish(client, moved.task_id, "completed")
+    assert await posting_status(client, posting_id) == "sent"